@@ -6,11 +6,13 @@ import collections
 import errno
 import json
 import logging
+import mmap
 import os
+import struct
 import sys
 import tempfile
 import types
-import zipfile
+import zlib
 
 from cryptography import x509 as crypto_x509
 
@@ -29,7 +31,7 @@ from ipapython.dnsutil import DNSName
 
 logger = logging.getLogger(__name__)
 
-FORMAT = '1'
+FORMAT = '3'
 
 if six.PY3:
     unicode = str
@@ -345,6 +347,128 @@ class NotAvailable(Exception):
     pass
 
 
+class _SchemaFile(object):
+    """
+    Read-only schema cache file
+
+    The file starts with a magic string, the number of members and a CRC-32
+    checksum of the rest of the file, followed by a table of ``(key offset,
+    key length, value offset, value length)`` records sorted by key, and by
+    the keys and values themselves. The file is memory-mapped and members are
+    looked up by a binary search of the table, so only the members which are
+    used are read.
+    """
+    MAGIC = b'IPASCHM' + FORMAT.encode('ascii')
+    _HEADER = struct.Struct('>8sII')
+    _RECORD = struct.Struct('>IIII')
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._validate()
+        except ValueError as e:
+            self._map.close()
+            raise ValueError("{}: {}".format(filename, e))
+
+    def _validate(self):
+        size = len(self._map)
+        if size < self._HEADER.size:
+            raise ValueError("not a schema file")
+        magic, self._count, checksum = self._HEADER.unpack_from(self._map, 0)
+        if magic != self.MAGIC:
+            raise ValueError("not a schema file")
+        if self._checksum(self._map[self._HEADER.size:]) != checksum:
+            raise ValueError("checksum mismatch")
+        if self._HEADER.size + self._count * self._RECORD.size > size:
+            raise ValueError("truncated record table")
+
+        previous = None
+        for index in range(self._count):
+            offset, length, value_offset, value_length = self._record(index)
+            if offset + length > size or value_offset + value_length > size:
+                raise ValueError("member out of bounds")
+            key = self._map[offset:offset + length]
+            if previous is not None and key <= previous:
+                raise ValueError("members not sorted")
+            key.decode('utf-8')
+            previous = key
+
+    @staticmethod
+    def _checksum(data, value=0):
+        return zlib.crc32(data, value) & 0xffffffff
+
+    def _record(self, index):
+        return self._RECORD.unpack_from(
+            self._map, self._HEADER.size + index * self._RECORD.size)
+
+    def _key(self, index):
+        offset, length, _value_offset, _value_length = self._record(index)
+        return self._map[offset:offset + length]
+
+    def _bisect(self, key):
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def get(self, key):
+        """
+        Return the value of ``key`` as bytes
+        """
+        encoded = key.encode('utf-8')
+        index = self._bisect(encoded)
+        if index < self._count:
+            offset, length, value_offset, value_length = self._record(index)
+            if self._map[offset:offset + length] == encoded:
+                return self._map[value_offset:value_offset + value_length]
+        raise KeyError(key)
+
+    def iter_prefix(self, prefix):
+        """
+        Iterate through the keys starting with ``prefix``, without it
+        """
+        encoded = prefix.encode('utf-8')
+        for index in range(self._bisect(encoded), self._count):
+            key = self._key(index)
+            if not key.startswith(encoded):
+                break
+            yield key[len(encoded):].decode('utf-8')
+
+    def close(self):
+        self._map.close()
+
+    @classmethod
+    def write(cls, fileobj, members):
+        """
+        Write the ``members`` dict of unicode keys and bytes values
+        """
+        items = sorted(
+            (key.encode('utf-8'), value) for key, value in members.items())
+        offset = cls._HEADER.size + len(items) * cls._RECORD.size
+
+        records = []
+        for key, value in items:
+            records.append(cls._RECORD.pack(
+                offset, len(key), offset + len(key), len(value)))
+            offset += len(key) + len(value)
+        data = [b''.join(records)]
+        for key, value in items:
+            data.extend((key, value))
+
+        checksum = 0
+        for chunk in data:
+            checksum = cls._checksum(chunk, checksum)
+
+        fileobj.write(cls._HEADER.pack(cls.MAGIC, len(items), checksum))
+        for chunk in data:
+            fileobj.write(chunk)
+
+
 class Schema(object):
     """
     Store and provide schema for commands and topics
@@ -369,12 +493,15 @@ class Schema(object):
     _DIR = os.path.join(USER_CACHE_PATH, 'ipa', 'schema', FORMAT)
 
     def __init__(self, client, fingerprint=None):
+        self._client = client
         self._dict = {}
         self._namespaces = {}
-        self._help = None
+        self._help = {}
+        self._file = None
 
         for ns in self.namespaces:
             self._dict[ns] = {}
+            self._help[ns] = {}
             self._namespaces[ns] = _SchemaNameSpace(self, ns)
 
         ttl = None
@@ -437,22 +564,51 @@ class Schema(object):
         return (fp, ttl,)
 
     def _read_schema(self, fingerprint):
-        # It's more efficient to read zip file members at once than to open
-        # the zip file a couple of times, see #6690.
+        # Members are read and decoded on first use, most commands need
+        # only a few of them, see _SchemaFile.
         filename = os.path.join(self._DIR, fingerprint)
-        with zipfile.ZipFile(filename, 'r') as schema:
-            for name in schema.namelist():
-                ns, _slash, key = name.partition('/')
-                if ns in self.namespaces:
-                    self._dict[ns][key] = schema.read(name)
-                elif name == '_help':
-                    self._help = schema.read(name)
+        self._file = _SchemaFile(filename)
 
     def __getitem__(self, key):
         try:
             return self._namespaces[key]
         except KeyError:
+            pass
+        try:
+            return self._dict[key]
+        except KeyError:
+            if self._file is None:
+                raise
+        value = self._read_file(key)
+        if self._file is None:
             return self._dict[key]
+        self._dict[key] = value
+        return value
+
+    def _read_file(self, key):
+        """
+        Read ``key`` from the cache file
+
+        If the member cannot be decoded, the schema is fetched from the
+        server again, the file is dropped and None is returned.
+        """
+        try:
+            return json.loads(self._file.get(key).decode('utf-8'))
+        except (ValueError, UnicodeError) as e:
+            # the file was validated when it was opened, so the member itself
+            # is broken
+            logger.warning("Failed to read schema: %s", e)
+            self._refetch()
+            return None
+
+    def _refetch(self):
+        self._file = None
+        fingerprint, ttl = self._fetch(self._client, ignore_cache=True)
+        self._help = self._generate_help(self._dict)
+        try:
+            self._write_schema(fingerprint)
+        except Exception as e:
+            logger.warning("Failed to write schema: %s", e)
 
     def _generate_help(self, schema):
         halp = {}
@@ -496,41 +652,52 @@ class Schema(object):
                 os.rename(f.name, os.path.join(self._DIR, fingerprint))
 
     def _write_schema_data(self, fileobj):
-        with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as schema:
-            for key, value in self._dict.items():
-                if key in self.namespaces:
-                    ns = value
-                    for member in ns:
-                        path = '{}/{}'.format(key, member)
-                        s = json.dumps(ns[member], default=json_default)
-                        schema.writestr(path, s.encode('utf-8'))
-                else:
-                    schema.writestr(key, json.dumps(value).encode('utf-8'))
-
-            schema.writestr(
-                '_help',
-                json.dumps(self._help, default=json_default).encode('utf-8')
-            )
+        members = {}
+        for key, value in self._dict.items():
+            if key in self.namespaces:
+                for member, member_schema in value.items():
+                    path = u'{}/{}'.format(key, member)
+                    s = json.dumps(member_schema, default=json_default)
+                    members[path] = s.encode('utf-8')
+            else:
+                members[key] = json.dumps(value).encode('utf-8')
 
-    def read_namespace_member(self, namespace, member):
-        value = self._dict[namespace][member]
+        for key, value in self._help.items():
+            for member, member_help in value.items():
+                path = u'_help/{}/{}'.format(key, member)
+                s = json.dumps(member_help, default=json_default)
+                members[path] = s.encode('utf-8')
 
-        if isinstance(value, bytes):
-            value = json.loads(value.decode('utf-8'))
-            self._dict[namespace][member] = value
+        _SchemaFile.write(fileobj, members)
 
+    def _read_member(self, namespace, member, is_help=False):
+        if is_help:
+            cache = self._help[namespace]
+            path = u'_help/{}'.format(namespace)
+        else:
+            cache = self._dict[namespace]
+            path = namespace
+        try:
+            return cache[member]
+        except KeyError:
+            if self._file is None:
+                raise
+        value = self._read_file(u'{}/{}'.format(path, member))
+        if self._file is None:
+            return self._read_member(namespace, member, is_help)
+        cache[member] = value
         return value
 
+    def read_namespace_member(self, namespace, member):
+        return self._read_member(namespace, member)
+
     def iter_namespace(self, namespace):
+        if self._file is not None:
+            return self._file.iter_prefix(u'{}/'.format(namespace))
         return iter(self._dict[namespace])
 
     def get_help(self, namespace, member):
-        if isinstance(self._help, bytes):
-            self._help = json.loads(
-                self._help.decode('utf-8')  # pylint: disable=no-member
-            )
-
-        return self._help[namespace][member]
+        return self._read_member(namespace, member, is_help=True)
 
 
 def get_package(server_info, client):
@@ -150,6 +150,52 @@ DEFAULT_CONFIG = (
     # How long http connection should wait for reply [seconds].
     ('http_timeout', 30),
 
+    # Per-process pool of idle keep-alive HTTPS connections shared by the RPC
+    # clients of all threads; 0 disables pooling. Idle connections are closed
+    # after rpc_pool_idle_timeout [seconds], which is kept below the
+    # KeepAliveTimeout of the IPA web server.
+    ('rpc_pool_size', 4),
+    ('rpc_pool_idle_timeout', 25),
+
+    # With fallback, the IPA servers found in DNS are probed in parallel for
+    # at most rpc_probe_timeout [seconds]. Servers which failed are tried
+    # last for rpc_server_penalty [seconds]. Servers of the IPA location of
+    # the client are preferred if location is set.
+    ('rpc_probe_timeout', 2),
+    ('rpc_server_penalty', 60),
+    ('location', None),
+
+    # Per-process pool of bound LDAP connections kept by the server backend
+    # between requests; 0 disables pooling. Idle connections are dropped
+    # after ldap_pool_idle_timeout [seconds].
+    ('ldap_pool_size', 0),
+    ('ldap_pool_idle_timeout', 300),
+
+    # LDAP operations of the server backend taking at least this long
+    # [milliseconds] are logged as slow queries; 0 disables the log.
+    ('ldap_slow_query_threshold', 0),
+
+    # Maximum number of worker threads of batch --parallel
+    ('batch_parallel_workers', 4),
+
+    # Time to live [seconds] and size of the result cache of read-only server
+    # commands like config_show; 0 disables the cache.
+    ('command_cache_ttl', 0),
+    ('command_cache_size', 100),
+
+    # Time one command call in command_timing_sample, 0 disables timing.
+    # Statistics of the timed calls are written to command_timing_dir every
+    # command_timing_interval [seconds], see ipalib.timing.
+    ('command_timing_sample', 0),
+    ('command_timing_dir', None),
+    ('command_timing_interval', 60),
+
+    # Time to live [seconds] of the CA ACLs and of the principal group
+    # memberships cached for certificate requests, 0 disables the cache.
+    # caacl commands drop the cached CA ACLs of their own process only.
+    ('caacl_cache_ttl', 0),
+    ('caacl_cache_size', 1000),
+
     # Web Application mount points
     ('mount_ipa', '/ipa/'),
 
@@ -159,6 +205,9 @@ DEFAULT_CONFIG = (
     # Session stuff:
     ('kinit_lifetime', None),
 
+    # Import plugin modules on first use, see API.add_package():
+    ('lazy_plugins', False),
+
     # Debugging:
     ('verbose', 0),
     ('debug', False),
@@ -176,6 +225,24 @@ DEFAULT_CONFIG = (
     ('ca_install_port', None),
     ('ca_agent_install_port', None),
     ('ca_ee_install_port', None),
+    # Maximum number of concurrent connections of the RA backend when it
+    # retrieves many certificates, e.g. for cert_find --all
+    ('ra_parallel_workers', 4),
+    # Number of results per request of certificate searches in Dogtag,
+    # 0 requests all results at once
+    ('ra_search_page_size', 1000),
+    # Keep connections to Dogtag and KRA hosts and the sessions of the CA REST
+    # API open, and reuse them until they are idle for
+    # dogtag_pool_idle_timeout [seconds]. At most dogtag_pool_size
+    # connections per host and port are open at a time; 0 disables the pool.
+    ('dogtag_pool_size', 0),
+    ('dogtag_pool_idle_timeout', 60),
+    # SQLite database of the local certificate index, which cert_find uses
+    # instead of searching Dogtag and LDAP; None disables the index. The
+    # index is reconciled with Dogtag and LDAP when it is older than
+    # cert_index_sync_interval [seconds].
+    ('cert_index_db', None),
+    ('cert_index_sync_interval', 600),
 
     # Topology plugin
     ('recommended_max_agmts', 4),  # Recommended maximum number of replication
@@ -184,6 +184,7 @@ class Retrieve(PKQuery):
     """
 
     has_output = output.standard_entry
+    read_only = True
 
 
 class Update(PKQuery):
@@ -240,6 +241,7 @@ class Search(Method):
     """
 
     has_output = output.standard_list_of_entries
+    read_only = True
 
     def get_args(self):
         yield parameters.Str(
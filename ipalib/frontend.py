@@ -20,7 +20,12 @@
 """
 Base classes for all front-end plugins.
 """
+import copy
 import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
 
 import six
 
@@ -35,7 +40,7 @@ from ipalib.text import _
 from ipalib.errors import (ZeroArgumentError, MaxArgumentError, OverlapError,
     VersionError, OptionError,
     ValidationError, ConversionError)
-from ipalib import errors, messages
+from ipalib import errors, messages, timing
 from ipalib.request import context, context_frame
 from ipalib.util import classproperty, json_serialize
 
@@ -55,6 +60,67 @@ def is_rule(obj):
     return callable(obj) and getattr(obj, RULE_FLAG, False) is True
 
 
+class ResultCache(object):
+    """
+    Bounded LRU cache of command results with a time to live.
+
+    Used by server-side commands which set `Command.cache_result`. Entries
+    are dropped after ``ttl`` seconds, when more than ``maxsize`` results are
+    cached, or when `invalidate_result_caches()` is called. Entries of a
+    cache without ``ttl`` do not expire.
+    """
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                expires, value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            if expires is not None and expires < time.time():
+                self.misses += 1
+                return None
+            self._data[key] = (expires, value)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            if self.ttl is not None:
+                expires = time.time() + self.ttl
+            else:
+                expires = None
+            self._data[key] = (expires, value)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_result_caches = weakref.WeakSet()
+
+
+def invalidate_result_caches():
+    """
+    Drop all command results cached in this process.
+    """
+    for cache in list(_result_caches):
+        cache.clear()
+
+
 def entry_count(entry):
     """
     Return the number of entries in an entry. This is primarly for the
@@ -427,6 +493,15 @@ class Command(HasParam):
 
     api_version = API_VERSION
 
+    # Commands which do not modify any data set this so that they do not
+    # invalidate cached results of other commands.
+    read_only = False
+    # Read-only commands returning the same data for most calls can set this
+    # to cache their results. Results are cached per arguments and principal
+    # for api.env.command_cache_ttl seconds, 0 disables the cache.
+    cache_result = False
+    result_cache = Plugin.finalize_attr('result_cache')
+
     @classmethod
     def __topic_getter(cls):
         return cls.__module__.rpartition('.')[2]
@@ -447,7 +522,12 @@ class Command(HasParam):
         self.ensure_finalized()
         with context_frame():
             self.context.principal = getattr(context, 'principal', None)
-            return self.__do_call(*args, **options)
+            timer = timing.start(self.name, self.api.env)
+            try:
+                return self.__do_call(*args, **options)
+            finally:
+                if timer is not None:
+                    timing.finish(timer, self.api.env)
 
     def __do_call(self, *args, **options):
         self.context.__messages = []
@@ -466,16 +546,21 @@ class Command(HasParam):
             'raw: %s(%s)', self.name, ', '.join(self._repr_iter(**params))
         )
         if self.api.env.in_server:
-            params.update(self.get_default(**params))
-        params = self.normalize(**params)
-        params = self.convert(**params)
+            with timing.phase('default'):
+                params.update(self.get_default(**params))
+        with timing.phase('normalize'):
+            params = self.normalize(**params)
+        with timing.phase('convert'):
+            params = self.convert(**params)
         logger.debug(
             '%s(%s)', self.name, ', '.join(self._repr_iter(**params))
         )
         if self.api.env.in_server:
-            self.validate(**params)
+            with timing.phase('validate'):
+                self.validate(**params)
         (args, options) = self.params_2_args_options(**params)
-        ret = self.run(*args, **options)
+        with timing.phase('run'):
+            ret = self.__run(args, options)
         if isinstance(ret, dict):
             for message in self.context.__messages:
                 messages.add_message(options['version'], ret, message)
@@ -486,7 +571,32 @@ class Command(HasParam):
         ):
             ret['summary'] = self.get_summary_default(ret)
         if self.use_output_validation and (self.output or ret is not None):
-            self.validate_output(ret, options['version'])
+            with timing.phase('validate_output'):
+                self.validate_output(ret, options['version'])
+        return ret
+
+    def __run(self, args, options):
+        cache = self.result_cache
+        if cache is None:
+            try:
+                return self.run(*args, **options)
+            finally:
+                if self.api.env.in_server and not self.read_only:
+                    invalidate_result_caches()
+
+        key = (repr(args), repr(sorted(options.items())),
+               self.context.principal)
+        cached = cache.get(key)
+        if cached is None:
+            start = len(self.context.__messages)
+            ret = self.run(*args, **options)
+            # keep the messages added by the run, e.g. SearchResultTruncated
+            cache.set(key, (copy.deepcopy(ret),
+                            self.context.__messages[start:]))
+        else:
+            logger.debug('%s: using cached result', self.name)
+            ret = copy.deepcopy(cached[0])
+            self.context.__messages.extend(cached[1])
         return ret
 
     def add_message(self, message):
@@ -878,6 +988,14 @@ class Command(HasParam):
         self.params_by_default = NameSpace(params, sort=False)
         self.output = NameSpace(self._iter_output(), sort=False)
         self._create_param_namespace('output_params')
+        if (self.cache_result and self.api.env.in_server and
+                self.api.env.command_cache_ttl > 0):
+            self.result_cache = ResultCache(
+                maxsize=self.api.env.command_cache_size,
+                ttl=self.api.env.command_cache_ttl)
+            _result_caches.add(self.result_cache)
+        else:
+            self.result_cache = None
         super(Command, self)._on_finalize()
 
     def _iter_output(self):
@@ -1121,14 +1239,14 @@ class Command(HasParam):
         # Use one shared callback registry, keyed on class, to avoid problems
         # with missing attributes being looked up in superclasses
         callbacks = _callback_registry.get(callback_type, {}).get(cls, [None])
+        phase = '%s_callback' % callback_type
         for callback in callbacks:
             if callback is None:
                 try:
-                    yield getattr(cls, '%s_callback' % callback_type)
+                    callback = getattr(cls, '%s_callback' % callback_type)
                 except AttributeError:
-                    pass
-            else:
-                yield callback
+                    continue
+            yield timing.timed(callback, phase)
 
     @classmethod
     def register_callback(cls, callback_type, callback, first=False):
@@ -1274,11 +1392,10 @@ class Object(HasParam):
             return
         namespace = self.api[name]
         assert type(namespace) is APINameSpace
-        for plugin in namespace(): # Equivalent to dict.itervalues()
+        for plugin in namespace.for_object(self.name):
             if plugin is not namespace[plugin.name]:
                 continue
-            if plugin.obj_name == self.name:
-                yield plugin
+            yield plugin
 
     def get_params(self):
         """
@@ -1339,9 +1456,11 @@ class Attribute(Plugin):
     """
     obj_version = '1'
 
-    @property
-    def obj_name(self):
-        return self.name.partition('_')[0]
+    @classmethod
+    def __obj_name_getter(cls):
+        return cls.name.partition('_')[0]
+
+    obj_name = classproperty(__obj_name_getter)
 
     @property
     def obj_full_name(self):
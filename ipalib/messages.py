@@ -476,6 +476,16 @@ class CertificateInvalid(PublicMessage):
                "%(reason)s")
 
 
+class SearchResultPage(PublicMessage):
+    """
+    **13030** Search result is one page of a paged search
+    """
+    errno = 13030
+    type = "info"
+    format = _("More entries are available, use --cursor=%(cursor)s to get "
+               "the next page")
+
+
 def iter_messages(variables, base):
     """Return a tuple with all subclasses
     """
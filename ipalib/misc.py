@@ -18,6 +18,7 @@ register = Registry()
 
 class env(LocalOrRemote):
     __doc__ = _('Show environment variables.')
+    read_only = True
 
     msg_summary = _('%(count)d variables')
 
@@ -91,6 +92,7 @@ class env(LocalOrRemote):
 
 class plugins(LocalOrRemote):
     __doc__ = _('Show all loaded plugins.')
+    read_only = True
 
     msg_summary = ngettext(
         '%(count)d plugin loaded', '%(count)d plugins loaded', 0
@@ -142,6 +142,27 @@ if six.PY3:
     unicode = str
 
 
+def _first_index(values, invalid):
+    """
+    Return the index of the first item of ``values`` that is ``invalid``.
+
+    ``None`` is returned when no item is invalid.
+    """
+    for index, value in enumerate(values):
+        if invalid(value):
+            return index
+    return None
+
+
+def _overrides(obj, name, cls):
+    """
+    Return ``True`` if method ``name`` of ``obj`` is not the one of ``cls``.
+    """
+    method = getattr(obj, name)
+    func = getattr(method, '__func__', None)
+    return func is not six.get_unbound_function(getattr(cls, name))
+
+
 class DefaultFrom(ReadOnly):
     """
     Derive a default value from other supplied values.
@@ -534,6 +555,8 @@ class Param(ReadOnly):
 
         # Add in class rules:
         class_rules = []
+        batch_rules = []
+        scalar_rules = []
         for (key, kind, default) in self.kwargs:
             value = kw.get(key, default)
             if hasattr(self, key):
@@ -544,6 +567,11 @@ class Param(ReadOnly):
             rule_name = '_rule_%s' % key
             if value is not None and hasattr(self, rule_name):
                 class_rules.append(getattr(self, rule_name))
+                batch_rule = getattr(self, '_batch_rule_%s' % key, None)
+                if batch_rule is not None:
+                    batch_rules.append(batch_rule)
+                else:
+                    scalar_rules.append(getattr(self, rule_name))
         check_name(self.cli_name)
 
         # Check that only 'include' or 'exclude' was provided:
@@ -562,8 +590,14 @@ class Param(ReadOnly):
         if self.query:
             # by definition a query enforces no class or parameter rules
             self.all_rules = ()
+            self.batch_rules = ()
+            self.scalar_rules = ()
         else:
             self.all_rules = self.class_rules + self.rules
+            # class rules with a _batch_rule_<kwarg> counterpart are applied
+            # to all values of a multivalue at once, see _validate_multi()
+            self.batch_rules = tuple(batch_rules)
+            self.scalar_rules = tuple(scalar_rules) + self.rules
         for rule in self.all_rules:
             if not callable(rule):
                 raise TypeError(
@@ -762,12 +796,24 @@ class Param(ReadOnly):
             if type(value) not in (tuple, list):
                 value = (value,)
         if self.multivalue:
-            return tuple(
-                self._normalize_scalar(v) for v in value
-            )
+            return self._normalize_multi(value)
         else:
             return self._normalize_scalar(value)
 
+    def _normalize_multi(self, values):
+        """
+        Normalize all the values of a multivalue.
+
+        Without a normalizer callback the values are returned unchanged as a
+        tuple, otherwise `Param._normalize_scalar()` is called for each one.
+        """
+        if (self.normalizer is None and
+                not _overrides(self, '_normalize_scalar', Param)):
+            return tuple(values)
+        return tuple(
+            self._normalize_scalar(v) for v in values
+        )
+
     def _normalize_scalar(self, value):
         """
         Normalize a scalar value.
@@ -827,26 +873,41 @@ class Param(ReadOnly):
 
         :param value: A proposed value for this parameter.
         """
-        if not self.no_convert:
-            convert = self._convert_scalar
-        else:
-            def convert(value):
-                if isinstance(value, unicode):
-                    return value
-                return self._convert_scalar(value)
-
         if _is_null(value):
             return
         if self.multivalue:
             if type(value) not in (tuple, list):
                 value = (value,)
-            values = tuple(
-                convert(v) for v in value if not _is_null(v)
-            )
+            values = self._convert_multi(value)
             if len(values) == 0:
                 return
             return values
-        return convert(value)
+        return self._get_converter()(value)
+
+    def _get_converter(self):
+        """
+        Return the callable converting a single value of this parameter.
+        """
+        if not self.no_convert:
+            return self._convert_scalar
+
+        def convert(value):
+            if isinstance(value, unicode):
+                return value
+            return self._convert_scalar(value)
+        return convert
+
+    def _convert_multi(self, values):
+        """
+        Convert all the values of a multivalue, dropping null values.
+
+        Subclasses can override this to convert the whole tuple at once. The
+        result must be the same as converting each value separately.
+        """
+        convert = self._get_converter()
+        return tuple(
+            convert(v) for v in values if not _is_null(v)
+        )
 
     def _convert_scalar(self, value, index=None):
         """
@@ -879,11 +940,45 @@ class Param(ReadOnly):
                 )
             if len(value) < 1:
                 raise ValueError('value: empty tuple must be converted to None')
-            for v in value:
-                self._validate_scalar(v)
+            self._validate_multi(value)
         else:
             self._validate_scalar(value)
 
+    def _validate_multi(self, values):
+        """
+        Validate all the values of a multivalue.
+
+        The types are checked in one pass and each of `Param.batch_rules` is
+        applied to the whole tuple. The remaining rules are applied value by
+        value. The first invalid value is then passed to
+        `Param._validate_scalar()`, so the error raised is the same as when
+        validating the values one by one.
+        """
+        if _overrides(self, '_validate_scalar', Param):
+            for v in values:
+                self._validate_scalar(v)
+            return
+
+        allowed_types = tuple(self.allowed_types)
+        bad = _first_index(values, lambda v: not isinstance(v, allowed_types))
+        if bad is None:
+            bad = len(values)
+        for rule in self.batch_rules:
+            if bad == 0:
+                break
+            index = rule(values[:bad])
+            if index is not None:
+                bad = index
+        if self.scalar_rules:
+            for v in values[:bad]:
+                for rule in self.scalar_rules:
+                    error = rule(ugettext, v)
+                    if error is not None:
+                        raise ValidationError(name=self.get_param_name(),
+                                              error=error)
+        for v in values[bad:]:
+            self._validate_scalar(v)
+
     def _validate_scalar(self, value, index=None):
         for t in self.allowed_types:
             if isinstance(value, t):
@@ -1079,6 +1174,22 @@ class Number(Param):
                                   error=ugettext(self.scalar_error))
         raise ConversionError(name=self.name, error=ugettext(self.type_error))
 
+    def _batch_rule_minvalue(self, values):
+        """
+        Check min constraint of all values at once.
+        """
+        if min(values) >= self.minvalue:
+            return None
+        return _first_index(values, lambda v: v < self.minvalue)
+
+    def _batch_rule_maxvalue(self, values):
+        """
+        Check max constraint of all values at once.
+        """
+        if max(values) <= self.maxvalue:
+            return None
+        return _first_index(values, lambda v: v > self.maxvalue)
+
 
 class Int(Number):
     """
@@ -1364,6 +1475,37 @@ class Data(Param):
         else:
             return None
 
+    def _batch_rule_pattern(self, values):
+        """
+        Check pattern (regex) constraint of all values at once.
+        """
+        match = self.re.match
+        return _first_index(values, lambda v: match(v) is None)
+
+    def _batch_rule_minlength(self, values):
+        """
+        Check minlength constraint of all values at once.
+        """
+        lengths = [len(v) for v in values]
+        if min(lengths) >= self.minlength:
+            return None
+        return _first_index(lengths, lambda n: n < self.minlength)
+
+    def _batch_rule_maxlength(self, values):
+        """
+        Check maxlength constraint of all values at once.
+        """
+        lengths = [len(v) for v in values]
+        if max(lengths) <= self.maxlength:
+            return None
+        return _first_index(lengths, lambda n: n > self.maxlength)
+
+    def _batch_rule_length(self, values):
+        """
+        Check length constraint of all values at once.
+        """
+        return _first_index(values, lambda v: len(v) != self.length)
+
 
 class Bytes(Data):
     """
@@ -1567,6 +1709,21 @@ class Str(Data):
                                   error=ugettext(self.scalar_error))
         raise ConversionError(name=self.name, error=ugettext(self.type_error))
 
+    def _convert_multi(self, values):
+        """
+        Convert all the values of a multivalue, dropping null values.
+
+        Unicode values are passed through without calling
+        `Str._convert_scalar()`, unless a subclass overrides it.
+        """
+        if _overrides(self, '_convert_scalar', Str):
+            return super(Str, self)._convert_multi(values)
+        convert = self._convert_scalar
+        return tuple(
+            v if type(v) is unicode else convert(v)
+            for v in values if not _is_null(v)
+        )
+
     def _rule_noextrawhitespace(self, _, value):
         """
         Do not allow leading/trailing spaces.
@@ -1579,6 +1736,14 @@ class Str(Data):
         else:
             return None
 
+    def _batch_rule_noextrawhitespace(self, values):
+        """
+        Do not allow leading/trailing spaces in any of the values.
+        """
+        if self.noextrawhitespace is False:
+            return None
+        return _first_index(values, lambda v: len(v) != len(v.strip()))
+
     def _rule_minlength(self, _, value):
         """
         Check minlength constraint.
@@ -1686,6 +1851,14 @@ class Enum(Param):
         else:
             return None
 
+    def _batch_rule_values(self, values):
+        """
+        Check that all values are enumerated, using a set lookup.
+        """
+        allowed = frozenset(self.values)
+        return _first_index(values, lambda v: v not in allowed)
+
+
 class BytesEnum(Enum):
     """
     Enumerable for binary data (stored in the ``str`` type).
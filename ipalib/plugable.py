@@ -35,6 +35,7 @@ import optparse  # pylint: disable=deprecated-module
 import textwrap
 import collections
 import importlib
+import json
 
 import six
 
@@ -42,8 +43,9 @@ from ipalib import errors
 from ipalib.config import Env
 from ipalib.text import _
 from ipalib.util import classproperty
+from ipaplatform.paths import paths
 from ipalib.base import ReadOnly, lock, islocked
-from ipalib.constants import DEFAULT_CONFIG
+from ipalib.constants import DEFAULT_CONFIG, USER_CACHE_PATH
 from ipapython import ipa_log_manager, ipautil
 from ipapython.ipa_log_manager import (
     log_mgr,
@@ -59,6 +61,15 @@ logger = logging.getLogger(__name__)
 # FIXME: Updated constants.TYPE_ERROR to use this clearer format from wehjit:
 TYPE_ERROR = '%s: need a %r; got a %r: %r'
 
+# plugin index of clients, the index of the server is in
+# paths.IPA_PLUGIN_INDEX_DIR
+PLUGIN_INDEX_DIR = os.path.join(USER_CACHE_PATH, 'ipa', 'plugins')
+PLUGIN_INDEX_VERSION = '{}/{}.{}'.format(VERSION, *sys.version_info[:2])
+# obj_name of plugins whose object is known only to their instances; the
+# modules of these plugins are imported when the plugins of any object are
+# looked up
+ANY_OBJ_NAME = '*'
+
 
 # FIXME: This function has no unit test
 def find_modules_in_dir(src_dir):
@@ -82,6 +93,63 @@ def find_modules_in_dir(src_dir):
         yield module
 
 
+def get_module_stats(package_dir, modules):
+    """
+    Return the modification time and size of the plugin ``modules`` in
+    ``package_dir``, used to check whether a plugin index is up to date.
+    """
+    stats = {}
+    for name in modules:
+        try:
+            st = os.stat(os.path.join(package_dir, name + '.py'))
+        except OSError:
+            return None
+        stats[name] = [st.st_mtime, st.st_size]
+    return stats
+
+
+def read_plugin_index(index_dir, package_name, stats):
+    """
+    Return the plugin index of ``package_name`` in ``index_dir`` or None if
+    there is no index or if it does not match the module ``stats``.
+    """
+    filename = os.path.join(index_dir, '{}.json'.format(package_name))
+    try:
+        with open(filename) as f:
+            index = json.load(f)
+    except (IOError, OSError, ValueError) as e:
+        logger.debug("cannot read plugin index %s: %s", filename, e)
+        return None
+    if (not isinstance(index, dict) or
+            index.get('version') != PLUGIN_INDEX_VERSION or
+            index.get('modules') != stats):
+        logger.debug("plugin index %s is out of date", filename)
+        return None
+    return index
+
+
+def write_plugin_index(index_dir, package_name, index):
+    """
+    Store the plugin index of ``package_name`` in ``index_dir``, see
+    API.add_package().
+
+    :raises: IOError or OSError if the index cannot be written
+    """
+    filename = os.path.join(index_dir, '{}.json'.format(package_name))
+    tmpname = '{}.{}.tmp'.format(filename, os.getpid())
+    if not os.path.isdir(index_dir):
+        os.makedirs(index_dir)
+    try:
+        with open(tmpname, 'w') as f:
+            json.dump(index, f)
+            os.fchmod(f.fileno(), 0o644)
+        os.rename(tmpname, filename)
+    except BaseException:
+        if os.path.exists(tmpname):
+            os.unlink(tmpname)
+        raise
+
+
 class Registry(object):
     """A decorator that makes plugins available to the API
 
@@ -282,34 +350,58 @@ class Plugin(ReadOnly):
         )
 
 
+LazyPlugin = collections.namedtuple('LazyPlugin', ('full_name',))
+
+
 class APINameSpace(collections.Mapping):
     def __init__(self, api, base):
         self.__api = api
         self.__base = base
         self.__plugins = None
         self.__plugins_by_key = None
+        self.__generation = None
 
     def __enumerate(self):
-        if self.__plugins is not None and self.__plugins_by_key is not None:
+        api = self.__api
+        generation = len(api._API__loaded_modules)
+        if (self.__plugins is not None and
+                self.__plugins_by_key is not None and
+                self.__generation == generation):
             return
 
-        default_map = self.__api._API__default_map
-        plugins = set()
-        key_dict = self.__plugins_by_key = {}
+        with api._API__lazy_lock:
+            self.__generation = len(api._API__loaded_modules)
+            default_map = api._API__default_map
+            plugins = set()
+            key_dict = {}
 
-        for plugin in self.__api._API__plugins:
-            if not any(issubclass(b, self.__base) for b in plugin.bases):
-                continue
-            plugins.add(plugin)
-            key_dict[plugin] = plugin
-            key_dict[plugin.name, plugin.version] = plugin
-            key_dict[plugin.full_name] = plugin
-            if plugin.version == default_map.get(plugin.name, '1'):
-                key_dict[plugin.name] = plugin
+            for plugin in api._API__plugins:
+                if not any(issubclass(b, self.__base) for b in plugin.bases):
+                    continue
+                plugins.add(plugin)
+                key_dict[plugin] = plugin
+                key_dict[plugin.name, plugin.version] = plugin
+                key_dict[plugin.full_name] = plugin
+                if plugin.version == default_map.get(plugin.name, '1'):
+                    key_dict[plugin.name] = plugin
+
+            # plugins whose modules were not imported yet, see
+            # API.add_package()
+            for full_name, info in six.iteritems(api._API__lazy):
+                if self.__base.__name__ not in info['bases']:
+                    continue
+                lazy = LazyPlugin(full_name)
+                key_dict[info['name'], info['version']] = lazy
+                key_dict[full_name] = lazy
+                if info['version'] == default_map.get(info['name'], '1'):
+                    key_dict[info['name']] = lazy
 
-        self.__plugins = sorted(plugins, key=operator.attrgetter('full_name'))
+            self.__plugins_by_key = key_dict
+            self.__plugins = sorted(
+                plugins, key=operator.attrgetter('full_name'))
 
     def __len__(self):
+        self.__api._load_lazy(base=self.__base)
         self.__enumerate()
         return len(self.__plugins)
 
@@ -318,12 +410,35 @@ class APINameSpace(collections.Mapping):
         return key in self.__plugins_by_key
 
     def __iter__(self):
+        self.__api._load_lazy(base=self.__base)
         self.__enumerate()
         return iter(self.__plugins)
 
     def get_plugin(self, key):
         self.__enumerate()
-        return self.__plugins_by_key[key]
+        plugin = self.__plugins_by_key[key]
+        if isinstance(plugin, LazyPlugin):
+            self.__api._load_lazy(full_name=plugin.full_name)
+            self.__enumerate()
+            plugin = self.__plugins_by_key[key]
+            if isinstance(plugin, LazyPlugin):
+                # the plugin is gone from its module
+                raise KeyError(key)
+        return plugin
+
+    def for_object(self, obj_name):
+        """
+        Iterate through the plugins associated with the object ``obj_name``.
+
+        Unlike iterating through the whole namespace, only the modules of
+        the plugins of ``obj_name`` are imported in the lazy mode.
+        """
+        self.__api._load_lazy(base=self.__base, obj_name=obj_name)
+        self.__enumerate()
+        for plugin in self.__plugins:
+            instance = self.__api._get(plugin)
+            if getattr(instance, 'obj_name', None) == obj_name:
+                yield instance
 
     def __getitem__(self, key):
         plugin = self.get_plugin(key)
@@ -352,6 +467,11 @@ class API(ReadOnly):
         self.__instances = {}
         self.__next = {}
         self.__done = set()
+        self.__lazy = {}
+        self.__lazy_modules = set()
+        self.__loaded_modules = set()
+        self.__lazy_lock = threading.RLock()
+        self.__plugin_indexes = {}
         self.env = Env()
 
     @property
@@ -636,9 +756,33 @@ class API(ReadOnly):
                 name=package_name, file=package_file
             )
 
+        # In the lazy mode the plugins of packages found on disk are added
+        # from an index and their modules are imported on first use. The
+        # index is generated when the modules are imported eagerly and it is
+        # discarded when any of the modules changes. The server cannot write
+        # its index, it is written by the installers, see
+        # write_plugin_indexes().
+        index = stats = None
+        if not hasattr(package, 'modules'):
+            stats = get_module_stats(
+                package_dir, find_modules_in_dir(package_dir))
+        if (stats is not None and self.env.lazy_plugins and
+                self.env.plugins_on_demand):
+            if self.env.in_server:
+                index_dir = paths.IPA_PLUGIN_INDEX_DIR
+            else:
+                index_dir = PLUGIN_INDEX_DIR
+            index = read_plugin_index(index_dir, package_name, stats)
+        if index is not None:
+            logger.debug("adding plugins in %s from index", package_name)
+            self.__plugin_indexes[package_name] = index
+            self.__add_plugin_index(index)
+            return
+
         logger.debug("importing all plugin modules in %s...", package_name)
         modules = getattr(package, 'modules', find_modules_in_dir(package_dir))
         modules = ['.'.join((package_name, name)) for name in modules]
+        plugins = []
 
         for name in modules:
             logger.debug("importing plugin module %s", name)
@@ -656,6 +800,110 @@ class API(ReadOnly):
                 self.add_module(module)
             except errors.PluginModuleError as e:
                 logger.debug("%s", e)
+            else:
+                if stats is not None:
+                    plugins.extend(self.__get_index_entries(module))
+
+        if stats is not None:
+            index = dict(
+                version=PLUGIN_INDEX_VERSION,
+                modules=stats,
+                plugins=plugins,
+            )
+            self.__plugin_indexes[package_name] = index
+            if self.env.lazy_plugins and not self.env.in_server:
+                try:
+                    write_plugin_index(PLUGIN_INDEX_DIR, package_name, index)
+                except (IOError, OSError) as e:
+                    logger.debug("cannot write plugin index of %s: %s",
+                                 package_name, e)
+
+    def write_plugin_indexes(self, index_dir=paths.IPA_PLUGIN_INDEX_DIR):
+        """
+        Store the index of the plugins of the packages whose modules were
+        imported, used by the server in the lazy mode.
+
+        Errors are logged and ignored; without an index the plugin modules
+        are imported eagerly.
+        """
+        for package_name, index in sorted(
+                six.iteritems(self.__plugin_indexes)):
+            try:
+                write_plugin_index(index_dir, package_name, index)
+            except (IOError, OSError) as e:
+                logger.warning("Cannot write plugin index of %s: %s",
+                               package_name, e)
+
+    def __get_index_entries(self, module):
+        for kwargs in module.register:
+            plugin = kwargs['plugin']
+            bases = [base.__name__ for base in self.bases
+                     if any(issubclass(b, base) for b in plugin.bases)]
+            # plugins are not instantiated, the obj_name of the class is
+            # used; a property of the class is computed by the instance
+            obj_name = getattr(plugin, 'obj_name', None)
+            if (obj_name is not None and
+                    not isinstance(obj_name, six.string_types)):
+                obj_name = ANY_OBJ_NAME
+            yield dict(
+                module=module.__name__,
+                full_name=plugin.full_name,
+                name=plugin.name,
+                version=plugin.version,
+                bases=bases,
+                obj_name=obj_name,
+            )
+
+    def __add_plugin_index(self, index):
+        for entry in index['plugins']:
+            info = self.__lazy.setdefault(entry['full_name'], dict(
+                entry, modules=[]))
+            info['modules'].append(entry['module'])
+            self.__lazy_modules.add(entry['module'])
+
+    def _load_lazy(self, base=None, full_name=None, obj_name=None):
+        """
+        Import the modules of the plugins added from an index which match
+        the criteria.
+        """
+        if not self.__lazy:
+            return
+        with self.__lazy_lock:
+            for name, info in list(six.iteritems(self.__lazy)):
+                if base is not None and base.__name__ not in info['bases']:
+                    continue
+                if full_name is not None and name != full_name:
+                    continue
+                if (obj_name is not None and
+                        info['obj_name'] not in (obj_name, ANY_OBJ_NAME)):
+                    continue
+                for module_name in list(info['modules']):
+                    self.__load_lazy_module(module_name)
+
+    def __load_lazy_module(self, name):
+        if name not in self.__lazy_modules:
+            return
+        self.__lazy_modules.remove(name)
+
+        # modules registering the same plugins must be loaded in the
+        # original order so that overrides are applied the same way
+        for info in list(six.itervalues(self.__lazy)):
+            if name in info['modules']:
+                for module_name in list(info['modules']):
+                    if module_name == name:
+                        break
+                    self.__load_lazy_module(module_name)
+
+        logger.debug("importing plugin module %s", name)
+        module = importlib.import_module(name)
+        self.add_module(module)
+
+        for full_name, info in list(six.iteritems(self.__lazy)):
+            if name in info['modules']:
+                info['modules'].remove(name)
+                if not info['modules']:
+                    del self.__lazy[full_name]
+        self.__loaded_modules.add(name)
 
     def add_module(self, module):
         """
@@ -742,24 +990,31 @@ class API(ReadOnly):
                 logger.info(
                     "IPA_CONFDIR env sets confdir to '%s'.", self.env.confdir)
 
-        for plugin in self.__plugins:
+        if not self.env.plugins_on_demand:
+            self._load_lazy()
+
+        plugins = [(p.full_name, p.name, p.version) for p in self.__plugins]
+        plugins.extend((full_name, info['name'], info['version'])
+                       for full_name, info in six.iteritems(self.__lazy))
+
+        for full_name, name, plugin_version in plugins:
             if not self.env.validate_api:
-                if plugin.full_name not in DEFAULT_PLUGINS:
+                if full_name not in DEFAULT_PLUGINS:
                     continue
             else:
                 try:
-                    default_version = self.__default_map[plugin.name]
+                    default_version = self.__default_map[name]
                 except KeyError:
                     pass
                 else:
                     # Technicall plugin.version is not an API version. The
                     # APIVersion class can handle plugin versions. It's more
                     # lean than pkg_resource.parse_version().
-                    version = ipautil.APIVersion(plugin.version)
+                    version = ipautil.APIVersion(plugin_version)
                     default_version = ipautil.APIVersion(default_version)
                     if version < default_version:
                         continue
-            self.__default_map[plugin.name] = plugin.version
+            self.__default_map[name] = plugin_version
 
         production_mode = self.is_production_mode()
 
@@ -33,7 +33,9 @@ Also see the `ipaserver.rpcserver` module.
 from __future__ import absolute_import
 
 from decimal import Decimal
+import collections
 import datetime
+import errno
 import logging
 import os
 import locale
@@ -42,6 +44,10 @@ import json
 import re
 import socket
 import gzip
+import itertools
+import random
+import threading
+import time
 from cryptography import x509 as crypto_x509
 
 import gssapi
@@ -56,10 +62,13 @@ from ipalib.constants import LDAP_GENERALIZED_TIME_FORMAT
 from ipalib.errors import (public_errors, UnknownError, NetworkError,
                            XMLRPCMarshallError, JSONError)
 from ipalib import errors, capabilities
+from ipalib.frontend import Local
+from ipalib.plugable import Plugin
 from ipalib.request import context, Connection
 from ipalib.x509 import Encoding as x509_Encoding
 from ipapython import ipautil
 from ipapython import session_storage
+from ipapython.connpool import ConnectionPool
 from ipapython.cookie import Cookie
 from ipapython.dnsutil import DNSName
 from ipalib.text import _
@@ -96,6 +105,8 @@ if six.PY3:
 logger = logging.getLogger(__name__)
 
 COOKIE_NAME = 'ipa_session'
+# socket errors raised before a request is sent to the server
+_CONNECT_ERRNOS = (errno.ECONNREFUSED, errno.EHOSTUNREACH, errno.ENETUNREACH)
 CCACHE_COOKIE_KEY = 'X-IPA-Session-Cookie'
 
 errors_by_code = dict((e.errno, e) for e in public_errors)
@@ -303,6 +314,7 @@ class _JSONPrimer(dict):
     * bytes -> {'__base64__': b64encode}
     * datetime -> {'__datetime__': LDAP_GENERALIZED_TIME}
     * DNSName -> {'__dns_name__': unicode}
+    * iterators and generators -> list, consumed one item at a time
 
     The _ipa_obj_hook() functions unserializes the marked JSON objects to
     bytes, datetime and DNSName.
@@ -334,6 +346,8 @@ class _JSONPrimer(dict):
             dict: self._enc_dict,
             crypto_x509.Certificate: self._enc_certificate,
             crypto_x509.CertificateSigningRequest: self._enc_certificate,
+            # streamed results, e.g. ipaldap.LDAPEntryIterator or generators
+            collections.Iterator: self._enc_list,
         })
         # int, long
         for t in six.integer_types:
@@ -404,6 +418,80 @@ class _JSONPrimer(dict):
         return self._enc_bytes(val.public_bytes(x509_Encoding.DER))
 
 
+class _JSONStreamEncoder(object):
+    """Single-pass JSON encoder
+
+    Instead of priming the whole data structure first, IPA types are
+    converted on the fly by the default hook of Python's C accelerated JSON
+    encoder, using the type dispatch table of _JSONPrimer. Lists, tuples and
+    dicts are handled natively by the encoder.
+
+    iterencode() yields the outer ``depth`` levels of containers piece by
+    piece, so a large result list can be written out while it is still being
+    encoded. Python 2 str is bytes for FreeIPA but text for the json module,
+    so on Python 2 values are primed before they are encoded.
+
+    :see: _JSONPrimer
+    """
+    __slots__ = ('_primer', '_encode')
+
+    def __init__(self, version):
+        self._primer = _JSONPrimer(version)
+        self._encode = json.JSONEncoder(
+            default=self._default, check_circular=False).encode
+
+    def _default(self, obj):
+        # only called for types the json module does not handle natively
+        return self._primer[obj.__class__](obj)
+
+    def encode(self, obj):
+        if six.PY2:
+            obj = self._primer.convert(obj)
+        return self._encode(obj)
+
+    def iterencode(self, obj, depth):
+        if depth:
+            if obj.__class__ is dict:
+                return self._iterencode_dict(obj, depth - 1)
+            if (obj.__class__ in (list, tuple) or
+                    isinstance(obj, collections.Iterator)):
+                return self._iterencode_list(obj, depth - 1)
+        return iter((self.encode(obj),))
+
+    def _iterencode_list(self, val, depth, _batch_size=100):
+        yield '['
+        separator = ''
+        if depth:
+            for v in val:
+                yield separator
+                for chunk in self.iterencode(v, depth):
+                    yield chunk
+                separator = ', '
+        else:
+            # setting up the encoder is costly, encode items in batches
+            val = iter(val)
+            while True:
+                batch = list(itertools.islice(val, _batch_size))
+                if not batch:
+                    break
+                yield separator + self.encode(batch)[1:-1]
+                separator = ', '
+        yield ']'
+
+    def _iterencode_dict(self, val, depth):
+        yield '{'
+        separator = ''
+        for k, v in six.iteritems(val):
+            if not isinstance(k, six.string_types):
+                # same as the json module, e.g. 1 -> "1", None -> "null"
+                k = self._encode(k)
+            yield separator + self._encode(k) + ': '
+            for chunk in self.iterencode(v, depth):
+                yield chunk
+            separator = ', '
+        yield '}'
+
+
 def json_encode_binary(val, version, pretty_print=False):
     """Serialize a Python object structure to JSON
 
@@ -414,11 +502,38 @@ def json_encode_binary(val, version, pretty_print=False):
     :note: pretty printing triggers a slow path in Python's JSON module. Only
            use pretty_print in debug mode.
     """
-    result = _JSONPrimer(version).convert(val)
     if pretty_print:
+        result = _JSONPrimer(version).convert(val)
         return json.dumps(result, indent=4, sort_keys=True)
     else:
-        return json.dumps(result)
+        return _JSONStreamEncoder(version).encode(val)
+
+
+def json_encode_binary_iter(val, version, depth=3, chunk_size=65536):
+    """Serialize a Python object structure to JSON in chunks
+
+    Same as json_encode_binary() but returns a generator of UTF-8 encoded
+    chunks of roughly ``chunk_size`` bytes. The first chunk is available
+    before the whole structure is encoded.
+
+    :param object val: Python object structure
+    :param str version: client version
+    :param int depth: number of outer container levels written piece by
+                      piece, inner values are encoded at once
+    :param int chunk_size: minimal size of a chunk
+    :return: iterator of bytes
+    """
+    buf = []
+    size = 0
+    for piece in _JSONStreamEncoder(version).iterencode(val, depth):
+        buf.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(buf).encode('utf-8')
+            buf = []
+            size = 0
+    if buf:
+        yield ''.join(buf).encode('utf-8')
 
 
 def _ipa_obj_hook(dct, _iteritems=six.iteritems, _list=list):
@@ -554,8 +669,205 @@ class LanguageAwareTransport(MultiProtocolTransport):
         return (host, extra_headers, x509)
 
 
+class HTTPConnectionPool(ConnectionPool):
+    """
+    Per-process pool of idle keep-alive HTTPS connections.
+
+    Connections are keyed by ``(host, principal, CA file)``, so that threads
+    sharing an RPC client reuse connections instead of piling them up.
+    """
+
+    def _close(self, conn):
+        conn.close()
+
+
+class ServerDiscovery(object):
+    """
+    Cache of the IPA servers found in DNS and of their health.
+
+    SRV records are cached for their TTL. Servers are ordered by SRV
+    priority and weight (RFC 2782), servers which failed in the last
+    ``penalty`` seconds go last and faster servers go first within a
+    priority, latency is compared in steps of ``LATENCY_STEP`` seconds so
+    that servers with similar latency keep their weighted order.
+    """
+
+    LATENCY_STEP = 0.05
+    # weight of the last measurement in the latency average
+    LATENCY_ALPHA = 0.3
+    # time to live of an empty SRV lookup result [seconds]
+    NEGATIVE_TTL = 60
+
+    def __init__(self, penalty):
+        self.penalty = penalty
+        self._lock = threading.Lock()
+        # qname -> (expiration, [(priority, weight, host)])
+        self._srv = {}
+        # host -> latency average
+        self._latency = {}
+        # host -> time of the last failure
+        self._failed = {}
+
+    def lookup_srv(self, qname):
+        """
+        Return cached ``(priority, weight, host)`` tuples of SRV ``qname``.
+        """
+        now = time.time()
+        with self._lock:
+            cached = self._srv.get(qname)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        try:
+            answers = resolver.query(qname, rdatatype.SRV)
+        except DNSException as e:
+            logger.debug("DNS record not found: %s", e.__class__.__name__)
+            records, ttl = [], self.NEGATIVE_TTL
+        else:
+            records = [
+                (answer.priority, answer.weight,
+                 str(answer.target).rstrip("."))
+                for answer in answers
+            ]
+            ttl = answers.rrset.ttl
+        with self._lock:
+            self._srv[qname] = (now + ttl, records)
+        return records
+
+    def get_servers(self, domain, location=None):
+        """
+        Return the IPA servers of ``domain``, best server first.
+
+        The servers of the IPA ``location`` are looked up first, IPA DNS
+        servers publish all servers there, with the local ones preferred.
+        """
+        records = []
+        if location:
+            records = self.lookup_srv(
+                '_ldap._tcp.%s._locations.%s.' % (location, domain))
+        if not records:
+            records = self.lookup_srv('_ldap._tcp.%s.' % domain)
+        return self.rank(records)
+
+    def rank(self, records):
+        """
+        Order ``(priority, weight, host)`` tuples, return the hosts.
+        """
+        by_priority = collections.defaultdict(list)
+        for priority, weight, host in records:
+            by_priority[priority].append((weight, host))
+
+        ordered = []
+        for priority in sorted(by_priority):
+            candidates = by_priority[priority]
+            # weighted random selection of RFC 2782
+            while candidates:
+                total = sum(weight for weight, _host in candidates)
+                pick = random.uniform(0, total)
+                for i, (weight, host) in enumerate(candidates):
+                    pick -= weight
+                    if pick <= 0:
+                        break
+                ordered.append((priority, host))
+                del candidates[i]
+
+        now = time.time()
+        with self._lock:
+            def key(item):
+                priority, host = item
+                return (self._is_failed(host, now), priority,
+                        int(self._latency.get(host, 0) / self.LATENCY_STEP))
+            ordered.sort(key=key)
+
+        hosts = []
+        for _priority, host in ordered:
+            if host not in hosts:
+                hosts.append(host)
+        return hosts
+
+    def is_failed(self, host):
+        """
+        Return True if ``host`` failed in the last ``penalty`` seconds.
+        """
+        with self._lock:
+            return self._is_failed(host, time.time())
+
+    def _is_failed(self, host, now):
+        return self._failed.get(host, 0) > now - self.penalty
+
+    def record_success(self, host, latency=None):
+        with self._lock:
+            self._failed.pop(host, None)
+            if latency is not None:
+                average = self._latency.get(host)
+                if average is not None:
+                    latency = (self.LATENCY_ALPHA * latency +
+                               (1 - self.LATENCY_ALPHA) * average)
+                self._latency[host] = latency
+
+    def record_failure(self, host):
+        with self._lock:
+            self._failed[host] = time.time()
+
+    def probe(self, hosts, port, timeout):
+        """
+        Connect to all ``hosts`` in parallel, return them best first.
+
+        The first host of ``hosts`` to accept a connection within ``timeout``
+        seconds goes first, hosts known to be unreachable are left out. If
+        no host is reachable, ``hosts`` is returned as it is.
+        """
+        results = {}
+        done = threading.Condition()
+
+        def connect(host):
+            start = time.time()
+            try:
+                sock = socket.create_connection((host, port), timeout)
+            except (socket.error, socket.timeout) as e:
+                logger.debug("Cannot connect to %s: %s", host, e)
+                self.record_failure(host)
+                reachable = False
+            else:
+                sock.close()
+                self.record_success(host, time.time() - start)
+                reachable = True
+            with done:
+                results[host] = reachable
+                done.notify_all()
+
+        for host in hosts:
+            thread = threading.Thread(
+                target=connect, args=(host,), name='probe-%s' % host)
+            thread.daemon = True
+            thread.start()
+
+        deadline = time.time() + timeout
+        best = None
+        with done:
+            for host in hosts:
+                while host not in results:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    done.wait(remaining)
+                if results.get(host):
+                    best = host
+                    break
+            if best is None:
+                return list(hosts)
+            return [best] + [h for h in hosts
+                             if h != best and results.get(h) is not False]
+
+
 class SSLTransport(LanguageAwareTransport):
     """Handles an HTTPS transaction to an XML-RPC server."""
+    def __init__(self, *args, **kwargs):
+        LanguageAwareTransport.__init__(self, *args, **kwargs)
+        self._pool = kwargs.get('pool')
+        self._pool_key = None
+        self.connect_failed = False
+
     def make_connection(self, host):
         host, self._extra_headers, _x509 = self.get_host_info(host)
 
@@ -563,18 +875,55 @@ class SSLTransport(LanguageAwareTransport):
             logger.debug("HTTP connection keep-alive (%s)", host)
             return self._connection[1]
 
-        conn = create_https_connection(
-            host, 443,
-            getattr(context, 'ca_certfile', None),
-            tls_version_min=api.env.tls_version_min,
-            tls_version_max=api.env.tls_version_max)
+        self.close()
+        ca_certfile = getattr(context, 'ca_certfile', None)
+        conn = None
+        if self._pool is not None:
+            self._pool_key = (
+                host, getattr(context, 'principal', None), ca_certfile)
+            conn = self._pool.get(self._pool_key)
 
-        conn.connect()
-        logger.debug("New HTTP connection (%s)", host)
+        if conn is not None:
+            logger.debug("HTTP connection reused from pool (%s)", host)
+        else:
+            conn = create_https_connection(
+                host, 443,
+                ca_certfile,
+                tls_version_min=api.env.tls_version_min,
+                tls_version_max=api.env.tls_version_max)
+
+            # no request was sent when the connection or the TLS handshake
+            # fails, so the caller may safely try another server
+            self.connect_failed = True
+            conn.connect()
+            self.connect_failed = False
+            logger.debug("New HTTP connection (%s)", host)
+            if self._pool is not None:
+                self._pool.add(self._pool_key, conn)
 
         self._connection = host, conn
         return self._connection[1]
 
+    def close(self):
+        """
+        Return the connection to the pool, close it if there is no pool.
+        """
+        host, conn = self._connection
+        # the socket is gone when the server did not keep the connection alive
+        if (self._pool is not None and conn is not None and
+                conn.sock is not None and self._pool.release(conn)):
+            self._connection = (None, None)
+            logger.debug("HTTP connection returned to pool (%s)", host)
+        else:
+            self._close_connection()
+
+    def _close_connection(self):
+        # a connection in an unknown state must never be pooled
+        conn = self._connection[1]
+        if self._pool is not None and conn is not None:
+            self._pool.discard(conn)
+        LanguageAwareTransport.close(self)
+
 
 class KerbTransport(SSLTransport):
     """
@@ -732,12 +1081,12 @@ class KerbTransport(SSLTransport):
         except RemoteDisconnected:
             # keep-alive connection was terminated by remote peer, close
             # connection and let transport handle reconnect for us.
-            self.close()
+            self._close_connection()
             logger.debug("HTTP server has closed connection (%s)", host)
             raise
         except BaseException as e:
             # Unexpected exception may leave connections in a bad state.
-            self.close()
+            self._close_connection()
             logger.debug("HTTP connection destroyed (%s)",
                          host, exc_info=True)
             raise
@@ -865,6 +1214,20 @@ class RPCClient(Connectible):
     protocol = None
     env_rpc_uri_key = None
 
+    connection_pool = Plugin.finalize_attr('connection_pool')
+    server_discovery = Plugin.finalize_attr('server_discovery')
+
+    def _on_finalize(self):
+        super(RPCClient, self)._on_finalize()
+        pool = None
+        if self.api.env.rpc_pool_size > 0:
+            pool = HTTPConnectionPool(
+                maxsize=self.api.env.rpc_pool_size,
+                idle_timeout=self.api.env.rpc_pool_idle_timeout)
+        self.connection_pool = pool
+        self.server_discovery = ServerDiscovery(
+            penalty=self.api.env.rpc_server_penalty)
+
     def get_url_list(self, rpc_uri):
         """
         Create a list of urls consisting of the available IPA servers.
@@ -872,32 +1235,48 @@ class RPCClient(Connectible):
         # the configured URL defines what we use for the discovered servers
         (_scheme, _netloc, path, _params, _query, _fragment
             ) = urllib.parse.urlparse(rpc_uri)
-        servers = []
-        name = '_ldap._tcp.%s.' % self.env.domain
-
-        try:
-            answers = resolver.query(name, rdatatype.SRV)
-        except DNSException:
-            answers = []
-
-        for answer in answers:
-            server = str(answer.target).rstrip(".")
-            servers.append('https://%s%s' % (ipautil.format_netloc(server), path))
-
-        servers = list(set(servers))
-        # the list/set conversion won't preserve order so stick in the
-        # local config file version here.
+        discovery = self.server_discovery
+        servers = [
+            'https://%s%s' % (ipautil.format_netloc(server), path)
+            for server in discovery.get_servers(
+                self.env.domain, self.env.location)
+        ]
+
+        # make sure the configured master server is there just once and
+        # it is the first one, unless it failed recently
         cfg_server = rpc_uri
         if cfg_server in servers:
-            # make sure the configured master server is there just once and
-            # it is the first one
             servers.remove(cfg_server)
-            servers.insert(0, cfg_server)
+        if discovery.is_failed(urllib.parse.urlsplit(rpc_uri).hostname):
+            index = len([url for url in servers if not discovery.is_failed(
+                urllib.parse.urlsplit(url).hostname)])
+            servers.insert(index, cfg_server)
         else:
             servers.insert(0, cfg_server)
 
         return servers
 
+    def probe_url_list(self, urls):
+        """
+        Order ``urls`` by the servers which accept connections.
+
+        All servers are probed in parallel, see `ServerDiscovery.probe`.
+        """
+        by_host = collections.OrderedDict()
+        for url in urls:
+            split_url = urllib.parse.urlsplit(url)
+            by_host.setdefault(
+                (split_url.hostname, split_url.port or 443), []).append(url)
+
+        ports = set(port for _host, port in by_host)
+        if len(ports) != 1:
+            return urls
+        port = ports.pop()
+        hosts = self.server_discovery.probe(
+            [host for host, _port in by_host], port,
+            self.env.rpc_probe_timeout)
+        return [url for host in hosts for url in by_host[(host, port)]]
+
     def get_session_cookie_from_persistent_storage(self, principal):
         '''
         Retrieves the session cookie for the given principal from the
@@ -1001,7 +1380,15 @@ class RPCClient(Connectible):
         return session_url
 
     def create_connection(self, ccache=None, verbose=None, fallback=None,
-                          delegate=None, ca_certfile=None):
+                          delegate=None, ca_certfile=None, probe=None):
+        """
+        Create a server proxy for the first available IPA server.
+
+        With more than one server the server is probed with ``ping`` unless
+        ``probe`` is False. By default the probe is skipped when a session
+        cookie is available, as the session shows the server was in use;
+        `forward` falls back to probing if the server cannot be reached.
+        """
         if verbose is None:
             verbose = self.api.env.verbose
         if fallback is None:
@@ -1030,6 +1417,11 @@ class RPCClient(Connectible):
             # No session key, do full Kerberos auth
             pass
         urls = self.get_url_list(rpc_uri)
+        if probe is None:
+            probe = not getattr(context, 'session_cookie', None)
+        if probe and fallback and len(urls) > 1:
+            urls = self.probe_url_list(urls)
+        discovery = self.server_discovery
 
         proxy_kw = {
             'allow_none': True,
@@ -1038,26 +1430,30 @@ class RPCClient(Connectible):
         }
 
         for url in urls:
+            host = urllib.parse.urlsplit(url).hostname
             # should we get ProtocolError (=> error in HTTP response) and
             # 401 (=> Unauthorized), we'll be re-trying with new session
             # cookies several times
             for _try_num in range(0, 5):
+                transport_kw = dict(
+                    protocol=self.protocol, service='HTTP', ccache=ccache)
                 if url.startswith('https://'):
                     if delegate:
                         transport_class = DelegatedKerbTransport
                     else:
                         transport_class = KerbTransport
+                    transport_kw['pool'] = self.connection_pool
                 else:
                     transport_class = LanguageAwareTransport
-                proxy_kw['transport'] = transport_class(
-                    protocol=self.protocol, service='HTTP', ccache=ccache)
+                proxy_kw['transport'] = transport_class(**transport_kw)
                 logger.info('trying %s', url)
                 setattr(context, 'request_url', url)
                 serverproxy = self.server_proxy_class(url, **proxy_kw)
-                if len(urls) == 1:
+                if len(urls) == 1 or not probe:
                     # if we have only 1 server and then let the
                     # main requester handle any errors. This also means it
                     # must handle a 401 but we save a ping.
+                    proxy_kw['transport'].probe_skipped = len(urls) > 1
                     return serverproxy
                 try:
                     command = getattr(serverproxy, 'ping')
@@ -1075,6 +1471,7 @@ class RPCClient(Connectible):
                                 server=url,
                             )
                     # We don't care about the response, just that we got one
+                    discovery.record_success(host)
                     return serverproxy
                 except errors.KerberosError:
                     # kerberos error on one server is likely on all
@@ -1091,6 +1488,7 @@ class RPCClient(Connectible):
                             pass
                         # try the same url once more with a new session cookie
                         continue
+                    discovery.record_failure(host)
                     if not fallback:
                         raise
                     else:
@@ -1099,6 +1497,7 @@ class RPCClient(Connectible):
                     # try the next url
                     break
                 except Exception as e:
+                    discovery.record_failure(host)
                     if not fallback:
                         raise
                     else:
@@ -1133,14 +1532,14 @@ class RPCClient(Connectible):
         :param args: Positional arguments to pass to remote command.
         :param kw: Keyword arguments to pass to remote command.
         """
-        server = getattr(context, 'request_url', None)
-        command = getattr(self.conn, name)
         params = [args, kw]
 
         # we'll be trying to connect multiple times with a new session cookie
         # each time should we be getting UNAUTHORIZED error from the server
         max_tries = 5
         for try_num in range(0, max_tries):
+            server = getattr(context, 'request_url', None)
+            command = getattr(self.conn, name)
             logger.info("[try %d]: Forwarding '%s' to %s server '%s'",
                         try_num+1, name, self.protocol, server)
             try:
@@ -1177,7 +1576,8 @@ class RPCClient(Connectible):
                     # Create a new serverproxy with the non-session URI
                     serverproxy = self.create_connection(
                         os.environ.get('KRB5CCNAME'), self.env.verbose,
-                        self.env.fallback, self.env.delegate)
+                        self.env.fallback, self.env.delegate,
+                        getattr(context, 'ca_certfile', None))
 
                     setattr(context, self.id,
                             Connection(serverproxy, self.disconnect))
@@ -1185,6 +1585,24 @@ class RPCClient(Connectible):
                     continue
                 raise NetworkError(uri=server, error=e.errmsg)
             except (SSLError, socket.error) as e:
+                transport = self.conn._ServerProxy__transport
+                not_sent = (getattr(transport, 'connect_failed', False) or
+                            getattr(e, 'errno', None) in _CONNECT_ERRNOS)
+                if (getattr(transport, 'probe_skipped', False) and
+                        self.env.fallback and not_sent):
+                    # the server was not probed by create_connection(), the
+                    # request was not sent so try the other servers
+                    logger.info('Connection to %s failed with %s', server, e)
+                    self.server_discovery.record_failure(
+                        urllib.parse.urlsplit(server).hostname)
+                    self.destroy_connection()
+                    serverproxy = self.create_connection(
+                        os.environ.get('KRB5CCNAME'), self.env.verbose,
+                        self.env.fallback, self.env.delegate,
+                        getattr(context, 'ca_certfile', None), probe=True)
+                    setattr(context, self.id,
+                            Connection(serverproxy, self.disconnect))
+                    continue
                 raise NetworkError(uri=server, error=str(e))
             except (OverflowError, TypeError) as e:
                 raise XMLRPCMarshallError(error=str(e))
@@ -1283,3 +1701,178 @@ class jsonclient(RPCClient):
     server_proxy_class = JSONServerProxy
     protocol = 'json'
     env_rpc_uri_key = 'jsonrpc_uri'
+
+
+class BatchCall(object):
+    """
+    Command call queued by `Batch`, resolved when its batch is forwarded.
+    """
+
+    def __init__(self, batch, command, args, options):
+        self.command = command
+        self.args = args
+        self.options = options
+        self._batch = batch
+        self._done = False
+        self._result = None
+        self._error = None
+
+    def done(self):
+        """
+        Return True if the call was forwarded and its result is known.
+        """
+        return self._done
+
+    def result(self):
+        """
+        Return the result of the command or raise its error.
+
+        The queued calls are forwarded first if the call is still queued.
+        """
+        if not self._done:
+            self._batch.flush()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def _set_result(self, result):
+        error = result.pop('error', None)
+        if error is None:
+            if ('summary' in self.command.output and
+                    'summary' not in result):
+                result['summary'] = self.command.get_summary_default(result)
+            self._result = result
+        else:
+            code = result.get('error_code')
+            try:
+                error_class = errors_by_code[code]
+            except KeyError:
+                self._error = UnknownError(
+                    code=code,
+                    error=error,
+                    server=getattr(context, 'request_url', None),
+                )
+            else:
+                kw = dict(result.get('error_kw') or {})
+                kw['message'] = error
+                self._error = error_class(**kw)
+        self._done = True
+
+    def _set_error(self, error):
+        self._error = error
+        self._done = True
+
+
+class _BatchCommands(object):
+    def __init__(self, batch):
+        self.__batch = batch
+
+    def __getitem__(self, name):
+        def _call(*args, **options):
+            return self.__batch.call(name, *args, **options)
+        return _call
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+
+class Batch(object):
+    """
+    Queue commands and forward them to the server with the batch command.
+
+    ``batch.Command.<name>(...)`` takes the same arguments as
+    ``api.Command.<name>(...)``. The arguments are converted on the client
+    right away and the call is queued. The queued calls are forwarded in one
+    request once ``size`` calls are queued, when `flush` is called, when the
+    result of a queued call is requested and when the ``with`` block ends.
+    Every call returns a `BatchCall`, whose ``result()`` returns the result
+    of the command or raises its error:
+
+    >>> with Batch(api, size=100) as batch:  # doctest: +SKIP
+    ...     calls = [batch.Command.user_add(uid, givenname=u'Test', sn=u'User')
+    ...              for uid in uids]
+    >>> [call.result()['value'] for call in calls]  # doctest: +SKIP
+
+    With ``parallel`` the server executes consecutive read-only commands
+    concurrently. Client side command overrides are not run, the commands
+    are forwarded as the server defines them.
+    """
+
+    def __init__(self, api, size=100, parallel=False):
+        if size < 1:
+            raise ValueError('batch size must be positive: %r' % size)
+        self.api = api
+        self.size = size
+        self.parallel = parallel
+        self.Command = _BatchCommands(self)
+        self.__queue = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # queued calls were already issued by the caller, forward them
+        # even if the block failed, as unbatched calls would have been
+        self.flush()
+
+    def __len__(self):
+        return len(self.__queue)
+
+    def call(self, name, *args, **options):
+        """
+        Queue the command ``name`` and return its `BatchCall`.
+        """
+        command = self.api.Command[name]
+        if isinstance(command, Local):
+            raise errors.CommandError(name=name)
+
+        if 'version' in options:
+            command.verify_client_version(unicode(options['version']))
+        elif self.api.env.skip_version_check:
+            options['version'] = u'2.0'
+        else:
+            options['version'] = command.api_version
+        params = command.args_options_2_params(*args, **options)
+        params = command.normalize(**params)
+        params = command.convert(**params)
+        args, options = command.params_2_args_options(**params)
+
+        call = BatchCall(self, command, args, options)
+        self.__queue.append(call)
+        if len(self.__queue) >= self.size:
+            self.flush()
+        return call
+
+    def flush(self):
+        """
+        Forward the queued calls and resolve their `BatchCall` objects.
+
+        Errors of the individual commands are raised by their
+        ``BatchCall.result()``, an error of the batch request itself is
+        raised here and by the results of all its calls.
+        """
+        queue, self.__queue = self.__queue, []
+        if not queue:
+            return
+
+        methods = [
+            dict(method=call.command.forwarded_name,
+                 params=[call.args, call.options])
+            for call in queue
+        ]
+        # pylint: disable=protected-access
+        options = {}
+        if self.parallel:
+            options['parallel'] = True
+        logger.debug('Forwarding batch of %d commands', len(methods))
+        try:
+            output = self.api.Command.batch(*methods, **options)
+        except Exception as e:
+            for call in queue:
+                call._set_error(e)
+            raise
+
+        for call, result in zip(queue, output['results']):
+            call._set_result(result)
@@ -0,0 +1,262 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+"""
+Per-phase timing of command calls.
+
+Timing is opt-in. With ``command_timing_sample = N`` in the IPA
+configuration, one command call in N (on average) is timed; 0 disables
+timing. The wall time of each phase of a timed call is recorded: parameter
+normalization, conversion and validation, execution, pre and post callbacks,
+each LDAP operation and marshalling of the response. Phases nest, e.g. LDAP
+operations run during the execution, so their times are not exclusive.
+The number of entries returned by LDAP searches, the number of truncated
+searches and the slowest LDAP operations are recorded too.
+
+When a timed call finishes, its phases are logged as one JSON object and
+added to per-command statistics. If ``command_timing_dir`` is set, the
+statistics of the process are written to ``<pid>.json`` in that directory
+at most every ``command_timing_interval`` seconds.
+"""
+import contextlib
+import copy
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+
+from ipalib.request import context
+
+logger = logging.getLogger(__name__)
+
+LDAP_PHASE_PREFIX = 'ldap_'
+
+# Number of the slowest LDAP operations kept by CommandTimer
+SLOWEST_LDAP_OPERATIONS = 5
+
+
+class CommandTimer(object):
+    """
+    Wall time and number of the phases of a single command call.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.start = time.time()
+        self.elapsed = None
+        self.phases = {}
+        self.ldap_entries = 0
+        self.ldap_truncated = 0
+        self.ldap_slowest = []
+
+    def add(self, phase, seconds, count=1):
+        stat = self.phases.get(phase)
+        if stat is None:
+            stat = self.phases[phase] = [0, 0.0]
+        stat[0] += count
+        stat[1] += seconds
+
+    def add_ldap_operation(self, op):
+        """
+        Record an `ipapython.ipaldap.LDAPOperation`.
+        """
+        self.add(LDAP_PHASE_PREFIX + op.operation, op.duration)
+        self.ldap_entries += op.count
+        if op.truncated:
+            self.ldap_truncated += 1
+        slowest = self.ldap_slowest
+        if (len(slowest) < SLOWEST_LDAP_OPERATIONS or
+                op.duration > slowest[-1]['duration']):
+            slowest.append(op.as_dict())
+            slowest.sort(key=lambda d: d['duration'], reverse=True)
+            del slowest[SLOWEST_LDAP_OPERATIONS:]
+
+    @property
+    def ldap_ops(self):
+        return sum(count for phase, (count, _seconds) in self.phases.items()
+                   if phase.startswith(LDAP_PHASE_PREFIX))
+
+    def as_dict(self):
+        return dict(
+            command=self.name,
+            elapsed=self.elapsed,
+            ldap_ops=self.ldap_ops,
+            ldap=dict(
+                entries=self.ldap_entries,
+                truncated=self.ldap_truncated,
+                slowest=self.ldap_slowest,
+            ),
+            phases=dict(
+                (phase, dict(count=count, time=seconds))
+                for phase, (count, seconds) in self.phases.items()
+            ),
+        )
+
+
+class CommandStats(object):
+    """
+    Timing statistics of the timed command calls of this process.
+    """
+    def __init__(self):
+        self.commands = {}
+        self.last_write = time.time()
+        self._lock = threading.Lock()
+
+    def add(self, timer):
+        with self._lock:
+            stat = self.commands.get(timer.name)
+            if stat is None:
+                stat = self.commands[timer.name] = dict(
+                    calls=0, time=0.0, max=0.0, ldap_ops=0, ldap_entries=0,
+                    ldap_truncated=0, phases={})
+            stat['calls'] += 1
+            stat['time'] += timer.elapsed
+            stat['max'] = max(stat['max'], timer.elapsed)
+            stat['ldap_ops'] += timer.ldap_ops
+            stat['ldap_entries'] += timer.ldap_entries
+            stat['ldap_truncated'] += timer.ldap_truncated
+            for phase, (count, seconds) in timer.phases.items():
+                phase_stat = stat['phases'].setdefault(
+                    phase, dict(count=0, time=0.0))
+                phase_stat['count'] += count
+                phase_stat['time'] += seconds
+
+    def as_dict(self):
+        with self._lock:
+            return copy.deepcopy(self.commands)
+
+    def write(self, directory, sample):
+        """
+        Atomically replace the statistics file of this process.
+        """
+        data = dict(
+            pid=os.getpid(),
+            updated=time.time(),
+            sample=sample,
+            commands=self.as_dict(),
+        )
+        filename = os.path.join(directory, '%d.json' % os.getpid())
+        fd, tmpname = tempfile.mkstemp(dir=directory, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, sort_keys=True)
+            os.rename(tmpname, filename)
+        except Exception:
+            os.unlink(tmpname)
+            raise
+
+    def write_due(self, interval):
+        """
+        Return True if the statistics were not written for ``interval``
+        seconds, and reset the interval.
+        """
+        with self._lock:
+            now = time.time()
+            if now - self.last_write < interval:
+                return False
+            self.last_write = now
+            return True
+
+
+stats = CommandStats()
+
+
+def current():
+    """
+    Return the timer of the command call of this thread, if it is timed.
+    """
+    return getattr(context, 'command_timer', None)
+
+
+def start(name, env):
+    """
+    Start timing a call of command ``name``, subject to sampling.
+
+    Return the new timer, or None if the call is not sampled or if a call
+    is already timed in this thread. Nested command calls are recorded in
+    the timer of the outermost call.
+    """
+    sample = env.command_timing_sample
+    if not sample or current() is not None:
+        return None
+    if sample > 1 and random.randint(1, sample) != 1:
+        return None
+    timer = CommandTimer(name)
+    context.command_timer = timer
+    return timer
+
+
+def detach(timer):
+    """
+    Stop recording phases of this thread in ``timer``.
+    """
+    if current() is timer:
+        del context.command_timer
+
+
+def finish(timer, env):
+    """
+    Log ``timer`` and add it to the statistics of the process.
+    """
+    detach(timer)
+    timer.elapsed = time.time() - timer.start
+    logger.info('timing: %s', json.dumps(timer.as_dict(), sort_keys=True))
+    stats.add(timer)
+    directory = env.command_timing_dir
+    if directory and stats.write_due(env.command_timing_interval):
+        try:
+            stats.write(directory, env.command_timing_sample)
+        except (IOError, OSError) as e:
+            logger.warning('Cannot write command timing statistics to %s: %s',
+                           directory, e)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """
+    Record the wall time of the block as phase ``name`` of the timed call.
+    """
+    timer = current()
+    if timer is None:
+        yield
+        return
+    start_time = time.time()
+    try:
+        yield
+    finally:
+        timer.add(name, time.time() - start_time)
+
+
+def timed(func, name):
+    """
+    Return ``func`` recording its calls as phase ``name`` if timed.
+    """
+    if current() is None:
+        return func
+
+    def wrapper(*args, **kw):
+        with phase(name):
+            return func(*args, **kw)
+    return wrapper
+
+
+def timed_iter(iterable, name, timer, env):
+    """
+    Yield from ``iterable``, recording the time spent producing the items
+    as phase ``name`` of ``timer``. ``timer`` is finished at the end.
+    """
+    iterator = iter(iterable)
+    try:
+        while True:
+            start_time = time.time()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                timer.add(name, time.time() - start_time, count=0)
+            yield item
+    finally:
+        finish(timer, env)
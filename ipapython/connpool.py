@@ -0,0 +1,146 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Pool of idle connections shared by the threads of a process.
+"""
+
+import threading
+import time
+
+
+class ConnectionPool(object):
+    """
+    Per-process pool of idle connections.
+
+    Connections are keyed, e.g. by the identity they were authenticated with,
+    and are only ever handed out again to a caller presenting the same key.
+    Idle connections older than ``idle_timeout`` seconds are closed, at most
+    ``maxsize`` idle connections are kept and every connection is checked
+    with `_check` before it is reused.
+
+    Subclasses implement `_close` and may implement `_check`.
+    """
+
+    def __init__(self, maxsize, idle_timeout):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+        self._lock = threading.Lock()
+        # (key, conn, last used) tuples, least recently used first
+        self._idle = []
+        # id(conn) -> key of connections handed out by the pool
+        self._leased = {}
+
+    def get(self, key):
+        """
+        Return an idle connection for ``key`` or None.
+        """
+        while True:
+            conn = None
+            with self._lock:
+                expired = self._expire(time.time())
+                for i in range(len(self._idle) - 1, -1, -1):
+                    if self._idle[i][0] == key:
+                        conn = self._idle.pop(i)[1]
+                        break
+                else:
+                    self.misses += 1
+            self._close_all(expired)
+            if conn is None:
+                return None
+
+            if self._check(conn):
+                with self._lock:
+                    self.hits += 1
+                    self._leased[id(conn)] = key
+                return conn
+
+            with self._lock:
+                self.discarded += 1
+            self._close(conn)
+
+    def add(self, key, conn):
+        """
+        Register a new connection so that it is pooled on release.
+        """
+        with self._lock:
+            self._leased[id(conn)] = key
+
+    def release(self, conn):
+        """
+        Return a connection with no request in progress to the pool.
+
+        Returns False if the connection does not belong to the pool and should
+        be closed by the caller.
+        """
+        with self._lock:
+            key = self._leased.pop(id(conn), None)
+            if key is None:
+                return False
+            now = time.time()
+            self._idle.append((key, conn, now))
+            evicted = self._expire(now)
+            excess = len(self._idle) - self.maxsize
+            if excess > 0:
+                evicted.extend(self._idle[:excess])
+                del self._idle[:excess]
+                self.discarded += excess
+
+        self._close_all(evicted)
+        return True
+
+    def discard(self, conn):
+        """
+        Forget a connection which cannot be reused, the caller closes it.
+        """
+        with self._lock:
+            if self._leased.pop(id(conn), None) is not None:
+                self.discarded += 1
+
+    def clear(self):
+        """
+        Close all idle connections.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        self._close_all(idle)
+
+    def stats(self):
+        """
+        Return a dict with pool hit, miss and size counters.
+        """
+        with self._lock:
+            return dict(
+                hits=self.hits,
+                misses=self.misses,
+                discarded=self.discarded,
+                idle=len(self._idle),
+                leased=len(self._leased),
+            )
+
+    def _expire(self, now):
+        # called with self._lock held, the caller closes the returned
+        # connections once the lock is released
+        deadline = now - self.idle_timeout
+        expired = [item for item in self._idle if item[2] < deadline]
+        if expired:
+            self._idle = [item for item in self._idle if item[2] >= deadline]
+            self.discarded += len(expired)
+        return expired
+
+    def _check(self, conn):
+        """
+        Return False if an idle connection cannot be reused.
+        """
+        return True
+
+    def _close(self, conn):
+        raise NotImplementedError()
+
+    def _close_all(self, items):
+        for _key, conn, _last_used in items:
+            self._close(conn)
@@ -421,6 +421,8 @@ from __future__ import print_function
 
 import sys
 import functools
+import threading
+from collections import OrderedDict
 
 import cryptography.x509
 from ldap.dn import str2dn, dn2str
@@ -460,6 +462,83 @@ def _normalize_ava_input(val):
     return val
 
 
+class _DNStringCache(object):
+    """
+    Bounded LRU cache of parsed DN strings
+
+    Maps a DN string to its parsed, sorted and immutable RDN sequence, see
+    DN._rdns_from_value(). The same DN strings (base DN, containers, member
+    values of popular groups) are parsed over and over again by the
+    framework, so keeping the most recently used ones saves repeated
+    str2dn() calls.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+_dn_string_cache = _DNStringCache(maxsize=4096)
+
+
+def _str2rdns(value):
+    """
+    Parse DN string into a tuple of RDNs, each a sorted tuple of AVAs
+
+    Results are cached in _dn_string_cache.
+    """
+    rdns = _dn_string_cache.get(value)
+    if rdns is None:
+        raw = value
+        try:
+            if isinstance(raw, six.text_type):
+                raw = val_encode(raw)
+            parsed = str2dn(raw)
+        except DECODING_ERROR:
+            raise ValueError("malformed RDN string = \"%s\"" % value)
+        rdns = tuple(_make_rdn(rdn) for rdn in parsed)
+        _dn_string_cache.set(value, rdns)
+    return rdns
+
+
+def _make_rdn(avas):
+    """
+    Convert a sequence of openldap AVAs to the immutable form stored by DN
+    """
+    rdn = [tuple(ava) for ava in avas]
+    sort_avas(rdn)
+    return tuple(rdn)
+
+
 def str2rdn(value):
     try:
         rdns = str2dn(value.encode('utf-8'))
@@ -1103,36 +1182,44 @@ class DN(object):
     AVA_type = AVA
     RDN_type = RDN
 
+    # rdns is a tuple of RDNs, each RDN a sorted tuple of openldap AVA
+    # tuples. _key is the normalized (case folded) form used for hashing
+    # and comparison; it is computed on first use and never changes.
+    __slots__ = ('rdns', '_key', '_hash')
+
     def __init__(self, *args, **kwds):
-        self.rdns = self._rdns_from_sequence(args)
+        self._hash = None
+        if len(args) == 1 and isinstance(args[0], DN):
+            # copy of an immutable object, share everything
+            self.rdns = args[0].rdns
+            self._key = args[0]._key
+        else:
+            self.rdns = self._rdns_from_sequence(args)
+            self._key = None
 
-    def _copy_rdns(self, rdns=None):
-        if not rdns:
-            rdns = self.rdns
-        return [[list(a) for a in rdn] for rdn in rdns]
+    @classmethod
+    def _from_rdns(cls, rdns):
+        dn = cls.__new__(cls)
+        dn.rdns = rdns
+        dn._key = None
+        dn._hash = None
+        return dn
 
     def _rdns_from_value(self, value):
         if isinstance(value, six.string_types):
-            try:
-                if isinstance(value, six.text_type):
-                    value = val_encode(value)
-                rdns = str2dn(value)
-            except DECODING_ERROR:
-                raise ValueError("malformed RDN string = \"%s\"" % value)
-            for rdn in rdns:
-                sort_avas(rdn)
+            rdns = _str2rdns(value)
         elif isinstance(value, DN):
-            rdns = value._copy_rdns()
+            rdns = value.rdns
         elif isinstance(value, (tuple, list, AVA)):
             ava = get_ava(value)
-            rdns = [[ava]]
+            rdns = ((tuple(ava),),)
         elif isinstance(value, RDN):
-            rdns = [value.to_openldap()]
+            rdns = (_make_rdn(value.to_openldap()),)
         elif isinstance(value, cryptography.x509.name.Name):
-            rdns = list(reversed([
-                [get_ava(
+            rdns = tuple(reversed([
+                (tuple(get_ava(
                     ATTR_NAME_BY_OID.get(ava.oid, ava.oid.dotted_string),
-                    ava.value)]
+                    ava.value)),)
                 for ava in value
             ]))
         else:
@@ -1142,16 +1229,39 @@ class DN(object):
         return rdns
 
     def _rdns_from_sequence(self, seq):
-        rdns = []
+        if len(seq) == 1:
+            return self._rdns_from_value(seq[0])
 
+        rdns = ()
         for item in seq:
-            rdn = self._rdns_from_value(item)
-            rdns.extend(rdn)
+            rdns += self._rdns_from_value(item)
         return rdns
 
+    def _get_key(self):
+        key = self._key
+        if key is None:
+            key = tuple(rdn_key(rdn) for rdn in self.rdns)
+            self._key = key
+        return key
+
+    def __copy__(self):
+        return self
+
     def __deepcopy__(self, memo):
         return self
 
+    def __getstate__(self):
+        # a dict is never false, even for an empty DN; copy and pickle
+        # skip __setstate__() for a false state
+        return {'rdns': self.rdns}
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            state = state['rdns']
+        self.rdns = tuple(_make_rdn(rdn) for rdn in state)
+        self._key = None
+        self._hash = None
+
     def _get_rdn(self, rdn):
         return self.RDN_type(*rdn, **{'raw': True})
 
@@ -1181,10 +1291,7 @@ class DN(object):
         if isinstance(key, six.integer_types):
             return self._get_rdn(self.rdns[key])
         if isinstance(key, slice):
-            cls = self.__class__
-            new_dn = cls.__new__(cls)
-            new_dn.rdns = self.rdns[key]
-            return new_dn
+            return self._from_rdns(self.rdns[key])
         elif isinstance(key, six.string_types):
             for rdn in self.rdns:
                 for ava in rdn:
@@ -1196,19 +1303,16 @@ class DN(object):
                                 (key.__class__.__name__))
 
     def __hash__(self):
-        # Hash is computed from DN's string representation.
+        # Hash is computed from DN's normalized key.
         #
         # Because attrs & values are comparison case-insensitive the
         # hash value between two objects which compare as equal but
         # differ in case must yield the same hash value.
-
-        str_dn = ';,'.join([
-            '++'.join([
-                '=='.join((atype, avalue or ''))
-                for atype, avalue, _dummy in rdn
-            ]) for rdn in self.rdns
-        ])
-        return hash(str_dn.lower())
+        value = self._hash
+        if value is None:
+            value = hash(self._get_key())
+            self._hash = value
+        return value
 
     def __eq__(self, other):
         # Try coercing to DN, if successful compare to coerced object
@@ -1223,11 +1327,11 @@ class DN(object):
         if not isinstance(other, DN):
             return False
 
-        if len(self) != len(other):
+        if len(self.rdns) != len(other.rdns):
             return False
 
         # Perform comparison between objects of same type
-        return self._cmp_sequence(other, 0, len(self)) == 0
+        return self._get_key() == other._get_key()
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -1239,18 +1343,17 @@ class DN(object):
         if len(self) != len(other):
             return len(self) < len(other)
 
-        return self._cmp_sequence(other, 0, len(self)) < 0
+        return self._get_key() < other._get_key()
 
     def _cmp_sequence(self, pattern, self_start, pat_len):
-        self_idx = self_start
-        pat_idx = 0
-        while pat_idx < pat_len:
-            r = cmp_rdns(self.rdns[self_idx], pattern.rdns[pat_idx])
-            if r != 0:
-                return r
-            self_idx += 1
-            pat_idx += 1
-        return 0
+        key = self._get_key()[self_start:self_start + pat_len]
+        pat_key = pattern._get_key()[:pat_len]
+        if key == pat_key:
+            return 0
+        elif key < pat_key:
+            return -1
+        else:
+            return 1
 
     def __add__(self, other):
         return self.__class__(self, other)
@@ -1286,6 +1389,16 @@ class DN(object):
                     return True
             return False
 
+        if (isinstance(suffix, DN) and start == 0 and end == sys.maxsize):
+            # fast path for the common "is this entry in that container"
+            # test, compares the tail of the normalized keys
+            pat_len = len(suffix.rdns)
+            if pat_len == 0:
+                return True
+            if pat_len > len(self.rdns):
+                return False
+            return self._get_key()[-pat_len:] == suffix._get_key()
+
         return self._tailmatch(suffix, start, end, +1)
 
     def _tailmatch(self, pattern, start, end, direction):
@@ -18,8 +18,14 @@
 #
 
 import collections
+import contextlib
 import logging
+import select
+import socket
+import threading
+import time
 import xml.dom.minidom
+from xml.etree import ElementTree
 
 import six
 # pylint: disable=import-error
@@ -114,6 +120,61 @@ def _parse_ca_status(body):
         raise error_from_xml(doc, _("Retrieving CA status failed: %s"))
 
 
+# CertDataInfo child element -> key of the results of parse_cert_search_xml
+CERT_DATA_INFO_FIELDS = {
+    'SubjectDN': 'subject',
+    'IssuerDN': 'issuer',
+    'NotValidBefore': 'valid_not_before',
+    'NotValidAfter': 'valid_not_after',
+    'Status': 'status',
+}
+
+
+def parse_cert_search_xml(source, summary=None):
+    """
+    Parse the response of a certificate search incrementally.
+
+    :param source: File name or file object with the XML response
+    :param summary: If given, ``summary['total']`` is set to the total number
+        of matching certificates when the response reports it
+
+    Yields a dict for every CertDataInfo element, with the serial number and
+    the subject, issuer, validity and status of the certificate. Parsed
+    elements are dropped, so that memory use does not grow with the number
+    of certificates.
+    """
+    root = None
+    depth = 0
+    try:
+        for event, elem in ElementTree.iterparse(
+                source, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+
+            depth -= 1
+            if elem.tag == 'CertDataInfo':
+                serial_number = int(elem.get('id'), 16)  # parse as hex
+                result = {
+                    'serial_number': serial_number,
+                    'serial_number_hex': u'0x%X' % serial_number,
+                }
+                for child in elem:
+                    name = CERT_DATA_INFO_FIELDS.get(child.tag)
+                    if name is not None and name not in result:
+                        result[name] = unicode(child.text)
+                elem.clear()
+                root.clear()
+                yield result
+            elif elem.tag == 'total' and depth == 1 and summary is not None:
+                summary['total'] = int(elem.text)
+    except ElementTree.ParseError as e:
+        raise errors.RemoteRetrieveError(
+            reason=_("Parsing certificate search result failed: %s") % e)
+
+
 def ca_status(ca_host=None):
     """Return the status of the CA, and the httpd proxy in front of it
 
@@ -149,6 +210,9 @@ def https_request(
                as (integer, dict, str)
 
     Perform a client authenticated HTTPS request
+
+    If ``dogtag_pool_size`` is set, the request is sent over a connection
+    of `connection_pool`.
     """
 
     def connection_factory(host, port):
@@ -162,11 +226,238 @@ def https_request(
 
     if body is None:
         body = urlencode(kw)
+    if api.env.dogtag_pool_size > 0:
+        with https_connection(
+                host, port, cafile, client_certfile, client_keyfile) as conn:
+            return conn.request(url, method=method, headers=headers,
+                                body=body)
     return _httplib_request(
         'https', host, port, url, connection_factory, body,
         method=method, headers=headers)
 
 
+class KeepAliveHTTPSConnection(object):
+    """
+    Client authenticated HTTPS connection kept open across requests.
+
+    The TLS handshake is done once for a series of requests, instead of once
+    per `https_request`. The connection is not thread safe. If the server
+    closed the connection while it was idle, GET and HEAD requests and
+    requests with ``retry=True`` are retried once on a new connection.
+    """
+    def __init__(self, host, port, cafile, client_certfile, client_keyfile):
+        self.host = host
+        self.port = port
+        self.cafile = cafile
+        self.client_certfile = client_certfile
+        self.client_keyfile = client_keyfile
+        self._conn = None
+
+    def _connection_factory(self, host, port):
+        if self._conn is None:
+            self._conn = create_https_connection(
+                host, port,
+                cafile=self.cafile,
+                client_certfile=self.client_certfile,
+                client_keyfile=self.client_keyfile,
+                tls_version_min=api.env.tls_version_min,
+                tls_version_max=api.env.tls_version_max)
+        return self._conn
+
+    def request(self, url, method='POST', headers=None, body=None,
+                retry=None, **kw):
+        """
+        Perform a request, see `https_request`.
+
+        :param retry: Retry the request if it failed on a reused connection.
+            Defaults to True for GET and HEAD requests.
+        """
+        if body is None:
+            body = urlencode(kw)
+        if retry is None:
+            retry = method in ('GET', 'HEAD')
+        reused = self._conn is not None and self._conn.sock is not None
+        try:
+            return _httplib_request(
+                'https', self.host, self.port, url, self._connection_factory,
+                body, method=method, headers=dict(headers or {}),
+                keep_alive=True)
+        except NetworkError:
+            if not (retry and reused):
+                raise
+            logger.debug('connection to %s closed, retrying',
+                         ipautil.format_netloc(self.host, self.port))
+        return _httplib_request(
+            'https', self.host, self.port, url, self._connection_factory,
+            body, method=method, headers=dict(headers or {}),
+            keep_alive=True)
+
+    def is_alive(self):
+        """
+        Return True if the connection is open and was not closed by the
+        server.
+        """
+        sock = self._conn.sock if self._conn is not None else None
+        if sock is None:
+            return False
+        try:
+            # an idle connection is readable only if the server closed it
+            readable, _writable, _errors = select.select([sock], [], [], 0)
+        except (select.error, socket.error, ValueError):
+            return False
+        return not readable
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class ConnectionPool(object):
+    """
+    Process-wide pool of connections and REST API sessions to Dogtag.
+
+    Connections are pooled per endpoint, a key starting with the host and
+    the port. At most ``dogtag_pool_size`` connections to an endpoint are
+    open at a time; when all of them are in use, `connection` waits up to
+    ``http_timeout`` seconds for one to be returned. Idle connections are
+    closed after ``dogtag_pool_idle_timeout`` seconds, or when the server
+    closed them. Sessions expire after the same idle time.
+
+    A connection is any object with ``is_alive()`` and ``close()`` methods,
+    such as `KeepAliveHTTPSConnection`.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        # key -> [(last used, connection)], most recently used last
+        self._idle = {}
+        # key -> number of open connections, idle or in use
+        self._open = collections.Counter()
+        # key -> [last used, session cookie]
+        self._sessions = {}
+
+    @contextlib.contextmanager
+    def connection(self, key, factory):
+        """
+        Check out a connection to ``key``, created by ``factory()`` if
+        there is no idle one. If the pool is disabled, the connection is
+        created for the ``with`` block only.
+        """
+        size = api.env.dogtag_pool_size
+        if size <= 0:
+            conn = factory()
+            try:
+                yield conn
+            finally:
+                conn.close()
+            return
+
+        conn = self._acquire(key, factory, size)
+        try:
+            yield conn
+        finally:
+            self._release(key, conn)
+
+    def _acquire(self, key, factory, size):
+        deadline = time.time() + api.env.http_timeout
+        with self._cond:
+            while True:
+                self._expire(time.time())
+                idle = self._idle.get(key)
+                while idle:
+                    _last_used, conn = idle.pop()
+                    if conn.is_alive():
+                        return conn
+                    self._discard(key, conn)
+                if self._open[key] < size:
+                    self._open[key] += 1
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise NetworkError(
+                        uri=ipautil.format_netloc(key[0], key[1]),
+                        error=_('all %d connections are in use') % size)
+                self._cond.wait(remaining)
+
+        try:
+            return factory()
+        except Exception:
+            with self._cond:
+                self._open[key] -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, key, conn):
+        with self._cond:
+            if conn.is_alive():
+                self._idle.setdefault(key, []).append((time.time(), conn))
+            else:
+                self._discard(key, conn)
+            self._cond.notify()
+
+    def _discard(self, key, conn):
+        self._open[key] -= 1
+        if not self._open[key]:
+            del self._open[key]
+        conn.close()
+
+    def _expire(self, now):
+        idle_timeout = api.env.dogtag_pool_idle_timeout
+        for key, idle in list(self._idle.items()):
+            while idle and now - idle[0][0] >= idle_timeout:
+                _last_used, conn = idle.pop(0)
+                self._discard(key, conn)
+            if not idle:
+                del self._idle[key]
+
+    def get_session(self, key):
+        """
+        Return the session cookie of ``key``, or None.
+        """
+        with self._cond:
+            session = self._sessions.get(key)
+            if session is None:
+                return None
+            now = time.time()
+            if now - session[0] >= api.env.dogtag_pool_idle_timeout:
+                del self._sessions[key]
+                return None
+            session[0] = now
+            return session[1]
+
+    def set_session(self, key, cookie):
+        with self._cond:
+            self._sessions[key] = [time.time(), cookie]
+
+    def drop_session(self, key):
+        with self._cond:
+            self._sessions.pop(key, None)
+
+    def clear(self):
+        """
+        Close all idle connections and forget all sessions.
+        """
+        with self._cond:
+            for key, idle in list(self._idle.items()):
+                for _last_used, conn in idle:
+                    self._discard(key, conn)
+            self._idle.clear()
+            self._sessions.clear()
+
+
+connection_pool = ConnectionPool()
+
+
+def https_connection(host, port, cafile, client_certfile, client_keyfile):
+    """
+    Check out a `KeepAliveHTTPSConnection` of `connection_pool`.
+    """
+    return connection_pool.connection(
+        (host, port, cafile, client_certfile, client_keyfile),
+        lambda: KeepAliveHTTPSConnection(
+            host, port, cafile, client_certfile, client_keyfile))
+
+
 def http_request(host, port, url, timeout=None, **kw):
     """
     :param url: The path (not complete URL!) to post to.
@@ -190,7 +481,8 @@ def http_request(host, port, url, timeout=None, **kw):
 
 def _httplib_request(
         protocol, host, port, path, connection_factory, request_body,
-        method='POST', headers=None, connection_options=None):
+        method='POST', headers=None, connection_options=None,
+        keep_alive=False):
     """
     :param request_body: Request body
     :param connection_factory: Connection class to use. Will be called
@@ -198,6 +490,8 @@ def _httplib_request(
     :param method: HTTP request method (default: 'POST')
     :param connection_options: a dictionary that will be passed to
         connection_factory as keyword arguments.
+    :param keep_alive: Leave the connection open after a successful
+        request.
 
     Perform a HTTP(s) request.
     """
@@ -215,6 +509,7 @@ def _httplib_request(
     ):
         headers['content-type'] = 'application/x-www-form-urlencoded'
 
+    conn = None
     try:
         conn = connection_factory(host, port, **connection_options)
         conn.request(method, uri, body=request_body, headers=headers)
@@ -223,8 +518,11 @@ def _httplib_request(
         http_status = res.status
         http_headers = res.msg
         http_body = res.read()
-        conn.close()
+        if not keep_alive:
+            conn.close()
     except Exception as e:
+        if conn is not None:
+            conn.close()
         logger.debug("httplib request failed:", exc_info=True)
         raise NetworkError(uri=uri, error=str(e))
 
@@ -41,10 +41,12 @@ import ldap
 import ldap.sasl
 import ldap.filter
 from ldap.controls import SimplePagedResultsControl
+from ldap.controls.sss import SSSRequestControl
+from ldap.controls.vlv import VLVRequestControl
 import six
 
 # pylint: disable=ipa-forbidden-import
-from ipalib import errors, x509, _
+from ipalib import errors, timing, x509, _
 from ipalib.constants import LDAP_GENERALIZED_TIME_FORMAT
 # pylint: enable=ipa-forbidden-import
 from ipapython.ipautil import format_netloc, CIDict
@@ -76,6 +78,22 @@ TRUNCATED_ADMIN_LIMIT = object()
 
 DIRMAN_DN = DN(('cn', 'directory manager'))
 
+_tracers = []
+
+
+def add_tracer(tracer):
+    """
+    Register a callable which is called with every finished LDAPOperation.
+    """
+    _tracers.append(tracer)
+
+
+def remove_tracer(tracer):
+    """
+    Unregister a tracer added with add_tracer().
+    """
+    _tracers.remove(tracer)
+
 
 if six.PY2 and hasattr(ldap, 'LDAPBytesWarning'):
     # XXX silence python-ldap's BytesWarnings
@@ -595,6 +613,121 @@ class SingleValueLDAPEntryView(LDAPEntryView):
             self._entry[name] = [value]
 
 
+class LDAPOperation(object):
+    """
+    An LDAP operation performed by LDAPClient, as passed to tracers.
+
+    ``operation`` is one of 'search', 'add', 'modify', 'rename' and
+    'delete'. ``dn`` is the DN of the entry or the search base. ``scope``
+    and ``filter`` are set for searches. ``count`` is the number of entries
+    returned by a search and ``truncated`` is True if the search hit a
+    limit. ``duration`` is in seconds. ``error`` is the name of the
+    exception raised by the operation, if any.
+    """
+    _scopes = {
+        ldap.SCOPE_BASE: 'base',
+        ldap.SCOPE_ONELEVEL: 'one',
+        ldap.SCOPE_SUBTREE: 'sub',
+    }
+
+    def __init__(self, operation, dn, scope=None, filter=None):
+        self.operation = operation
+        self.dn = dn
+        self.scope = scope
+        self.filter = filter
+        self.count = 0
+        self.truncated = False
+        self.duration = 0.0
+        self.error = None
+
+    def as_dict(self):
+        result = dict(
+            operation=self.operation,
+            dn=str(self.dn) if self.dn is not None else '',
+            duration=self.duration,
+        )
+        if self.operation == 'search':
+            result.update(
+                scope=self._scopes.get(self.scope, self.scope),
+                filter=self.filter,
+                count=self.count,
+                truncated=self.truncated,
+            )
+        if self.error is not None:
+            result['error'] = self.error
+        return result
+
+    def __str__(self):
+        return ' '.join(
+            '%s=%s' % (key, value if key != 'duration' else
+                       '%dms' % (value * 1000))
+            for key, value in sorted(self.as_dict().items())
+        )
+
+
+class LDAPEntryIterator(object):
+    """
+    Iterable over the entries of a single LDAP search.
+
+    Returned by LDAPClient.find_entries_iter(). Entries are produced as the
+    server sends them. The ``truncated`` attribute is None while the search
+    is in progress and is set to the truncated flag (see
+    LDAPClient.find_entries()) once all entries have been consumed.
+    """
+
+    def __init__(self, conn, filter, attrs_list, base_dn, scope, time_limit,
+                 size_limit, paged_search):
+        self.truncated = None
+        self.count = 0
+        self._conn = conn
+        self._gen = conn._iter_search(  # pylint: disable=protected-access
+            self, filter, attrs_list, base_dn, scope, time_limit, size_limit,
+            paged_search)
+        self._op = LDAPOperation(
+            'search', base_dn, scope, filter or '(objectClass=*)')
+        self._timer = timing.current()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.time()
+        try:
+            entry = next(self._gen)
+        except StopIteration:
+            self._finish(start)
+            raise
+        except Exception as e:
+            if self._op is not None:
+                self._op.error = type(e).__name__
+            self._finish(start)
+            raise
+        if self._op is not None:
+            self._op.duration += time.time() - start
+        self.count += 1
+        return entry
+
+    next = __next__
+
+    def close(self):
+        """
+        Stop the search and release server resources.
+        """
+        self._gen.close()
+        self._finish()
+
+    def _finish(self, start=None):
+        op, self._op = self._op, None
+        if op is None:
+            return
+        if start is not None:
+            op.duration += time.time() - start
+        op.count = self.count
+        op.truncated = bool(self.truncated)
+        self._conn._operation_done(  # pylint: disable=protected-access
+            op, self._timer)
+
+
 class LDAPClient(object):
     """LDAP backend class
 
@@ -703,6 +836,10 @@ class LDAPClient(object):
     time_limit = -1.0   # unlimited
     size_limit = 0      # unlimited
 
+    # Operations taking at least this long [milliseconds] are logged as slow
+    # queries; 0 disables the slow query log.
+    slow_query_threshold = 0
+
     def __init__(self, ldap_uri, start_tls=False, force_schema_updates=False,
                  no_schema=False, decode_attrs=True, cacert=None,
                  sasl_nocanon=False):
@@ -750,9 +887,9 @@ class LDAPClient(object):
     def modify_s(self, dn, modlist):
         # FIXME: for backwards compatibility only
         assert isinstance(dn, DN)
-        dn = str(dn)
         modlist = [(a, b, self.encode(c)) for a, b, c in modlist]
-        return self.conn.modify_s(dn, modlist)
+        with self._trace('modify', dn):
+            return self.conn.modify_s(str(dn), modlist)
 
     @property
     def conn(self):
@@ -1044,6 +1181,35 @@ class LDAPClient(object):
                 'Unhandled LDAPError: %s: %s', type(e).__name__, str(e))
             raise errors.DatabaseError(desc=desc, info=info)
 
+    @contextlib.contextmanager
+    def _trace(self, operation, dn):
+        """
+        Context manager tracing an LDAP operation, see add_tracer()
+        """
+        op = LDAPOperation(operation, dn)
+        timer = timing.current()
+        start = time.time()
+        try:
+            yield op
+        except Exception as e:
+            op.error = type(e).__name__
+            raise
+        finally:
+            op.duration = time.time() - start
+            self._operation_done(op, timer)
+
+    def _operation_done(self, op, timer):
+        if timer is not None:
+            timer.add_ldap_operation(op)
+        threshold = self.slow_query_threshold
+        if threshold and op.duration * 1000 >= threshold:
+            logger.warning('Slow LDAP operation: %s', op)
+        for tracer in _tracers:
+            try:
+                tracer(op)
+            except Exception as e:
+                logger.debug('LDAP tracer %r failed: %s', tracer, e)
+
     @staticmethod
     def handle_truncated_result(truncated):
         if not truncated:
@@ -1367,12 +1533,51 @@ class LDAPClient(object):
         :raises: errors.NotFound if result set is empty
                                  or base_dn doesn't exist
         """
+        entries = self.find_entries_iter(
+            filter, attrs_list, base_dn, scope, time_limit=time_limit,
+            size_limit=size_limit, paged_search=paged_search)
+        res = list(entries)
+        truncated = entries.truncated
+
+        if not res and not truncated:
+            raise errors.EmptyResult(reason='no matching entry found')
+
+        return (res, truncated)
+
+    def find_entries_iter(self, filter=None, attrs_list=None, base_dn=None,
+                          scope=ldap.SCOPE_SUBTREE, time_limit=None,
+                          size_limit=None, paged_search=False):
+        """
+        Return an iterable of entries matching specified search parameters.
+
+        Unlike find_entries(), entries are converted and yielded one at a
+        time as the server returns them, so the whole result set is never
+        held in memory at once. Once the iterable is exhausted, its
+        ``truncated`` attribute has the same meaning as the truncated flag
+        returned by find_entries(). An empty result set does not raise
+        errors.EmptyResult; the caller decides how to handle it.
+
+        The search is started lazily on first iteration. If the consumer
+        stops iterating early, the outstanding search is abandoned.
+
+        Keyword arguments are the same as for find_entries().
+
+        :raises: errors.NotFound if base_dn doesn't exist
+        """
+        return LDAPEntryIterator(
+            self, filter, attrs_list, base_dn, scope, time_limit, size_limit,
+            paged_search)
+
+    def _iter_search(self, iterator, filter, attrs_list, base_dn, scope,
+                     time_limit, size_limit, paged_search):
+        """
+        Generator behind LDAPEntryIterator, see find_entries_iter()
+        """
         if base_dn is None:
             base_dn = DN()
         assert isinstance(base_dn, DN)
         if not filter:
             filter = '(objectClass=*)'
-        res = []
         truncated = False
 
         if time_limit is None:
@@ -1393,80 +1598,163 @@ class LDAPClient(object):
 
         sctrls = None
         cookie = ''
+        msgid = None
         page_size = (size_limit if size_limit > 0 else 2000) - 1
         if page_size == 0:
             paged_search = False
 
         # pass arguments to python-ldap
-        with self.error_handler():
-            if six.PY2:
-                filter = self.encode(filter)
-                attrs_list = self.encode(attrs_list)
-
-            while True:
-                if paged_search:
-                    sctrls = [SimplePagedResultsControl(0, page_size, cookie)]
-
-                try:
-                    id = self.conn.search_ext(
-                        str(base_dn), scope, filter, attrs_list,
-                        serverctrls=sctrls, timeout=time_limit,
-                        sizelimit=size_limit
-                    )
-                    while True:
-                        result = self.conn.result3(id, 0)
-                        objtype, res_list, _res_id, res_ctrls = result
-                        if objtype == ldap.RES_SEARCH_RESULT:
-                            break
-                        res_list = self._convert_result(res_list)
-                        if res_list:
-                            res.append(res_list[0])
+        try:
+            with self.error_handler():
+                if six.PY2:
+                    filter = self.encode(filter)
+                    attrs_list = self.encode(attrs_list)
 
+                while True:
                     if paged_search:
-                        # Get cookie for the next page
-                        for ctrl in res_ctrls:
-                            if isinstance(ctrl, SimplePagedResultsControl):
-                                cookie = ctrl.cookie
+                        sctrls = [
+                            SimplePagedResultsControl(0, page_size, cookie)]
+
+                    try:
+                        msgid = self.conn.search_ext(
+                            str(base_dn), scope, filter, attrs_list,
+                            serverctrls=sctrls, timeout=time_limit,
+                            sizelimit=size_limit
+                        )
+                        while True:
+                            result = self.conn.result3(msgid, 0)
+                            objtype, res_list, _res_id, res_ctrls = result
+                            if objtype == ldap.RES_SEARCH_RESULT:
+                                msgid = None
                                 break
-                        else:
+                            res_list = self._convert_result(res_list)
+                            if res_list:
+                                yield res_list[0]
+
+                        if paged_search:
+                            # Get cookie for the next page
+                            for ctrl in res_ctrls:
+                                if isinstance(ctrl, SimplePagedResultsControl):
+                                    cookie = ctrl.cookie
+                                    break
+                            else:
+                                cookie = ''
+                    except ldap.ADMINLIMIT_EXCEEDED:
+                        msgid = None
+                        truncated = TRUNCATED_ADMIN_LIMIT
+                        break
+                    except ldap.SIZELIMIT_EXCEEDED:
+                        msgid = None
+                        truncated = TRUNCATED_SIZE_LIMIT
+                        break
+                    except ldap.TIMELIMIT_EXCEEDED:
+                        msgid = None
+                        truncated = TRUNCATED_TIME_LIMIT
+                        break
+                    except ldap.LDAPError as e:
+                        msgid = None
+                        # If paged search is in progress, try to cancel it
+                        if paged_search and cookie:
+                            self._cancel_paged_search(
+                                base_dn, scope, filter, attrs_list,
+                                time_limit, size_limit, cookie)
                             cookie = ''
-                except ldap.ADMINLIMIT_EXCEEDED:
-                    truncated = TRUNCATED_ADMIN_LIMIT
-                    break
-                except ldap.SIZELIMIT_EXCEEDED:
-                    truncated = TRUNCATED_SIZE_LIMIT
-                    break
-                except ldap.TIMELIMIT_EXCEEDED:
-                    truncated = TRUNCATED_TIME_LIMIT
-                    break
-                except ldap.LDAPError as e:
-                    # If paged search is in progress, try to cancel it
-                    if paged_search and cookie:
-                        sctrls = [SimplePagedResultsControl(0, 0, cookie)]
+
                         try:
-                            self.conn.search_ext_s(
-                                str(base_dn), scope, filter, attrs_list,
-                                serverctrls=sctrls, timeout=time_limit,
-                                sizelimit=size_limit)
-                        except ldap.LDAPError as e:
-                            logger.warning(
-                                "Error cancelling paged search: %s", e)
-                        cookie = ''
+                            raise e
+                        except (ldap.ADMINLIMIT_EXCEEDED,
+                                ldap.TIMELIMIT_EXCEEDED,
+                                ldap.SIZELIMIT_EXCEEDED):
+                            truncated = True
+                            break
 
-                    try:
-                        raise e
-                    except (ldap.ADMINLIMIT_EXCEEDED, ldap.TIMELIMIT_EXCEEDED,
-                            ldap.SIZELIMIT_EXCEEDED):
-                        truncated = True
+                    if not paged_search or not cookie:
                         break
+        finally:
+            # The consumer may stop iterating before the search is complete;
+            # do not leave the operation running on the server.
+            if msgid is not None:
+                try:
+                    self.conn.abandon(msgid)
+                except ldap.LDAPError as e:
+                    logger.debug("Error abandoning search: %s", e)
+            if paged_search and cookie:
+                self._cancel_paged_search(
+                    base_dn, scope, filter, attrs_list, time_limit,
+                    size_limit, cookie)
 
-                if not paged_search or not cookie:
-                    break
+        iterator.truncated = truncated
 
-        if not res and not truncated:
-            raise errors.EmptyResult(reason='no matching entry found')
+    def _cancel_paged_search(self, base_dn, scope, filter, attrs_list,
+                             time_limit, size_limit, cookie):
+        sctrls = [SimplePagedResultsControl(0, 0, cookie)]
+        try:
+            self.conn.search_ext_s(
+                str(base_dn), scope, filter, attrs_list,
+                serverctrls=sctrls, timeout=time_limit,
+                sizelimit=size_limit)
+        except ldap.LDAPError as e:
+            logger.warning("Error cancelling paged search: %s", e)
 
-        return (res, truncated)
+    def find_entries_sorted(self, sort_attr, count, start_value=None,
+                            filter=None, attrs_list=None, base_dn=None,
+                            scope=ldap.SCOPE_SUBTREE, time_limit=None):
+        """
+        Return a list of at most ``count`` entries matching specified search
+        parameters, sorted by the ``sort_attr`` attribute.
+
+        The entries are sorted and selected by the server using the server
+        side sorting and virtual list view controls, so only the selected
+        entries are sent. The list starts with the first entry whose
+        ``sort_attr`` value is greater than or equal to ``start_value``, or
+        with the first entry if ``start_value`` is None. An empty result set
+        does not raise errors.EmptyResult.
+
+        Keyword arguments are the same as for find_entries().
+
+        :raises: errors.NotFound if base_dn doesn't exist
+        """
+        if base_dn is None:
+            base_dn = DN()
+        assert isinstance(base_dn, DN)
+        if not filter:
+            filter = '(objectClass=*)'
+
+        if time_limit is None:
+            time_limit = self.time_limit
+        if time_limit == 0:
+            time_limit = -1.0
+        if not isinstance(time_limit, float):
+            time_limit = float(time_limit)
+
+        if attrs_list:
+            attrs_list = [a.lower() for a in set(attrs_list)]
+
+        # the target entry is included in the after count
+        if start_value is None:
+            vlv = VLVRequestControl(
+                True, 0, count - 1, offset=1, content_count=0)
+        else:
+            vlv = VLVRequestControl(
+                True, 0, count - 1,
+                greater_than_or_equal=start_value.encode('utf-8'))
+        sctrls = [SSSRequestControl(True, [sort_attr]), vlv]
+
+        with self._trace('search', base_dn) as op, self.error_handler():
+            op.scope = scope
+            op.filter = filter
+            if six.PY2:
+                filter = self.encode(filter)
+                attrs_list = self.encode(attrs_list)
+            msgid = self.conn.search_ext(
+                str(base_dn), scope, filter, attrs_list,
+                serverctrls=sctrls, timeout=time_limit)
+            _objtype, res_list, _res_id, _res_ctrls = self.conn.result3(
+                msgid)
+            entries = self._convert_result(res_list)[:count]
+            op.count = len(entries)
+
+        return entries
 
     def find_entry_by_attr(self, attr, value, object_class, attrs_list=None,
                            base_dn=None):
@@ -1518,7 +1806,7 @@ class LDAPClient(object):
         # remove all [] values (python-ldap hates 'em)
         attrs = dict((k, v) for k, v in entry.raw.items() if v)
 
-        with self.error_handler():
+        with self._trace('add', entry.dn), self.error_handler():
             attrs = self.encode(attrs)
             self.conn.add_s(str(entry.dn), list(attrs.items()))
 
@@ -1550,7 +1838,7 @@ class LDAPClient(object):
         else:
             new_superior = str(DN(*new_dn[1:]))
 
-        with self.error_handler():
+        with self._trace('rename', dn), self.error_handler():
             self.conn.rename_s(str(dn), str(new_rdn), newsuperior=new_superior,
                                delold=int(del_old))
             time.sleep(.3)  # Give memberOf plugin a chance to work
@@ -1566,7 +1854,7 @@ class LDAPClient(object):
             raise errors.EmptyModlist()
 
         # pass arguments to python-ldap
-        with self.error_handler():
+        with self._trace('modify', entry.dn), self.error_handler():
             modlist = [(a, str(b), self.encode(c))
                        for a, b, c in modlist]
             self.conn.modify_s(str(entry.dn), modlist)
@@ -1580,7 +1868,7 @@ class LDAPClient(object):
         else:
             dn = entry_or_dn.dn
 
-        with self.error_handler():
+        with self._trace('delete', dn), self.error_handler():
             self.conn.delete_s(str(dn))
 
     def entry_exists(self, dn):
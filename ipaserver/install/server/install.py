@@ -934,6 +934,13 @@ def install(installer):
     except Exception:
         raise ScriptError("Configuration of client side components failed!")
 
+    try:
+        api.Command.schema.write_schema_file()
+    except Exception as e:
+        # the schema command generates the schema without the file
+        logger.warning("Failed to precompute the API schema: %s", e)
+    api.write_plugin_indexes()
+
     # Everything installed properly, activate ipa service.
     services.knownservices.ipa.enable()
 
@@ -1130,6 +1137,10 @@ def uninstall(installer):
     # remove upgrade state file
     sysupgrade.remove_upgrade_file()
 
+    installutils.remove_file(paths.IPA_API_SCHEMA)
+    if os.path.isdir(paths.IPA_PLUGIN_INDEX_DIR):
+        shutil.rmtree(paths.IPA_PLUGIN_INDEX_DIR)
+
     if fstore.has_files():
         logger.error('Some files have not been restored, see '
                      '%s/sysrestore.index', SYSRESTORE_DIR_PATH)
@@ -1514,6 +1514,13 @@ def install(installer):
         # remove the extracted replica file
         remove_replica_info_dir(installer)
 
+    try:
+        api.Command.schema.write_schema_file()
+    except Exception as e:
+        # the schema command generates the schema without the file
+        logger.warning("Failed to precompute the API schema: %s", e)
+    api.write_plugin_indexes()
+
     # Everything installed properly, activate ipa service.
     services.knownservices.ipa.enable()
 
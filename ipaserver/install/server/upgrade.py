@@ -1627,6 +1627,20 @@ def disable_httpd_system_trust(http):
             db.add_cert(cert, nickname, trust_flags)
 
 
+def write_api_schema():
+    """
+    Precompute the API schema served by the schema command and store the
+    plugin index
+    """
+    logger.info('[Precomputing the API schema]')
+    try:
+        api.Command.schema.write_schema_file()
+    except Exception as e:
+        # the schema command generates the schema without the file
+        logger.warning("Failed to precompute the API schema: %s", e)
+    api.write_plugin_indexes()
+
+
 def upgrade_configuration():
     """
     Execute configuration upgrade of the IPA services
@@ -1929,6 +1943,8 @@ def upgrade_configuration():
     setup_pkinit(krb)
     enable_certauth(krb)
 
+    write_api_schema()
+
     if not ds_running:
         ds.stop(ds_serverid)
 
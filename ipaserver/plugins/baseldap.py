@@ -24,6 +24,10 @@ import re
 import time
 from copy import deepcopy
 import base64
+import binascii
+import hashlib
+import json
+import logging
 
 import six
 
@@ -31,19 +35,29 @@ from ipalib import api, crud, errors
 from ipalib import Method, Object
 from ipalib import Flag, Int, Str
 from ipalib.cli import to_cli
+from ipalib.frontend import ResultCache
+from ipalib.parameters import Dict
 from ipalib import output
 from ipalib.text import _
 from ipalib.util import json_serialize, validate_hostname
 from ipalib.capabilities import client_has_capability
-from ipalib.messages import add_message, SearchResultTruncated
+from ipalib.plugable import Plugin
+from ipalib.messages import (
+    add_message, SearchResultPage, SearchResultTruncated)
 from ipapython.dn import DN, RDN
 from ipapython.version import API_VERSION
 
 if six.PY3:
     unicode = str
 
+logger = logging.getLogger(__name__)
+
 DNA_MAGIC = -1
 
+# maximum number of parent DNs of members whose object type is cached, see
+# LDAPObject._get_member_pkey()
+MEMBER_PARENTS_CACHE_SIZE = 1000
+
 global_output_params = (
     Flag('has_password',
         label=_('Password'),
@@ -388,9 +402,9 @@ def add_external_post_callback(ldap, dn, entry_attrs, failed, completed,
     # Sift through the failures. We assume that these are all
     # entries that aren't stored in IPA, aka external entries.
     if memberattr in failed and membertype in failed[memberattr]:
-        entry_attrs_ = ldap.get_entry(dn, [externalattr])
+        entry_attrs_ = ldap.get_entry(dn, [externalattr, memberattr])
         dn = entry_attrs_.dn
-        members = entry_attrs.get(memberattr, [])
+        members = entry_attrs_.get(memberattr, [])
         external_entries = entry_attrs_.get(externalattr, [])
         lc_external_entries = set(e.lower() for e in external_entries)
 
@@ -549,6 +563,16 @@ class LDAPObject(Object):
     rdn_attribute = ''
     uuid_attribute = ''
     attribute_members = {}
+    # maximum number of entries whose indirect membership is resolved by a
+    # single search, see get_indirect_members_batch()
+    indirect_members_batch_size = 100
+    # member attribute -> ((LDAPObject, container DN), ...) in the order the
+    # object types are tried, filled on demand by _find_member_object()
+    _member_containers = Plugin.finalize_attr('_member_containers')
+    # (member attribute, lower-cased parent DN string) ->
+    # (LDAPObject or None, primary key attribute or None), filled on demand
+    # by _get_member_pkey()
+    _member_parents = Plugin.finalize_attr('_member_parents')
     allow_rename = False
     password_attributes = []
     # Can bind as this entry (has userPassword or krbPrincipalKey)
@@ -639,11 +663,73 @@ class LDAPObject(Object):
         oc = [x.lower() for x in classes]
         return objectclass.lower() in oc
 
+    def _on_finalize(self):
+        super(LDAPObject, self)._on_finalize()
+
+        self._member_containers = {}
+        self._member_parents = ResultCache(maxsize=MEMBER_PARENTS_CACHE_SIZE)
+
+    def _find_member_object(self, attr, memberdn):
+        try:
+            containers = self._member_containers[attr]
+        except KeyError:
+            containers = []
+            for ldap_obj_name in self.attribute_members[attr]:
+                ldap_obj = self.api.Object[ldap_obj_name]
+                containers.append(
+                    (ldap_obj, DN(ldap_obj.container_dn, api.env.basedn)))
+            containers = tuple(containers)
+            self._member_containers[attr] = containers
+
+        for ldap_obj, container_dn in containers:
+            if memberdn.endswith(container_dn):
+                return ldap_obj
+        return None
+
+    def _get_member_pkey(self, attr, member):
+        """
+        Map raw member value to (LDAPObject, primary key)
+
+        Return None if the member does not belong to any object type of
+        the member attribute.
+
+        Members which are direct or indirect children of a known container
+        and whose RDN is the primary key of the object type are converted
+        without constructing a DN object; the object type is looked up by
+        the parent DN string. Everything else goes through
+        get_primary_key_from_dn().
+        """
+        text = member.decode('utf-8')
+        rdn, _sep, parent = text.partition(',')
+        rdn_attr, eq, rdn_value = rdn.partition('=')
+        if eq and not any(c in rdn for c in '\\"+'):
+            parent_key = (attr, parent.lower())
+            cached = self._member_parents.get(parent_key)
+            if cached is not None:
+                ldap_obj, pkey_name = cached
+            else:
+                ldap_obj = self._find_member_object(attr, DN(parent))
+                pkey_name = None
+                if (ldap_obj is not None and
+                        ldap_obj.primary_key is not None and
+                        not ldap_obj.rdn_attribute and
+                        type(ldap_obj).get_primary_key_from_dn ==
+                        LDAPObject.get_primary_key_from_dn):
+                    pkey_name = ldap_obj.primary_key.name
+                self._member_parents.set(parent_key, (ldap_obj, pkey_name))
+            if pkey_name is not None and rdn_attr == pkey_name:
+                return (ldap_obj, rdn_value)
+
+        memberdn = DN(text)
+        ldap_obj = self._find_member_object(attr, memberdn)
+        if ldap_obj is None:
+            return None
+        return (ldap_obj, ldap_obj.get_primary_key_from_dn(memberdn))
+
     def convert_attribute_members(self, entry_attrs, *keys, **options):
         if options.get('raw', False):
             return
 
-        container_dns = {}
         new_attrs = {}
 
         for attr in self.attribute_members:
@@ -654,25 +740,17 @@ class LDAPObject(Object):
             del entry_attrs[attr]
 
             for member in value:
-                memberdn = DN(member.decode('utf-8'))
-                for ldap_obj_name in self.attribute_members[attr]:
-                    ldap_obj = self.api.Object[ldap_obj_name]
-                    try:
-                        container_dn = container_dns[ldap_obj_name]
-                    except KeyError:
-                        container_dn = DN(ldap_obj.container_dn, api.env.basedn)
-                        container_dns[ldap_obj_name] = container_dn
-
-                    if memberdn.endswith(container_dn):
-                        new_value = ldap_obj.get_primary_key_from_dn(memberdn)
-                        new_attr_name = '%s_%s' % (attr, ldap_obj.name)
-                        try:
-                            new_attr = new_attrs[new_attr_name]
-                        except KeyError:
-                            new_attr = entry_attrs.setdefault(new_attr_name, [])
-                            new_attrs[new_attr_name] = new_attr
-                        new_attr.append(new_value)
-                        break
+                result = self._get_member_pkey(attr, member)
+                if result is None:
+                    continue
+                ldap_obj, new_value = result
+                new_attr_name = '%s_%s' % (attr, ldap_obj.name)
+                try:
+                    new_attr = new_attrs[new_attr_name]
+                except KeyError:
+                    new_attr = entry_attrs.setdefault(new_attr_name, [])
+                    new_attrs[new_attr_name] = new_attr
+                new_attr.append(new_value)
 
     def get_indirect_members(self, entry_attrs, attrs_list):
         if 'memberindirect' in attrs_list:
@@ -680,6 +758,120 @@ class LDAPObject(Object):
         if 'memberofindirect' in attrs_list:
             self.get_memberofindirect(entry_attrs)
 
+    def get_indirect_members_batch(self, entries, attrs_list):
+        """
+        Resolve indirect membership for a list of entries
+
+        Same as calling get_indirect_members() for each entry, but with one
+        search per indirect_members_batch_size entries instead of one search
+        per entry.
+        """
+        if not entries:
+            return
+        if 'memberindirect' in attrs_list:
+            self.get_memberindirect_batch(entries)
+        if 'memberofindirect' in attrs_list:
+            self.get_memberofindirect_batch(entries)
+
+    def _iter_batch_search(self, dns, make_filter, attrs_list):
+        """
+        Search the whole tree for each chunk of dns, yield found entries
+        """
+        dns = list(dns)
+        size = self.indirect_members_batch_size
+        for i in range(0, len(dns), size):
+            result = self.backend.find_entries_iter(
+                filter=make_filter(dns[i:i + size]),
+                attrs_list=attrs_list,
+                base_dn=self.api.env.basedn,
+                size_limit=-1,  # paged search will get everything anyway
+                paged_search=True)
+            try:
+                for entry in result:
+                    yield entry
+            except errors.NotFound:
+                pass
+            self.backend.handle_truncated_result(result.truncated)
+
+    def get_memberindirect_batch(self, group_entries):
+        """
+        Get indirect members of several groups, see get_memberindirect()
+        """
+        ldap = self.backend
+
+        def make_filter(dns):
+            return ldap.combine_filters(
+                ('(member=*)', ldap.make_filter_from_attr('memberof', dns)),
+                ldap.MATCH_ALL)
+
+        indirect = {entry.dn: set() for entry in group_entries}
+        for nested in self._iter_batch_search(
+                indirect, make_filter, ['member', 'memberof']):
+            members = nested.raw.get('member', [])
+            for group_dn in nested.get('memberof', []):
+                try:
+                    indirect[group_dn].update(members)
+                except KeyError:
+                    pass
+
+        for group_entry in group_entries:
+            group_indirect = indirect[group_entry.dn]
+            group_indirect.difference_update(group_entry.raw.get('member', []))
+            if group_indirect:
+                group_entry.raw['memberindirect'] = list(group_indirect)
+
+    def get_memberofindirect_batch(self, entries):
+        """
+        Get indirect memberships of several entries, see
+        get_memberofindirect()
+
+        The member values of the groups are not retrieved, as there may be
+        many of them (e.g. ipausers). A group in the memberof values of an
+        entry is a direct membership if it contains one of the entries and
+        the entry is not also a member of one of its nested groups; only in
+        the latter case the groups of the entry are searched separately.
+        """
+        ldap = self.backend
+        member_attrs = ('member', 'memberuser', 'memberhost')
+
+        def make_filter(dns):
+            return ldap.make_filter(
+                {attr: dns for attr in member_attrs}, rules=ldap.MATCH_ANY)
+
+        # memberof values are compared in their raw form, the same way
+        # get_memberofindirect() compares them. The directory server
+        # normalizes stored DNs, so a case-insensitive comparison of the
+        # bytes is sufficient.
+        def key(dn):
+            return str(dn).lower().encode('utf-8')
+
+        # groups which have at least one of the entries as a direct member,
+        # mapped to the groups they are members of
+        parents = {}
+        for group_entry in self._iter_batch_search(
+                [entry.dn for entry in entries], make_filter, ['memberof']):
+            parents[key(group_entry.dn)] = {
+                dn.lower() for dn in group_entry.raw.get('memberof', [])}
+
+        for entry in entries:
+            memberof = entry.raw.get('memberof', [])
+            direct = {dn.lower() for dn in memberof} & set(parents)
+            if any(group_dn in parents[other]
+                   for group_dn in direct for other in direct
+                   if other != group_dn):
+                # a group reached through another group may contain the
+                # entry directly as well
+                direct = {
+                    key(group_entry.dn)
+                    for group_entry in self._iter_batch_search(
+                        [entry.dn], make_filter, [''])}
+            entry.raw['memberof'] = [
+                dn for dn in memberof if dn.lower() in direct]
+            indirect = [
+                dn for dn in memberof if dn.lower() not in direct]
+            if indirect:
+                entry.raw['memberofindirect'] = indirect
+
     def get_memberindirect(self, group_entry):
         """
         Get indirect members
@@ -688,19 +880,20 @@ class LDAPObject(Object):
         mo_filter = self.backend.make_filter({'memberof': group_entry.dn})
         filter = self.backend.combine_filters(
             ('(member=*)', mo_filter), self.backend.MATCH_ALL)
-        try:
-            result = self.backend.get_entries(
-                self.api.env.basedn,
-                filter=filter,
-                attrs_list=['member'],
-                size_limit=-1, # paged search will get everything anyway
-                paged_search=True)
-        except errors.NotFound:
-            result = []
+        result = self.backend.find_entries_iter(
+            filter=filter,
+            attrs_list=['member'],
+            base_dn=self.api.env.basedn,
+            size_limit=-1,  # paged search will get everything anyway
+            paged_search=True)
 
         indirect = set()
-        for entry in result:
-            indirect.update(entry.raw.get('member', []))
+        try:
+            for entry in result:
+                indirect.update(entry.raw.get('member', []))
+        except errors.NotFound:
+            pass
+        self.backend.handle_truncated_result(result.truncated)
         indirect.difference_update(group_entry.raw.get('member', []))
 
         if indirect:
@@ -711,23 +904,24 @@ class LDAPObject(Object):
         dn = entry.dn
         filter = self.backend.make_filter(
             {'member': dn, 'memberuser': dn, 'memberhost': dn})
-        try:
-            result = self.backend.get_entries(
-                self.api.env.basedn,
-                filter=filter,
-                attrs_list=[''],
-                size_limit=-1,  # paged search will get everything anyway
-                paged_search=True)
-        except errors.NotFound:
-            result = []
+        result = self.backend.find_entries_iter(
+            filter=filter,
+            attrs_list=[''],
+            base_dn=self.api.env.basedn,
+            size_limit=-1,  # paged search will get everything anyway
+            paged_search=True)
 
         direct = set()
         indirect = set(entry.raw.get('memberof', []))
-        for group_entry in result:
-            dn = str(group_entry.dn).encode('utf-8')
-            if dn in indirect:
-                indirect.remove(dn)
-                direct.add(dn)
+        try:
+            for group_entry in result:
+                dn = str(group_entry.dn).encode('utf-8')
+                if dn in indirect:
+                    indirect.remove(dn)
+                    direct.add(dn)
+        except errors.NotFound:
+            pass
+        self.backend.handle_truncated_result(result.truncated)
 
         entry.raw['memberof'] = list(direct)
         if indirect:
@@ -1144,6 +1338,17 @@ class LDAPCreate(BaseLDAPCommand, crud.Create):
     def execute(self, *keys, **options):
         ldap = self.obj.backend
 
+        entry_attrs, attrs_list = self._make_entry(ldap, keys, options)
+        self._add_entry(ldap, entry_attrs, keys, options)
+        entry_attrs = self._read_entry(
+            ldap, entry_attrs, attrs_list, keys, options)
+        return self._finish_entry(ldap, entry_attrs, keys, options)
+
+    def _make_entry(self, ldap, keys, options):
+        """
+        Return the entry to add, after the pre callbacks, and its attributes
+        to read back.
+        """
         dn = self.obj.get_dn(*keys, **options)
         entry_attrs = ldap.make_entry(
             dn, self.args_options_2_entry(*keys, **options))
@@ -1190,6 +1395,9 @@ class LDAPCreate(BaseLDAPCommand, crud.Create):
         _check_limit_object_class(self.api.Backend.ldap2.schema.attribute_types(self.obj.limit_object_classes), list(entry_attrs), allow_only=True)
         _check_limit_object_class(self.api.Backend.ldap2.schema.attribute_types(self.obj.disallow_object_classes), list(entry_attrs), allow_only=False)
 
+        return entry_attrs, attrs_list
+
+    def _add_entry(self, ldap, entry_attrs, keys, options):
         try:
             self._exc_wrapper(keys, options, ldap.add_entry)(entry_attrs)
         except errors.NotFound:
@@ -1209,6 +1417,7 @@ class LDAPCreate(BaseLDAPCommand, crud.Create):
         except errors.DuplicateEntry:
             self.obj.handle_duplicate_entry(*keys)
 
+    def _read_entry(self, ldap, entry_attrs, attrs_list, keys, options):
         try:
             if self.obj.rdn_attribute:
                 # make sure objectclass is either set or None
@@ -1227,7 +1436,12 @@ class LDAPCreate(BaseLDAPCommand, crud.Create):
             raise self.obj.handle_not_found(*keys)
 
         self.obj.get_indirect_members(entry_attrs, attrs_list)
+        return entry_attrs
 
+    def _finish_entry(self, ldap, entry_attrs, keys, options):
+        """
+        Run the post callbacks and return the output of the command.
+        """
         for callback in self.get_callbacks('post'):
             entry_attrs.dn = callback(
                 self, ldap, entry_attrs.dn, entry_attrs, *keys, **options)
@@ -1257,6 +1471,104 @@ class LDAPCreate(BaseLDAPCommand, crud.Create):
         raise exc
 
 
+class LDAPBulkCreate(BaseLDAPCommand):
+    """
+    Create several new entries in LDAP.
+
+    Every entry is a dict of the parameters of the add command of the object,
+    keyed by parameter name. All entries are validated before any of them is
+    added. An entry that fails does not stop the others, its error is
+    reported in its result instead.
+    """
+    NO_CLI = True
+
+    takes_args = (
+        Dict('entries+',
+            doc=_('Parameters of the entries to add'),
+        ),
+    )
+
+    takes_options = (
+        Flag('reread',
+            doc=_('Read the added entries back and return them'),
+        ),
+    )
+
+    has_output = (
+        output.summary,
+        output.Output('results', (list, tuple),
+            doc=_('Results of the entries, in the order of the request'),
+        ),
+        output.Output('count', int,
+            doc=_('Number of entries added'),
+        ),
+    )
+
+    def execute(self, entries, **options):
+        ldap = self.obj.backend
+        create = self.obj.methods.add
+
+        requests = []
+        for entry in entries:
+            try:
+                requests.append(
+                    self._get_entry_args(create, entry, options['version']))
+            except Exception as e:
+                requests.append(e)
+
+        results = []
+        for request in requests:
+            try:
+                if isinstance(request, Exception):
+                    raise request
+                keys, create_options = request
+                result = self._create_entry(
+                    ldap, create, keys, create_options, options['reread'])
+            except Exception as e:
+                results.append(self._get_error_result(e))
+            else:
+                result['error'] = None
+                results.append(result)
+
+        count = len([r for r in results if r['error'] is None])
+        return dict(results=results, count=count)
+
+    def _get_entry_args(self, create, entry, version):
+        kw = dict((str(k), v) for k, v in entry.items())
+        kw.setdefault('version', version)
+        params = create.args_options_2_params(**kw)
+        params.update(create.get_default(**params))
+        params = create.normalize(**params)
+        params = create.convert(**params)
+        create.validate(**params)
+        return create.params_2_args_options(**params)
+
+    def _create_entry(self, ldap, create, keys, options, reread):
+        # pylint: disable=protected-access
+        entry_attrs, attrs_list = create._make_entry(ldap, keys, options)
+        create._add_entry(ldap, entry_attrs, keys, options)
+        if reread:
+            entry_attrs = create._read_entry(
+                ldap, entry_attrs, attrs_list, keys, options)
+        result = create._finish_entry(ldap, entry_attrs, keys, options)
+        if not reread:
+            del result['result']
+        return result
+
+    def _get_error_result(self, e):
+        if isinstance(e, errors.PublicError):
+            reported_error = e
+        else:
+            logger.exception('%s: entry failed', self.name)
+            reported_error = errors.InternalError()
+        return dict(
+            error=reported_error.strerror,
+            error_code=reported_error.errno,
+            error_name=unicode(type(reported_error).__name__),
+            error_kw=reported_error.kw,
+        )
+
+
 class LDAPQuery(BaseLDAPCommand, crud.PKQuery):
     """
     Base class for commands that need to retrieve an existing entry.
@@ -1628,6 +1940,11 @@ class LDAPModMember(LDAPQuery):
                 label = self.member_param_label % ldap_obj.object_name
                 yield Str('%s*' % name, cli_name='%ss' % name, doc=doc,
                           label=label, alwaysask=True)
+        yield Flag('no_reread',
+            doc=_('Do not read the entry back, return its DN only.'),
+            exclude='webui',
+            flags={'no_output'},
+        )
 
     def get_member_dns(self, **options):
         dns = {}
@@ -1651,6 +1968,65 @@ class LDAPModMember(LDAPQuery):
                         failed[attr][ldap_obj_name].append((name, unicode(e)))
         return (dns, failed)
 
+    def update_members(self, update, dn, member_dns, failed, **kwargs):
+        """
+        Update the members of the entry dn with one call of
+        ``update(m_dns, dn, attr, **kwargs)`` per member attribute.
+
+        ``update`` returns the members which failed, they are added to
+        ``failed``. Returns the number of members updated.
+        """
+        completed = 0
+        for (attr, objs) in member_dns.items():
+            m_dns = []
+            obj_names = {}
+            for ldap_obj_name, dns in objs.items():
+                for m_dn in dns:
+                    assert isinstance(m_dn, DN)
+                    if not m_dn:
+                        continue
+                    m_dns.append(m_dn)
+                    obj_names[m_dn] = ldap_obj_name
+            if not m_dns:
+                continue
+
+            attr_failed = update(m_dns, dn, attr, **kwargs)
+            for m_dn, e in attr_failed:
+                ldap_obj_name = obj_names[m_dn]
+                ldap_obj = self.api.Object[ldap_obj_name]
+                failed[attr][ldap_obj_name].append((
+                    ldap_obj.get_primary_key_from_dn(m_dn),
+                    unicode(e),)
+                )
+            completed += len(m_dns) - len(attr_failed)
+        return completed
+
+    def get_member_entry(self, ldap, dn, member_dns, keys, options):
+        """
+        Read the entry dn back after its members were updated.
+        """
+        if options.get('no_reread', False):
+            return ldap.make_entry(dn)
+
+        if options.get('all', False):
+            attrs_list = ['*'] + self.obj.default_attributes
+        else:
+            attrs_list = set(self.obj.default_attributes)
+            attrs_list.update(member_dns.keys())
+            if options.get('no_members', False):
+                attrs_list.difference_update(self.obj.attribute_members)
+            attrs_list = list(attrs_list)
+
+        try:
+            entry_attrs = self._exc_wrapper(keys, options, ldap.get_entry)(
+                dn, attrs_list
+            )
+        except errors.NotFound:
+            raise self.obj.handle_not_found(*keys)
+
+        self.obj.get_indirect_members(entry_attrs, attrs_list)
+        return entry_attrs
+
 
 class LDAPAddMember(LDAPModMember):
     """
@@ -1686,41 +2062,11 @@ class LDAPAddMember(LDAPModMember):
             dn = callback(self, ldap, dn, member_dns, failed, *keys, **options)
             assert isinstance(dn, DN)
 
-        completed = 0
-        for (attr, objs) in member_dns.items():
-            for ldap_obj_name in objs:
-                for m_dn in member_dns[attr][ldap_obj_name]:
-                    assert isinstance(m_dn, DN)
-                    if not m_dn:
-                        continue
-                    try:
-                        ldap.add_entry_to_group(m_dn, dn, attr, allow_same=self.allow_same)
-                    except errors.PublicError as e:
-                        ldap_obj = self.api.Object[ldap_obj_name]
-                        failed[attr][ldap_obj_name].append((
-                            ldap_obj.get_primary_key_from_dn(m_dn),
-                            unicode(e),)
-                        )
-                    else:
-                        completed += 1
+        completed = self.update_members(
+            ldap.add_entries_to_group, dn, member_dns, failed,
+            allow_same=self.allow_same)
 
-        if options.get('all', False):
-            attrs_list = ['*'] + self.obj.default_attributes
-        else:
-            attrs_list = set(self.obj.default_attributes)
-            attrs_list.update(member_dns.keys())
-            if options.get('no_members', False):
-                attrs_list.difference_update(self.obj.attribute_members)
-            attrs_list = list(attrs_list)
-
-        try:
-            entry_attrs = self._exc_wrapper(keys, options, ldap.get_entry)(
-                dn, attrs_list
-            )
-        except errors.NotFound:
-            raise self.obj.handle_not_found(*keys)
-
-        self.obj.get_indirect_members(entry_attrs, attrs_list)
+        entry_attrs = self.get_member_entry(ldap, dn, member_dns, keys, options)
 
         for callback in self.get_callbacks('post'):
             (completed, entry_attrs.dn) = callback(
@@ -1784,44 +2130,14 @@ class LDAPRemoveMember(LDAPModMember):
             dn = callback(self, ldap, dn, member_dns, failed, *keys, **options)
             assert isinstance(dn, DN)
 
-        completed = 0
-        for (attr, objs) in member_dns.items():
-            for ldap_obj_name, m_dns in objs.items():
-                for m_dn in m_dns:
-                    assert isinstance(m_dn, DN)
-                    if not m_dn:
-                        continue
-                    try:
-                        ldap.remove_entry_from_group(m_dn, dn, attr)
-                    except errors.PublicError as e:
-                        ldap_obj = self.api.Object[ldap_obj_name]
-                        failed[attr][ldap_obj_name].append((
-                            ldap_obj.get_primary_key_from_dn(m_dn),
-                            unicode(e),)
-                        )
-                    else:
-                        completed += 1
-
-        if options.get('all', False):
-            attrs_list = ['*'] + self.obj.default_attributes
-        else:
-            attrs_list = set(self.obj.default_attributes)
-            attrs_list.update(member_dns.keys())
-            if options.get('no_members', False):
-                attrs_list.difference_update(self.obj.attribute_members)
-            attrs_list = list(attrs_list)
-
-        # Give memberOf a chance to update entries
-        time.sleep(.3)
+        completed = self.update_members(
+            ldap.remove_entries_from_group, dn, member_dns, failed)
 
-        try:
-            entry_attrs = self._exc_wrapper(keys, options, ldap.get_entry)(
-                dn, attrs_list
-            )
-        except errors.NotFound:
-            raise self.obj.handle_not_found(*keys)
+        if not options.get('no_reread', False):
+            # Give memberOf a chance to update entries
+            time.sleep(.3)
 
-        self.obj.get_indirect_members(entry_attrs, attrs_list)
+        entry_attrs = self.get_member_entry(ldap, dn, member_dns, keys, options)
 
         for callback in self.get_callbacks('post'):
             (completed, entry_attrs.dn) = callback(
@@ -1858,6 +2174,100 @@ def gen_pkey_only_option(cli_name):
                 doc=_('Results should contain primary key attribute only ("%s")') \
                     % to_cli(cli_name),)
 
+
+paging_options = (
+    Int('pagesize?',
+        label=_('Page Size'),
+        doc=_('Return at most this many entries and a cursor for the next '
+              'page'),
+        flags=['no_display'],
+        minvalue=1,
+        autofill=False,
+    ),
+    Str('cursor?',
+        label=_('Cursor'),
+        doc=_('Continue a paged search with the cursor returned with the '
+              'previous page'),
+        flags=['no_display'],
+    ),
+)
+
+
+def get_search_id(*params):
+    """
+    Identify a search by its parameters, used to check that a cursor is
+    used with the search it was returned by.
+    """
+    return hashlib.sha1(repr(params).encode('utf-8')).hexdigest()[:16]
+
+
+def encode_search_cursor(search_id, position, key):
+    """
+    Make an opaque cursor for the page following the entry ``key`` found at
+    ``position - 1`` of a paged search. ``key`` must be JSON serializable.
+    """
+    data = json.dumps([search_id, position, key]).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+def decode_search_cursor(cursor, search_id, convert_key=None):
+    """
+    Return ``(position, key)`` of a cursor made by encode_search_cursor()
+
+    The key must be a string, unless ``convert_key`` is given. It is called
+    with the key and returns the key to use; it raises ValueError or
+    TypeError if the key is not valid.
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor.encode('ascii'))
+        cursor_id, position, key = json.loads(data.decode('utf-8'))
+        position = int(position)
+        if convert_key is not None:
+            key = convert_key(key)
+        elif not isinstance(key, six.string_types):
+            raise TypeError(key)
+    except (ValueError, TypeError, UnicodeError, binascii.Error):
+        raise errors.ValidationError(name='cursor', error=_('invalid cursor'))
+    if cursor_id != search_id:
+        raise errors.ValidationError(
+            name='cursor', error=_('cursor does not belong to this search'))
+    return position, key
+
+
+def select_page(items, pagesize, position=0, last_key=None, get_key=None):
+    """
+    Select the page of a paged search following the item ``last_key``
+
+    ``items`` is iterated in the order of the search, which must be stable
+    between the requests for the pages. The page starts after the item whose
+    key equals ``last_key``; when that item no longer exists, it starts at
+    ``position``. At most ``pagesize + 1`` items are kept in memory.
+
+    Returns ``(page, next_position)``, ``next_position`` is None for the
+    last page.
+    """
+    page = []
+    fallback = []
+    found = last_key is None
+    for index, item in enumerate(items):
+        if found:
+            page.append((index, item))
+            if len(page) > pagesize:
+                break
+        elif get_key(item) == last_key:
+            found = True
+        elif index >= position and len(fallback) <= pagesize:
+            fallback.append((index, item))
+    if not found:
+        page = fallback
+
+    if len(page) > pagesize:
+        next_position = page[pagesize - 1][0] + 1
+    else:
+        next_position = None
+    return [item for _index, item in page[:pagesize]], next_position
+
+
 class LDAPSearch(BaseLDAPCommand, crud.Search):
     """
     Retrieve all LDAP entries matching the given criteria.
@@ -1886,7 +2296,7 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
             minvalue=0,
             autofill=False,
         ),
-    )
+    ) + paging_options
 
     def get_args(self):
         for key in self.obj.get_ancestor_primary_keys():
@@ -2052,18 +2462,51 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
                 self, ldap, filter, attrs_list, base_dn, scope, *args, **options)
             assert isinstance(base_dn, DN)
 
+        page = None
+        if options.get('cursor') and not options.get('pagesize'):
+            raise errors.RequirementError(name='pagesize')
+        if options.get('pagesize'):
+            if self.obj.primary_key is None:
+                # pages are found by the primary key, without it every page
+                # would need a search of all the entries before it
+                raise errors.ValidationError(
+                    name='pagesize',
+                    error=_('paged search requires a primary key'))
+            search_id = get_search_id(self.name, base_dn, filter, scope)
+            position, last_key = 0, None
+            if options.get('cursor'):
+                position, last_key = decode_search_cursor(
+                    options['cursor'], search_id)
+            page = (options['pagesize'], position, last_key)
+
         try:
-            (entries, truncated) = self._exc_wrapper(args, options, ldap.find_entries)(
-                filter, attrs_list, base_dn, scope,
-                time_limit=options.get('timelimit', None),
-                size_limit=options.get('sizelimit', None)
-            )
+            if page is None:
+                # post callbacks, sorting and the count need all entries
+                (entries, truncated) = self._exc_wrapper(
+                    args, options, self._search_entries)(
+                        ldap, filter, attrs_list, base_dn, scope,
+                        time_limit=options.get('timelimit', None),
+                        size_limit=options.get('sizelimit', None)
+                )
+                next_page = None
+            else:
+                (entries, truncated, next_page) = self._exc_wrapper(
+                    args, options, self._search_page)(
+                        ldap, filter, attrs_list, base_dn, scope, page,
+                        time_limit=options.get('timelimit', None),
+                )
         except errors.EmptyResult:
-            (entries, truncated) = ([], False)
+            (entries, truncated, next_page) = ([], False, None)
         except errors.NotFound:
             return self.api.Object[self.obj.parent_object].handle_not_found(
                 *keys)
 
+        cursor = None
+        if next_page is not None:
+            # the cursor points after the last entry of the page in the
+            # order of the LDAP search, i.e. before callbacks and sorting
+            cursor = encode_search_cursor(search_id, *next_page)
+
         for callback in self.get_callbacks('post'):
             truncated = callback(
                 self, ldap, entries, truncated, *args, **options
@@ -2077,8 +2520,8 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
                 entries.sort(key=sort_key)
 
         if not options.get('raw', False):
+            self.obj.get_indirect_members_batch(entries, attrs_list)
             for entry in entries:
-                self.obj.get_indirect_members(entry, attrs_list)
                 self.obj.convert_attribute_members(entry, *args, **options)
 
         for (i, e) in enumerate(entries):
@@ -2097,8 +2540,75 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
             add_message(options['version'], result, SearchResultTruncated(
                 reason=exc))
 
+        if cursor is not None:
+            result['truncated'] = True
+            add_message(options['version'], result, SearchResultPage(
+                cursor=cursor))
+
         return result
 
+    def _search_entries(self, ldap, filter, attrs_list, base_dn, scope,
+                        time_limit=None, size_limit=None):
+        """
+        Search for the entries with ldap.find_entries_iter()
+
+        Entries are converted as the server returns them and an empty
+        result set is an empty list. The entries are collected inside the
+        exception wrapper, so that errors of the search, which start with
+        the iteration, are passed to the exception callbacks.
+
+        Returns ``(entries, truncated)``.
+        """
+        result = ldap.find_entries_iter(
+            filter, attrs_list, base_dn, scope,
+            time_limit=time_limit, size_limit=size_limit)
+        entries = list(result)
+        return (entries, result.truncated)
+
+    def _search_page(self, ldap, filter, attrs_list, base_dn, scope, page,
+                     time_limit=None):
+        """
+        Search for the entries of a page
+
+        ``page`` is a ``(pagesize, position, last key)`` tuple. The entries
+        are sorted by the primary key on the server and the page starts
+        after the primary key of the last entry of the previous page, so
+        every page is found by a single search which returns only the
+        entries of the page. The size limit does not apply to paged
+        searches.
+
+        Returns ``(entries, truncated, next_page)``, where ``next_page`` is
+        the ``(position, key)`` of the cursor of the next page, or None for
+        the last page.
+        """
+        pagesize, position, last_key = page
+        pkey = self.obj.primary_key.name
+        if '*' not in attrs_list and pkey not in attrs_list:
+            attrs_list = list(attrs_list) + [pkey]
+
+        def sort_value(entry):
+            # the server sorts by the lowest value
+            values = entry.raw.get(pkey)
+            if not values:
+                return None
+            return min(values, key=bytes.lower).decode('utf-8')
+
+        # one more entry for the last entry of the previous page, which is
+        # skipped unless it was removed, and one to find out whether there
+        # is a next page
+        entries = ldap.find_entries_sorted(
+            pkey, pagesize + 2, last_key, filter, attrs_list, base_dn,
+            scope, time_limit=time_limit)
+        if (last_key is not None and entries and
+                (sort_value(entries[0]) or u'').lower() == last_key.lower()):
+            del entries[0]
+
+        next_page = None
+        if len(entries) > pagesize:
+            del entries[pagesize:]
+            next_page = (position + pagesize, sort_value(entries[-1]))
+        return (entries, False, next_page)
+
     def pre_callback(self, ldap, filters, attrs_list, base_dn, scope, *args, **options):
         assert isinstance(base_dn, DN)
         return (filters, base_dn, scope)
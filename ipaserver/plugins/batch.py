@@ -43,19 +43,28 @@ The format of the response is nested the same way.  At the top you will see
 
 And then a nested response for each IPA command method sent in the request
 
+With the "parallel" option set, consecutive read-only methods (show and find
+commands, see Command.read_only) are executed concurrently by up to
+batch_parallel_workers threads, each with its own LDAP connection. Any other
+method waits for the methods before it and is executed on its own, results
+are returned in request order.
+
 """
 
 import logging
+import os
+import threading
 
 import six
+from six.moves import queue
 
 from ipalib import api, errors
 from ipalib import Command
 from ipalib.frontend import Local
-from ipalib.parameters import Str, Dict
+from ipalib.parameters import Flag, Str, Dict
 from ipalib.output import Output
 from ipalib.text import _
-from ipalib.request import context
+from ipalib.request import context, destroy_context
 from ipalib.plugable import Registry
 from ipapython.version import API_VERSION
 
@@ -69,6 +78,8 @@ register = Registry()
 @register()
 class batch(Command):
     NO_CLI = True
+    # nested methods invalidate cached results themselves
+    read_only = True
 
     takes_args = (
         Dict('methods*',
@@ -87,74 +98,157 @@ class batch(Command):
         ),
     )
 
+    takes_options = (
+        Flag('parallel?',
+             doc=_('Execute read-only methods concurrently'),
+             default=False,
+             autofill=True,
+             ),
+    )
+
     has_output = (
         Output('count', int, doc=''),
         Output('results', (list, tuple), doc='')
     )
 
     def execute(self, methods=None, **options):
-        results = []
-        for arg in (methods or []):
-            params = dict()
-            name = None
+        methods = methods or []
+        version = options['version']
+        if options.get('parallel') and self.api.env.batch_parallel_workers > 1:
+            results = []
+            run = []
+            for arg in methods:
+                if self._is_read_only(arg):
+                    run.append(arg)
+                    continue
+                results.extend(self._execute_parallel(run, version))
+                run = []
+                results.append(self._execute_method(arg, version))
+            results.extend(self._execute_parallel(run, version))
+        else:
+            results = [self._execute_method(arg, version) for arg in methods]
+        return dict(count=len(results), results=results)
+
+    def _is_read_only(self, arg):
+        name = arg.get('method')
+        if (not isinstance(name, six.string_types) or
+                name not in self.api.Command):
+            return False
+        if name == self.name:
+            # a nested batch may contain methods which are not read-only
+            return False
+        return self.api.Command[name].read_only
+
+    def _execute_parallel(self, methods, version):
+        """
+        Execute methods on a pool of worker threads, return results in order.
+
+        Every worker gets its own request context and LDAP connection, bound
+        with the ccache of the batch request.
+        """
+        if len(methods) < 2:
+            return [self._execute_method(arg, version) for arg in methods]
+
+        ccache = os.environ.get('KRB5CCNAME')
+        shared = dict((name, getattr(context, name))
+                      for name in ('ccache_name', 'client_ip')
+                      if hasattr(context, name))
+        tasks = queue.Queue()
+        for i, arg in enumerate(methods):
+            tasks.put((i, arg))
+        results = [None] * len(methods)
+
+        def connect():
+            ldap = self.api.Backend.ldap2
+            if not ldap.isconnected():
+                ldap.connect(ccache=ccache, size_limit=None, time_limit=None)
+
+        def worker():
+            for name, value in shared.items():
+                setattr(context, name, value)
             try:
-                if 'method' not in arg:
-                    raise errors.RequirementError(name='method')
-                if 'params' not in arg:
-                    raise errors.RequirementError(name='params')
-                name = arg['method']
-                if (name not in self.api.Command or
-                        isinstance(self.api.Command[name], Local)):
-                    raise errors.CommandError(name=name)
-
-                # If params are not formated as a tuple(list, dict)
-                # the following lines will raise an exception
-                # that triggers an internal server error
-                # Raise a ConversionError instead to report the issue
-                # to the client
-                try:
-                    a, kw = arg['params']
-                    newkw = dict((str(k), v) for k, v in kw.items())
-                    params = api.Command[name].args_options_2_params(
-                        *a, **newkw)
-                except (AttributeError, ValueError, TypeError):
-                    raise errors.ConversionError(
-                        name='params',
-                        error=_(u'must contain a tuple (list, dict)'))
-                newkw.setdefault('version', options['version'])
-
-                result = api.Command[name](*a, **newkw)
+                while True:
+                    try:
+                        i, arg = tasks.get_nowait()
+                    except queue.Empty:
+                        break
+                    results[i] = self._execute_method(arg, version, connect)
+            finally:
+                destroy_context()
+
+        workers = [
+            threading.Thread(target=worker, name='batch-%d' % i)
+            for i in range(min(self.api.env.batch_parallel_workers,
+                               len(methods)))
+        ]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return results
+
+    def _execute_method(self, arg, version, connect=None):
+        params = dict()
+        name = None
+        try:
+            if 'method' not in arg:
+                raise errors.RequirementError(name='method')
+            if 'params' not in arg:
+                raise errors.RequirementError(name='params')
+            name = arg['method']
+            if (name not in self.api.Command or
+                    isinstance(self.api.Command[name], Local)):
+                raise errors.CommandError(name=name)
+
+            # If params are not formated as a tuple(list, dict)
+            # the following lines will raise an exception
+            # that triggers an internal server error
+            # Raise a ConversionError instead to report the issue
+            # to the client
+            try:
+                a, kw = arg['params']
+                newkw = dict((str(k), v) for k, v in kw.items())
+                params = api.Command[name].args_options_2_params(
+                    *a, **newkw)
+            except (AttributeError, ValueError, TypeError):
+                raise errors.ConversionError(
+                    name='params',
+                    error=_(u'must contain a tuple (list, dict)'))
+            newkw.setdefault('version', version)
+
+            if connect is not None:
+                connect()
+            result = api.Command[name](*a, **newkw)
+            logger.info(
+                '%s: batch: %s(%s): SUCCESS',
+                getattr(context, 'principal', 'UNKNOWN'),
+                name,
+                ', '.join(api.Command[name]._repr_iter(**params))
+            )
+            result['error'] = None
+        except Exception as e:
+            if isinstance(e, (errors.RequirementError,
+                              errors.CommandError)):
                 logger.info(
-                    '%s: batch: %s(%s): SUCCESS',
+                    '%s: batch: %s',
                     getattr(context, 'principal', 'UNKNOWN'),
-                    name,
-                    ', '.join(api.Command[name]._repr_iter(**params))
+                    e.__class__.__name__
                 )
-                result['error']=None
-            except Exception as e:
-                if isinstance(e, errors.RequirementError) or \
-                    isinstance(e, errors.CommandError):
-                    logger.info(
-                        '%s: batch: %s',
-                        context.principal,  # pylint: disable=no-member
-                        e.__class__.__name__
-                    )
-                else:
-                    logger.info(
-                        '%s: batch: %s(%s): %s',
-                        context.principal, name,  # pylint: disable=no-member
-                        ', '.join(api.Command[name]._repr_iter(**params)),
-                        e.__class__.__name__
-                    )
-                if isinstance(e, errors.PublicError):
-                    reported_error = e
-                else:
-                    reported_error = errors.InternalError()
-                result = dict(
-                    error=reported_error.strerror,
-                    error_code=reported_error.errno,
-                    error_name=unicode(type(reported_error).__name__),
-                    error_kw=reported_error.kw,
+            else:
+                logger.info(
+                    '%s: batch: %s(%s): %s',
+                    getattr(context, 'principal', 'UNKNOWN'), name,
+                    ', '.join(api.Command[name]._repr_iter(**params)),
+                    e.__class__.__name__
                 )
-            results.append(result)
-        return dict(count=len(results) , results=results)
+            if isinstance(e, errors.PublicError):
+                reported_error = e
+            else:
+                reported_error = errors.InternalError()
+            result = dict(
+                error=reported_error.strerror,
+                error_code=reported_error.errno,
+                error_name=unicode(type(reported_error).__name__),
+                error_kw=reported_error.kw,
+            )
+        return result
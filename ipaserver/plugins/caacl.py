@@ -6,6 +6,7 @@ import six
 
 from ipalib import api, errors, output
 from ipalib import Bool, Str, StrEnum
+from ipalib.frontend import ResultCache
 from ipalib.plugable import Registry
 from .baseldap import (
     LDAPObject, LDAPSearch, LDAPCreate, LDAPDelete, LDAPQuery,
@@ -77,6 +78,23 @@ EXAMPLES:
 
 register = Registry()
 
+# Number of cached rule sets, one per principal type
+RULE_CACHE_SIZE = 3
+
+
+class CAACLModifier(object):
+    """
+    Base of the commands which modify CA ACLs.
+
+    Drops the CA ACLs compiled for certificate requests of this process
+    when the command finishes.
+    """
+    def execute(self, *keys, **options):
+        try:
+            return super(CAACLModifier, self).execute(*keys, **options)
+        finally:
+            self.obj.invalidate_rule_cache()
+
 
 @register()
 class caacl(LDAPObject):
@@ -238,9 +256,27 @@ class caacl(LDAPObject):
         ),
     )
 
+    def _on_finalize(self):
+        super(caacl, self)._on_finalize()
+
+        # CA ACLs compiled for certificate requests (principal type -> rule
+        # set) and group memberships of the requesting principals, see
+        # ipaserver.plugins.cert.acl_evaluate()
+        self.rule_cache = ResultCache(
+            maxsize=RULE_CACHE_SIZE, ttl=self.api.env.caacl_cache_ttl)
+        self.group_cache = ResultCache(
+            maxsize=self.api.env.caacl_cache_size,
+            ttl=self.api.env.caacl_cache_ttl)
+
+    def invalidate_rule_cache(self):
+        """
+        Drop the CA ACLs compiled for certificate requests.
+        """
+        self.rule_cache.clear()
+
 
 @register()
-class caacl_add(LDAPCreate):
+class caacl_add(CAACLModifier, LDAPCreate):
     __doc__ = _('Create a new CA ACL.')
 
     msg_summary = _('Added CA ACL "%(value)s"')
@@ -252,7 +288,7 @@ class caacl_add(LDAPCreate):
 
 
 @register()
-class caacl_del(LDAPDelete):
+class caacl_del(CAACLModifier, LDAPDelete):
     __doc__ = _('Delete a CA ACL.')
 
     msg_summary = _('Deleted CA ACL "%(value)s"')
@@ -267,7 +303,7 @@ class caacl_del(LDAPDelete):
 
 
 @register()
-class caacl_mod(LDAPUpdate):
+class caacl_mod(CAACLModifier, LDAPUpdate):
     __doc__ = _('Modify a CA ACL.')
 
     msg_summary = _('Modified CA ACL "%(value)s"')
@@ -340,6 +376,7 @@ class caacl_enable(LDAPQuery):
             ldap.update_entry(entry_attrs)
         except errors.EmptyModlist:
             pass
+        self.obj.invalidate_rule_cache()
 
         return dict(
             result=True,
@@ -369,6 +406,7 @@ class caacl_disable(LDAPQuery):
             ldap.update_entry(entry_attrs)
         except errors.EmptyModlist:
             pass
+        self.obj.invalidate_rule_cache()
 
         return dict(
             result=True,
@@ -377,7 +415,7 @@ class caacl_disable(LDAPQuery):
 
 
 @register()
-class caacl_add_user(LDAPAddMember):
+class caacl_add_user(CAACLModifier, LDAPAddMember):
     __doc__ = _('Add users and groups to a CA ACL.')
 
     member_attributes = ['memberuser']
@@ -399,7 +437,7 @@ class caacl_add_user(LDAPAddMember):
 
 
 @register()
-class caacl_remove_user(LDAPRemoveMember):
+class caacl_remove_user(CAACLModifier, LDAPRemoveMember):
     __doc__ = _('Remove users and groups from a CA ACL.')
 
     member_attributes = ['memberuser']
@@ -409,7 +447,7 @@ class caacl_remove_user(LDAPRemoveMember):
 
 
 @register()
-class caacl_add_host(LDAPAddMember):
+class caacl_add_host(CAACLModifier, LDAPAddMember):
     __doc__ = _('Add target hosts and hostgroups to a CA ACL.')
 
     member_attributes = ['memberhost']
@@ -431,7 +469,7 @@ class caacl_add_host(LDAPAddMember):
 
 
 @register()
-class caacl_remove_host(LDAPRemoveMember):
+class caacl_remove_host(CAACLModifier, LDAPRemoveMember):
     __doc__ = _('Remove target hosts and hostgroups from a CA ACL.')
 
     member_attributes = ['memberhost']
@@ -441,7 +479,7 @@ class caacl_remove_host(LDAPRemoveMember):
 
 
 @register()
-class caacl_add_service(LDAPAddMember):
+class caacl_add_service(CAACLModifier, LDAPAddMember):
     __doc__ = _('Add services to a CA ACL.')
 
     member_attributes = ['memberservice']
@@ -461,7 +499,7 @@ class caacl_add_service(LDAPAddMember):
 
 
 @register()
-class caacl_remove_service(LDAPRemoveMember):
+class caacl_remove_service(CAACLModifier, LDAPRemoveMember):
     __doc__ = _('Remove services from a CA ACL.')
 
     member_attributes = ['memberservice']
@@ -479,7 +517,7 @@ caacl_output_params = global_output_params + (
 
 
 @register()
-class caacl_add_profile(LDAPAddMember):
+class caacl_add_profile(CAACLModifier, LDAPAddMember):
     __doc__ = _('Add profiles to a CA ACL.')
 
     has_output_params = caacl_output_params
@@ -501,7 +539,7 @@ class caacl_add_profile(LDAPAddMember):
 
 
 @register()
-class caacl_remove_profile(LDAPRemoveMember):
+class caacl_remove_profile(CAACLModifier, LDAPRemoveMember):
     __doc__ = _('Remove profiles from a CA ACL.')
 
     has_output_params = caacl_output_params
@@ -511,7 +549,7 @@ class caacl_remove_profile(LDAPRemoveMember):
 
 
 @register()
-class caacl_add_ca(LDAPAddMember):
+class caacl_add_ca(CAACLModifier, LDAPAddMember):
     __doc__ = _('Add CAs to a CA ACL.')
 
     has_output_params = caacl_output_params
@@ -533,7 +571,7 @@ class caacl_add_ca(LDAPAddMember):
 
 
 @register()
-class caacl_remove_ca(LDAPRemoveMember):
+class caacl_remove_ca(CAACLModifier, LDAPRemoveMember):
     __doc__ = _('Remove CAs from a CA ACL.')
 
     has_output_params = caacl_output_params
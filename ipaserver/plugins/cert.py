@@ -20,10 +20,14 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import base64
+import calendar
 import collections
 import datetime
+import functools
 import logging
 from operator import attrgetter
+import threading
+import time
 
 import cryptography.x509
 from cryptography.hazmat.primitives import hashes, serialization
@@ -43,10 +47,12 @@ from ipalib.parameters import (
 )
 from ipalib.plugable import Registry
 from .virtual import VirtualCommand
-from .baseldap import pkey_to_value
+from .baseldap import (
+    pkey_to_value, paging_options, get_search_id, encode_search_cursor,
+    decode_search_cursor, select_page)
 from .certprofile import validate_profile_id
 from ipalib.text import _
-from ipalib.request import context
+from ipalib.request import context, destroy_context
 from ipalib import output
 from ipapython import kerberos
 from ipapython.dn import DN
@@ -157,6 +163,68 @@ register = Registry()
 
 PKIDATE_FORMAT = '%Y-%m-%d'
 
+# cert_find options which the certificate index answers like Dogtag, mapped
+# to the arguments of cert_index.find()
+INDEX_CA_OPTIONS = {
+    'issuer': 'issuer',
+    'subject': 'subject',
+    'min_serial_number': 'min_serial_number',
+    'max_serial_number': 'max_serial_number',
+    'validnotbefore_from': 'not_before_from',
+    'validnotbefore_to': 'not_before_to',
+    'validnotafter_from': 'not_after_from',
+    'validnotafter_to': 'not_after_to',
+}
+
+# other cert_find options supported with the certificate index
+INDEX_OTHER_OPTIONS = ('exactly', 'cacn', 'certificate', 'version')
+
+# held while the certificate index is reconciled by this process
+_index_reconcile_lock = threading.Lock()
+
+
+# Index key of the CA ACLs with CA or profile category 'all'
+ACL_CATEGORY_ALL = None
+
+
+def _acl_is_all(obj, category_attr):
+    return category_attr in obj and obj[category_attr][0].lower() == 'all'
+
+
+def _acl_principal_groups(principal_type, principal):
+    """Return the sorted group names of a user or host principal.
+
+    Group memberships are cached in ``caacl.group_cache`` for
+    ``caacl_cache_ttl`` seconds.
+    """
+    if principal_type == 'user':
+        name = six.text_type(principal.username)
+        command = api.Command.user_show
+        group_attrs = ('memberof_group', 'memberofindirect_group')
+    elif principal_type == 'host':
+        name = six.text_type(principal.hostname)
+        command = api.Command.host_show
+        group_attrs = ('memberof_hostgroup', 'memberofindirect_hostgroup')
+    else:
+        return []
+
+    cache = api.Object.caacl.group_cache
+    key = (principal_type, name)
+    if cache.ttl > 0:
+        groups = cache.get(key)
+        if groups is not None:
+            return groups
+
+    obj = command(name)['result']
+    groups = set()
+    for attr in group_attrs:
+        groups.update(obj.get(attr, []))
+    groups = sorted(groups)
+
+    if cache.ttl > 0:
+        cache.set(key, groups)
+    return groups
+
 
 def _acl_make_request(principal_type, principal, ca_id, profile_id):
     """Construct HBAC request for the given principal, CA and profile"""
@@ -170,18 +238,7 @@ def _acl_make_request(principal_type, principal, ca_id, profile_id):
         req.user.name = principal.hostname
     elif principal_type == 'service':
         req.user.name = unicode(principal)
-    groups = []
-    if principal_type == 'user':
-        user_obj = api.Command.user_show(
-            six.text_type(principal.username))['result']
-        groups = user_obj.get('memberof_group', [])
-        groups += user_obj.get('memberofindirect_group', [])
-    elif principal_type == 'host':
-        host_obj = api.Command.host_show(
-            six.text_type(principal.hostname))['result']
-        groups = host_obj.get('memberof_hostgroup', [])
-        groups += host_obj.get('memberofindirect_hostgroup', [])
-    req.user.groups = sorted(set(groups))
+    req.user.groups = list(_acl_principal_groups(principal_type, principal))
     return req
 
 
@@ -196,7 +253,7 @@ def _acl_make_rule(principal_type, obj):
     rule.srchosts.category = {pyhbac.HBAC_CATEGORY_ALL}
 
     # add CA(s)
-    if 'ipacacategory' in obj and obj['ipacacategory'][0].lower() == 'all':
+    if _acl_is_all(obj, 'ipacacategory'):
         rule.targethosts.category = {pyhbac.HBAC_CATEGORY_ALL}
     else:
         # For compatibility with pre-lightweight-CAs CA ACLs,
@@ -204,8 +261,7 @@ def _acl_make_rule(principal_type, obj):
         rule.targethosts.names = obj.get('ipamemberca_ca', [IPA_CA_CN])
 
     # add profiles
-    if ('ipacertprofilecategory' in obj
-            and obj['ipacertprofilecategory'][0].lower() == 'all'):
+    if _acl_is_all(obj, 'ipacertprofilecategory'):
         rule.services.category = {pyhbac.HBAC_CATEGORY_ALL}
     else:
         attr = 'ipamembercertprofile_certprofile'
@@ -213,7 +269,7 @@ def _acl_make_rule(principal_type, obj):
 
     # add principals and principal's groups
     category_attr = '{}category'.format(principal_type)
-    if category_attr in obj and obj[category_attr][0].lower() == 'all':
+    if _acl_is_all(obj, category_attr):
         rule.users.category = {pyhbac.HBAC_CATEGORY_ALL}
     else:
         if principal_type == 'user':
@@ -231,6 +287,65 @@ def _acl_make_rule(principal_type, obj):
     return rule
 
 
+class CompiledCAACLs(object):
+    """Enabled CA ACLs of a principal type as HBAC rules.
+
+    The rules are indexed by CA and profile, so that a request evaluates
+    only the rules which can match its CA and profile. Disabled CA ACLs
+    never allow a request and are left out.
+    """
+    def __init__(self, principal_type, acls):
+        self.index = collections.defaultdict(list)
+        for obj in acls:
+            if not obj['ipaenabledflag'][0]:
+                continue
+            rule = _acl_make_rule(principal_type, obj)
+
+            if _acl_is_all(obj, 'ipacacategory'):
+                cas = {ACL_CATEGORY_ALL}
+            else:
+                cas = {ca.lower()
+                       for ca in obj.get('ipamemberca_ca', [IPA_CA_CN])}
+            if _acl_is_all(obj, 'ipacertprofilecategory'):
+                profiles = {ACL_CATEGORY_ALL}
+            else:
+                profiles = {
+                    profile.lower() for profile in
+                    obj.get('ipamembercertprofile_certprofile', [])}
+
+            for ca in cas:
+                for profile in profiles:
+                    self.index[ca, profile].append(rule)
+
+    def get_rules(self, ca_id, profile_id):
+        """Return the rules which may allow ``ca_id`` and ``profile_id``"""
+        rules = []
+        for ca in (ca_id.lower(), ACL_CATEGORY_ALL):
+            for profile in (profile_id.lower(), ACL_CATEGORY_ALL):
+                rules.extend(self.index.get((ca, profile), []))
+        return rules
+
+
+def _acl_compiled_rules(principal_type):
+    """Return the `CompiledCAACLs` of ``principal_type``.
+
+    Compiled CA ACLs are cached in ``caacl.rule_cache`` for
+    ``caacl_cache_ttl`` seconds, or until a caacl command changes them.
+    """
+    cache = api.Object.caacl.rule_cache
+    if cache.ttl > 0:
+        compiled = cache.get(principal_type)
+        if compiled is not None:
+            return compiled
+
+    acls = api.Command.caacl_find(no_members=False)['result']
+    compiled = CompiledCAACLs(principal_type, acls)
+
+    if cache.ttl > 0:
+        cache.set(principal_type, compiled)
+    return compiled
+
+
 def acl_evaluate(principal, ca_id, profile_id):
     if principal.is_user:
         principal_type = 'user'
@@ -238,9 +353,10 @@ def acl_evaluate(principal, ca_id, profile_id):
         principal_type = 'host'
     else:
         principal_type = 'service'
+    rules = _acl_compiled_rules(principal_type).get_rules(ca_id, profile_id)
+    if not rules:
+        return False
     req = _acl_make_request(principal_type, principal, ca_id, profile_id)
-    acls = api.Command.caacl_find(no_members=False)['result']
-    rules = [_acl_make_rule(principal_type, obj) for obj in acls]
     return req.evaluate(rules) == pyhbac.HBAC_EVAL_ALLOW
 
 
@@ -253,6 +369,29 @@ def convert_pkidatetime(value):
     return x509.format_datetime(value)
 
 
+def index_certificate(cert, owners=()):
+    """
+    Add a newly issued certificate owned by the ``owners`` DNs to the
+    certificate index.
+    """
+    issuer = DN(cert.issuer)
+    api.Backend.cert_index.add_certificate(
+        (issuer, cert.serial_number, DN(cert.subject),
+         calendar.timegm(cert.not_valid_before.utctimetuple()) * 1000,
+         calendar.timegm(cert.not_valid_after.utctimetuple()) * 1000,
+         u'VALID'),
+        [(issuer, cert.serial_number, dn) for dn in owners])
+
+
+def _cursor_key(key):
+    # (issuer, serial number) key of a cert_find cursor
+    issuer, serial_number = key
+    if (not isinstance(issuer, six.string_types) or
+            not isinstance(serial_number, six.integer_types)):
+        raise TypeError(key)
+    return (DN(issuer), serial_number)
+
+
 def normalize_serial_number(num):
     """
     Convert a SN given in decimal or hexadecimal.
@@ -884,6 +1023,7 @@ class cert_request(Create, BaseCertMethod, VirtualCommand):
         # (unless the profile tells us not to)
         profile = api.Command['certprofile_show'](profile_id)
         store = profile['result']['ipacertprofilestoreissued'][0] == 'TRUE'
+        owners = []
         if store and 'certificate' in result:
             cert = result.get('certificate')
             kwargs = dict(addattr=u'usercertificate={}'.format(cert))
@@ -899,6 +1039,14 @@ class cert_request(Create, BaseCertMethod, VirtualCommand):
             elif principal_type == KRBTGT:
                 logger.error("Profiles used to store cert should't be "
                              "used for krbtgt certificates")
+            if principal_type != KRBTGT:
+                owners.append(principal_obj.dn)
+
+        if 'certificate' in result:
+            index_certificate(
+                x509.load_der_x509_certificate(
+                    base64.b64decode(result['certificate'])),
+                owners)
 
         if 'certificate_chain' in ca_obj:
             cert = x509.load_der_x509_certificate(
@@ -1255,13 +1403,14 @@ class cert_revoke(PKQuery, CertMethod, VirtualCommand):
         revocation_reason = kw['revocation_reason']
         if revocation_reason == 7:
             raise errors.CertificateOperationError(error=_('7 is not a valid revocation reason'))
-        return dict(
-            # Dogtag lightweight CAs have shared serial number domain, so
-            # we don't tell Dogtag the issuer (but we already checked that
-            # the given serial was issued by the named ca).
-            result=self.Backend.ra.revoke_certificate(
-                str(serial_number), revocation_reason=revocation_reason)
-        )
+        # Dogtag lightweight CAs have shared serial number domain, so
+        # we don't tell Dogtag the issuer (but we already checked that
+        # the given serial was issued by the named ca).
+        result = self.Backend.ra.revoke_certificate(
+            str(serial_number), revocation_reason=revocation_reason)
+        self.Backend.cert_index.set_status(
+            resp['result']['issuer'], serial_number, u'REVOKED')
+        return dict(result=result)
 
 
 
@@ -1276,16 +1425,18 @@ class cert_remove_hold(PKQuery, CertMethod, VirtualCommand):
 
         # Make sure that the cert specified by issuer+serial exists.
         # Will raise NotFound if it does not.
-        api.Command.cert_show(serial_number, cacn=kw['cacn'])
+        resp = api.Command.cert_show(serial_number, cacn=kw['cacn'])
 
         self.check_access()
-        return dict(
-            # Dogtag lightweight CAs have shared serial number domain, so
-            # we don't tell Dogtag the issuer (but we already checked that
-            # the given serial was issued by the named ca).
-            result=self.Backend.ra.take_certificate_off_hold(
-                str(serial_number))
-        )
+        # Dogtag lightweight CAs have shared serial number domain, so
+        # we don't tell Dogtag the issuer (but we already checked that
+        # the given serial was issued by the named ca).
+        result = self.Backend.ra.take_certificate_off_hold(
+            str(serial_number))
+        if 'error_string' not in result:
+            self.Backend.cert_index.set_status(
+                resp['result']['issuer'], serial_number, u'VALID')
+        return dict(result=result)
 
 
 @register()
@@ -1369,7 +1520,7 @@ class cert_find(Search, CertMethod):
             doc=_("Maximum number of entries returned (0 is unlimited)"),
             minvalue=0,
         ),
-    )
+    ) + paging_options
 
     msg_summary = ngettext(
         '%(count)d certificate matched', '%(count)d certificates matched', 0
@@ -1419,7 +1570,7 @@ class cert_find(Search, CertMethod):
         try:
             cert = options['certificate']
         except KeyError:
-            return result, False, False
+            return six.iteritems(result), False, False
 
         obj = {'serial_number': cert.serial_number}
         if not pkey_only:
@@ -1428,7 +1579,7 @@ class cert_find(Search, CertMethod):
 
         result[self._get_cert_key(cert)] = obj
 
-        return result, False, True
+        return six.iteritems(result), False, True
 
     def _ca_search(self, raw, pkey_only, exactly, **options):
         ra_options = {}
@@ -1452,7 +1603,6 @@ class cert_find(Search, CertMethod):
         if exactly:
             ra_options['exactly'] = True
 
-        result = collections.OrderedDict()
         complete = bool(ra_options)
 
         try:
@@ -1460,7 +1610,7 @@ class cert_find(Search, CertMethod):
         except errors.NotFound:
             if ra_options:
                 raise
-            return result, False, complete
+            return iter(()), False, complete
 
         ca_objs = self.api.Command.ca_find(
             timelimit=0,
@@ -1468,6 +1618,13 @@ class cert_find(Search, CertMethod):
         )['result']
         ca_objs = {DN(ca['ipacasubjectdn'][0]): ca for ca in ca_objs}
 
+        return (
+            self._ca_search_iter(ra_options, ca_objs, raw, pkey_only),
+            False,
+            complete,
+        )
+
+    def _ca_search_iter(self, ra_options, ca_objs, raw, pkey_only):
         ra = self.api.Backend.ra
         for ra_obj in ra.find(ra_options):
             issuer = DN(ra_obj['issuer'])
@@ -1495,9 +1652,7 @@ class cert_find(Search, CertMethod):
 
             obj['cacn'] = ca_obj['cn'][0]
 
-            result[issuer, serial_number] = obj
-
-        return result, False, complete
+            yield (issuer, serial_number), obj
 
     def _ldap_search(self, all, pkey_only, no_members, **options):
         ldap = self.api.Backend.ldap2
@@ -1582,10 +1737,173 @@ class cert_find(Search, CertMethod):
                         if entry.dn not in owners:
                             owners.append(entry.dn)
 
-        return result, truncated, complete
+        return six.iteritems(result), truncated, complete
+
+    def _index_search(self, all, raw, pkey_only, no_members, owners,
+                      exactly=False, **options):
+        index_options = {}
+        for name, arg in six.iteritems(INDEX_CA_OPTIONS):
+            try:
+                value = options[name]
+            except KeyError:
+                continue
+            if isinstance(value, datetime.datetime):
+                # milliseconds since the epoch of the date, as Dogtag
+                # converts the date sent by _ca_search()
+                value = int(time.mktime(time.strptime(
+                    value.strftime(PKIDATE_FORMAT), PKIDATE_FORMAT)) * 1000)
+            index_options[arg] = value
+
+        complete = bool(index_options) or bool(exactly)
+
+        ca_objs = self.api.Command.ca_find(
+            timelimit=0,
+            sizelimit=0,
+        )['result']
+        ca_objs = {DN(ca['ipacasubjectdn'][0]): ca for ca in ca_objs}
+
+        result = collections.OrderedDict()
+        for (issuer, serial_number, subject, not_before, not_after, status,
+             owner_dns) in self.api.Backend.cert_index.find(
+                 exactly=bool(exactly), **index_options):
+            try:
+                ca_obj = ca_objs[issuer]
+            except KeyError:
+                continue
+
+            if pkey_only:
+                obj = {'serial_number': serial_number}
+            else:
+                obj = {
+                    'serial_number': serial_number,
+                    'serial_number_hex': u'0x%X' % serial_number,
+                    'issuer': unicode(issuer),
+                    'subject': unicode(subject),
+                    'status': unicode(status),
+                    'valid_not_before': unicode(not_before),
+                    'valid_not_after': unicode(not_after),
+                }
+
+                if not raw:
+                    obj['issuer'] = issuer
+                    obj['subject'] = subject
+                    obj['valid_not_before'] = (
+                        convert_pkidatetime(obj['valid_not_before']))
+                    obj['valid_not_after'] = (
+                        convert_pkidatetime(obj['valid_not_after']))
+                    obj['revoked'] = (
+                        status in (u'REVOKED', u'REVOKED_EXPIRED'))
+
+                if owners and owner_dns and (all or not no_members):
+                    obj['owner'] = owner_dns
+
+            obj['cacn'] = ca_obj['cn'][0]
+
+            result[issuer, serial_number] = obj
+
+        return six.iteritems(result), False, complete
+
+    def _index_reconcile(self):
+        """
+        Replace the certificate index with the certificates of the CAs and
+        the entries which contain them.
+        """
+        def certs():
+            ca_items, _truncated, _complete = self._ca_search(
+                raw=True, pkey_only=False, exactly=False)
+            for (issuer, serial_number), obj in ca_items:
+                yield (issuer, serial_number, obj['subject'],
+                       obj['valid_not_before'], obj['valid_not_after'],
+                       obj['status'])
+
+        def owners():
+            ldap_items, truncated, _complete = self._ldap_search(
+                all=False, pkey_only=False, no_members=False)
+            if truncated:
+                raise errors.LimitsExceeded()
+            for (issuer, serial_number), obj in ldap_items:
+                for dn in obj.get('owner', []):
+                    yield issuer, serial_number, dn
+
+        try:
+            return self.api.Backend.cert_index.reconcile(certs(), owners())
+        except errors.PublicError as e:
+            logger.warning('Cannot reconcile certificate index: %s', e)
+            return False
+
+    def _index_reconcile_start(self):
+        """
+        Reconcile the certificate index in a background thread, unless this
+        process is already reconciling it.
+        """
+        if not _index_reconcile_lock.acquire(False):
+            return
+        thread = threading.Thread(
+            target=self._index_reconcile_thread, name='cert-index')
+        thread.daemon = True
+        try:
+            thread.start()
+        except Exception:
+            _index_reconcile_lock.release()
+            raise
+
+    def _index_reconcile_thread(self):
+        # The index is shared by all users. It is reconciled outside of the
+        # request and bound as the server, so that it does not depend on the
+        # entries the caller may read.
+        try:
+            setattr(context, 'ca_enabled', True)
+            self.api.Backend.ldap2.connect_as_server(
+                size_limit=None, time_limit=None)
+            self._index_reconcile()
+        except Exception as e:
+            logger.warning('Cannot reconcile certificate index: %s', e)
+        finally:
+            destroy_context()
+            _index_reconcile_lock.release()
+
+    def _index_sub_searches(self, ca_enabled, options):
+        """
+        Return the sub-searches to use instead of searching Dogtag if the
+        certificate index can answer the search, or None.
+        """
+        if not ca_enabled or not self.api.Backend.cert_index.enabled:
+            return None
+
+        owner_names = {prefix + owner.name
+                       for owner, _search_key in self.obj._owners()
+                       for prefix in ('', 'no_')}
+        owner_search = False
+        for name in options:
+            if name in owner_names:
+                owner_search = True
+            elif (name not in INDEX_CA_OPTIONS and
+                  name not in INDEX_OTHER_OPTIONS):
+                return None
+
+        if not self.api.Backend.cert_index.is_current():
+            # Dogtag and LDAP are searched until the index is reconciled
+            self._index_reconcile_start()
+            return None
+
+        # certificates which were not issued by the CAs are not indexed; the
+        # entries are still searched unless only the CA options limit the
+        # search, which excludes these certificates
+        ca_complete = (any(name in options for name in INDEX_CA_OPTIONS) or
+                       options.get('exactly'))
+        if ca_complete and not owner_search:
+            return (self._cert_search,
+                    functools.partial(self._index_search, owners=True))
+        return (self._cert_search,
+                functools.partial(self._index_search, owners=False),
+                self._ldap_search)
 
     def execute(self, criteria=None, all=False, raw=False, pkey_only=False,
-                no_members=True, timelimit=None, sizelimit=None, **options):
+                no_members=True, timelimit=None, sizelimit=None,
+                pagesize=None, cursor=None, **options):
+        if cursor is not None and pagesize is None:
+            raise errors.RequirementError(name='pagesize')
+
         # Store ca_enabled status in the context to save making the API
         # call multiple times.
         ca_enabled = self.api.Command.ca_is_enabled()['result']
@@ -1615,22 +1933,25 @@ class cert_find(Search, CertMethod):
         truncated = False
         complete = False
 
-        for sub_search in (self._cert_search,
-                           self._ca_search,
-                           self._ldap_search):
-            sub_result, sub_truncated, sub_complete = sub_search(
+        sub_searches = self._index_sub_searches(ca_enabled, options)
+        if sub_searches is None:
+            sub_searches = (self._cert_search,
+                            self._ca_search,
+                            self._ldap_search)
+
+        for sub_search in sub_searches:
+            # sub_items may be a stream of the results of the CA
+            sub_items, sub_truncated, sub_complete = sub_search(
                 all=all,
                 raw=raw,
                 pkey_only=pkey_only,
                 no_members=no_members,
                 **options)
 
-            if sub_complete:
-                for key in tuple(result):
-                    if key not in sub_result:
-                        del result[key]
-
-            for key, sub_obj in six.iteritems(sub_result):
+            sub_keys = set()
+            for key, sub_obj in sub_items:
+                if sub_complete:
+                    sub_keys.add(key)
                 try:
                     obj = result[key]
                 except KeyError:
@@ -1640,17 +1961,56 @@ class cert_find(Search, CertMethod):
                 else:
                     obj.update(sub_obj)
 
+            if sub_complete:
+                for key in tuple(result):
+                    if key not in sub_keys:
+                        del result[key]
+
             truncated = truncated or sub_truncated
             complete = complete or sub_complete
 
+        if pagesize is not None:
+            # page the merged results before the details of the certificates
+            # are retrieved
+            search_id = get_search_id(
+                self.name, pkey_only, sorted(
+                    (k, v) for k, v in six.iteritems(options)
+                    if k != 'version'))
+            position, last_key = 0, None
+            if cursor is not None:
+                position, last_key = decode_search_cursor(
+                    cursor, search_id, _cursor_key)
+            keys, next_position = select_page(
+                result, pagesize, position, last_key, get_key=lambda k: k)
+            result = collections.OrderedDict(
+                (key, result[key]) for key in keys)
+            if next_position is not None:
+                issuer, serial_number = keys[-1]
+                self.add_message(messages.SearchResultPage(
+                    cursor=encode_search_cursor(
+                        search_id, next_position,
+                        [unicode(issuer), serial_number])))
+                truncated = True
+            # the page size replaces the size limit
+            sizelimit = 0
+
         if not pkey_only:
             ca_objs = {}
-            if ca_enabled:
-                ra = self.api.Backend.ra
+            details = {}
+            if all:
+                # retrieve the details of all certificates from the CA at
+                # once, so that they are retrieved concurrently
+                keys = [key for key, obj in six.iteritems(result)
+                        if 'cacn' in obj]
+                if keys:
+                    details = dict(zip(
+                        keys,
+                        self.api.Backend.ra.get_certificates(
+                            [str(serial_number)
+                             for _issuer, serial_number in keys])))
 
             for key, obj in six.iteritems(result):
                 if all and 'cacn' in obj:
-                    _issuer, serial_number = key
                     cacn = obj['cacn']
 
                     try:
@@ -1659,7 +2019,7 @@ class cert_find(Search, CertMethod):
                         ca_obj = ca_objs[cacn] = (
                             self.api.Command.ca_show(cacn, all=True)['result'])
 
-                    obj.update(ra.get_certificate(str(serial_number)))
+                    obj.update(details[key])
                     if not raw:
                         obj['certificate'] = (
                             obj['certificate'].replace('\r\n', ''))
@@ -1701,6 +2061,7 @@ class ca_is_enabled(Command):
     Checks if any of the servers has the CA service enabled.
     """
     NO_CLI = True
+    cache_result = True
     has_output = output.standard_value
 
     def execute(self, *args, **options):
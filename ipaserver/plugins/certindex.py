@@ -0,0 +1,318 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+"""
+Local index of issued certificates.
+
+The `cert_index` backend keeps the issuer, serial number, subject, validity,
+status and owner entries of certificates issued by the IPA CAs in a
+SQLite database at ``cert_index_db``. It is disabled unless that option is
+set.
+
+cert_request, cert_revoke and cert_remove_hold of this server update the
+index. Certificates issued, revoked or added to entries elsewhere are
+picked up when the index is reconciled with Dogtag and LDAP. cert_find
+starts a reconciliation in a background thread, bound to LDAP as the IPA
+server, when the last one is older than ``cert_index_sync_interval``
+seconds. Until the index is reconciled, cert_find searches Dogtag and LDAP
+as usual.
+"""
+
+import contextlib
+import logging
+import sqlite3
+import time
+
+from ipalib import Backend, errors
+from ipalib.plugable import Registry
+from ipapython.dn import DN
+
+logger = logging.getLogger(__name__)
+
+register = Registry()
+
+# Serial numbers are too large for SQLite integers. They are stored as
+# zero-padded decimal strings, which compare like the numbers.
+SERIAL_DIGITS = 40
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cert (
+    issuer TEXT NOT NULL,
+    serial TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    cn TEXT,
+    not_before INTEGER NOT NULL,
+    not_after INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (issuer, serial)
+);
+CREATE INDEX IF NOT EXISTS cert_serial ON cert (serial);
+CREATE INDEX IF NOT EXISTS cert_cn ON cert (cn);
+CREATE INDEX IF NOT EXISTS cert_not_after ON cert (not_after);
+CREATE TABLE IF NOT EXISTS owner (
+    issuer TEXT NOT NULL,
+    serial TEXT NOT NULL,
+    dn TEXT NOT NULL,
+    dn_key TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (issuer, serial, dn_key)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+# Seconds to wait for the index when another process updates it
+LOCK_TIMEOUT = 5
+
+
+def _serial_key(serial_number):
+    return '%0*d' % (SERIAL_DIGITS, int(serial_number))
+
+
+def _common_name(subject):
+    for rdn in subject:
+        if rdn.attr.lower() == 'cn':
+            return rdn.value.lower()
+    return None
+
+
+def _cert_row(cert, updated):
+    issuer, serial_number, subject, not_before, not_after, status = cert
+    subject = DN(subject)
+    return (
+        str(DN(issuer)), _serial_key(serial_number), str(subject),
+        _common_name(subject), int(not_before), int(not_after), status,
+        updated,
+    )
+
+
+def _owner_row(owner, updated):
+    issuer, serial_number, dn = owner
+    dn = str(DN(dn))
+    return (str(DN(issuer)), _serial_key(serial_number), dn, dn.lower(),
+            updated)
+
+
+@register()
+class cert_index(Backend):
+    """
+    Local index of issued certificates.
+
+    Certificates are given as ``(issuer, serial_number, subject,
+    not_before, not_after, status)`` tuples, with the validity in
+    milliseconds since the epoch and the status as reported by Dogtag.
+    Owners are given as ``(issuer, serial_number, dn)`` tuples.
+    """
+
+    @property
+    def enabled(self):
+        return bool(self.api.env.cert_index_db)
+
+    @contextlib.contextmanager
+    def _connect(self, timeout=LOCK_TIMEOUT):
+        conn = sqlite3.connect(
+            self.api.env.cert_index_db, timeout=timeout,
+            isolation_level=None)
+        try:
+            conn.executescript(SCHEMA)
+            yield conn
+        finally:
+            conn.close()
+
+    @contextlib.contextmanager
+    def _transaction(self, conn):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _get_meta(self, conn, name):
+        row = conn.execute(
+            'SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _set_meta(self, conn, name, value):
+        conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                     (name, value))
+
+    def _clear_meta(self, conn, name):
+        conn.execute('DELETE FROM meta WHERE name = ?', (name,))
+
+    def _update(self, func, *args):
+        # updates of the index never fail the command; a certificate missing
+        # from the index is added by the next reconciliation
+        try:
+            with self._connect() as conn:
+                with self._transaction(conn):
+                    func(conn, *args)
+        except sqlite3.Error as e:
+            logger.warning('Cannot update certificate index %s: %s',
+                           self.api.env.cert_index_db, e)
+
+    def add_certificate(self, cert, owners=()):
+        """
+        Add or replace a certificate and add its owners.
+        """
+        if self.enabled:
+            self._update(self._add_certificate, cert, owners)
+
+    def _add_certificate(self, conn, cert, owners):
+        now = time.time()
+        conn.execute('INSERT OR REPLACE INTO cert VALUES '
+                     '(?, ?, ?, ?, ?, ?, ?, ?)', _cert_row(cert, now))
+        conn.executemany('INSERT OR REPLACE INTO owner VALUES '
+                         '(?, ?, ?, ?, ?)',
+                         [_owner_row(owner, now) for owner in owners])
+
+    def set_status(self, issuer, serial_number, status):
+        """
+        Set the status of a certificate, e.g. after it was revoked.
+        """
+        if self.enabled:
+            self._update(self._set_status, issuer, serial_number, status)
+
+    def _set_status(self, conn, issuer, serial_number, status):
+        conn.execute(
+            'UPDATE cert SET status = ?, updated = ? '
+            'WHERE issuer = ? AND serial = ?',
+            (status, time.time(), str(DN(issuer)),
+             _serial_key(serial_number)))
+
+    def is_current(self):
+        """
+        Return True if the index was reconciled in the last
+        ``cert_index_sync_interval`` seconds.
+        """
+        try:
+            with self._connect() as conn:
+                last_sync = self._get_meta(conn, 'last_sync')
+        except sqlite3.Error as e:
+            logger.warning('Cannot read certificate index %s: %s',
+                           self.api.env.cert_index_db, e)
+            return False
+        interval = self.api.env.cert_index_sync_interval
+        return last_sync is not None and time.time() - last_sync < interval
+
+    def reconcile(self, certs, owners):
+        """
+        Replace the index with ``certs`` and ``owners``, iterables of all
+        certificates in Dogtag and all owners in LDAP.
+
+        Return False without consuming them if another process is
+        reconciling the index or if the index cannot be updated. Changes
+        made while the iterables are consumed are kept.
+        """
+        interval = self.api.env.cert_index_sync_interval
+        try:
+            with self._connect(timeout=0) as conn:
+                with self._transaction(conn):
+                    started = self._get_meta(conn, 'sync_started')
+                    now = time.time()
+                    if started is not None and now - started < interval:
+                        return False
+                    self._set_meta(conn, 'sync_started', now)
+        except sqlite3.Error as e:
+            # most likely locked by another process
+            logger.debug('Cannot start reconciling certificate index: %s', e)
+            return False
+
+        try:
+            cert_rows = [_cert_row(cert, now) for cert in certs]
+            owner_rows = [_owner_row(owner, now) for owner in owners]
+            with self._connect() as conn:
+                with self._transaction(conn):
+                    conn.execute('DELETE FROM cert WHERE updated < ?', (now,))
+                    conn.execute('DELETE FROM owner WHERE updated < ?',
+                                 (now,))
+                    conn.executemany('INSERT OR IGNORE INTO cert VALUES '
+                                     '(?, ?, ?, ?, ?, ?, ?, ?)', cert_rows)
+                    conn.executemany('INSERT OR IGNORE INTO owner VALUES '
+                                     '(?, ?, ?, ?, ?)', owner_rows)
+                    self._set_meta(conn, 'last_sync', now)
+        except sqlite3.Error as e:
+            logger.warning('Cannot update certificate index %s: %s',
+                           self.api.env.cert_index_db, e)
+            return False
+        finally:
+            self._update(self._clear_meta, 'sync_started')
+        logger.debug('Reconciled certificate index: %d certificates, '
+                     '%d owners', len(cert_rows), len(owner_rows))
+        return True
+
+    def find(self, issuer=None, subject=None, exactly=False,
+             min_serial_number=None, max_serial_number=None,
+             not_before_from=None, not_before_to=None,
+             not_after_from=None, not_after_to=None):
+        """
+        Search for certificates.
+
+        ``subject`` matches the common name of the subject, exactly or as a
+        substring. The validity bounds are inclusive, in milliseconds since
+        the epoch.
+
+        Return a list of ``(issuer, serial_number, subject, not_before,
+        not_after, status, owner_dns)`` tuples, ordered by serial number,
+        where ``owner_dns`` are the DNs of the entries which contain the
+        certificate.
+        """
+        where = []
+        args = []
+        if issuer is not None:
+            where.append('c.issuer = ?')
+            args.append(str(DN(issuer)))
+        if subject is not None:
+            if exactly:
+                where.append('c.cn = ?')
+                args.append(subject.lower())
+            else:
+                where.append("c.cn LIKE ? ESCAPE '\\'")
+                args.append('%{}%'.format(
+                    subject.lower().replace('\\', '\\\\')
+                    .replace('%', '\\%').replace('_', '\\_')))
+        for column, op, value in (
+                ('serial', '>=', min_serial_number),
+                ('serial', '<=', max_serial_number)):
+            if value is not None:
+                where.append('c.{} {} ?'.format(column, op))
+                args.append(_serial_key(value))
+        for column, op, value in (
+                ('not_before', '>=', not_before_from),
+                ('not_before', '<=', not_before_to),
+                ('not_after', '>=', not_after_from),
+                ('not_after', '<=', not_after_to)):
+            if value is not None:
+                where.append('c.{} {} ?'.format(column, op))
+                args.append(int(value))
+        where = ' AND '.join(where) or '1'
+
+        try:
+            with self._connect() as conn:
+                return self._find(conn, where, args)
+        except sqlite3.Error as e:
+            raise errors.DatabaseError(
+                desc=self.api.env.cert_index_db, info=str(e))
+
+    def _find(self, conn, where, args):
+        owner_dns = {}
+        for cert_issuer, serial, dn in conn.execute(
+                'SELECT o.issuer, o.serial, o.dn FROM owner o '
+                'JOIN cert c ON c.issuer = o.issuer AND '
+                'c.serial = o.serial WHERE ' + where, args):
+            owner_dns.setdefault((cert_issuer, serial), []).append(DN(dn))
+        rows = conn.execute(
+            'SELECT issuer, serial, subject, not_before, not_after, '
+            'status FROM cert c WHERE ' + where +
+            ' ORDER BY serial, issuer', args).fetchall()
+
+        return [
+            (DN(cert_issuer), int(serial), DN(cert_subject), not_before,
+             not_after, status, owner_dns.get((cert_issuer, serial), []))
+            for (cert_issuer, serial, cert_subject, not_before, not_after,
+                 status) in rows
+        ]
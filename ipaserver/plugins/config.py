@@ -560,6 +560,7 @@ class config_mod(LDAPUpdate):
 @register()
 class config_show(LDAPRetrieve):
     __doc__ = _('Show the current configuration.')
+    cache_result = True
 
     def post_callback(self, ldap, dn, entry_attrs, *keys, **options):
         self.obj.show_servroles_attributes(
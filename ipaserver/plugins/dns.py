@@ -4249,6 +4249,7 @@ class dnsconfig_mod(LDAPUpdate):
 @register()
 class dnsconfig_show(LDAPRetrieve):
     __doc__ = _('Show the current global DNS configuration.')
+    cache_result = True
 
     def execute(self, *keys, **options):
         result = super(dnsconfig_show, self).execute(*keys, **options)
@@ -240,14 +240,17 @@ digits and nothing else follows.
 '''
 
 import datetime
+import io
 import json
 import logging
 
 from lxml import etree
+import threading
 import time
 import contextlib
 
 import six
+from six.moves import queue
 
 from ipalib import Backend, api
 from ipapython.dn import DN
@@ -1287,6 +1290,22 @@ class RestClient(Backend):
         # Refresh the ca_host property
         object.__setattr__(self, '_ca_host', None)
 
+        if self.env.dogtag_pool_size > 0:
+            # reuse the session of a previous client
+            cookie = dogtag.connection_pool.get_session(self._session_key)
+            if cookie is not None:
+                object.__setattr__(self, 'cookie', cookie)
+                return self
+
+        self._login()
+        return self
+
+    @property
+    def _session_key(self):
+        return (self.ca_host, self.override_port or self.env.ca_agent_port,
+                self.client_certfile)
+
+    def _login(self):
         status, resp_headers, _resp_body = dogtag.https_request(
             self.ca_host, self.override_port or self.env.ca_agent_port,
             url='/ca/rest/account/login',
@@ -1299,10 +1318,16 @@ class RestClient(Backend):
         if status != 200 or len(cookies) == 0:
             raise errors.RemoteRetrieveError(reason=_('Failed to authenticate to CA REST API'))
         object.__setattr__(self, 'cookie', str(cookies[0]))
-        return self
+        if self.env.dogtag_pool_size > 0:
+            dogtag.connection_pool.set_session(self._session_key, self.cookie)
 
     def __exit__(self, exc_type, exc_value, traceback):
         """Log out of the REST API"""
+        if self.env.dogtag_pool_size > 0:
+            # keep the session for the next client
+            object.__setattr__(self, 'cookie', None)
+            return
+
         dogtag.https_request(
             self.ca_host, self.override_port or self.env.ca_agent_port,
             url='/ca/rest/account/logout',
@@ -1353,8 +1378,22 @@ class RestClient(Backend):
             cafile=self.ca_cert,
             client_certfile=self.client_certfile,
             client_keyfile=self.client_keyfile,
-            method=method, headers=headers, body=body
+            method=method, headers=dict(headers), body=body
         )
+        if (status == 401 and use_session and
+                self.env.dogtag_pool_size > 0):
+            # the pooled session expired, log in again
+            dogtag.connection_pool.drop_session(self._session_key)
+            self._login()
+            headers['Cookie'] = self.cookie
+            status, resp_headers, resp_body = dogtag.https_request(
+                self.ca_host, self.override_port or self.env.ca_agent_port,
+                url=resource,
+                cafile=self.ca_cert,
+                client_certfile=self.client_certfile,
+                client_keyfile=self.client_keyfile,
+                method=method, headers=dict(headers), body=body
+            )
         if status < 200 or status >= 300:
             explanation = self._parse_dogtag_error(resp_body) or ''
             raise errors.HTTPRequestError(
@@ -1558,7 +1597,83 @@ class ra(rabase.rabase, RestClient):
 
         """
         logger.debug('%s.get_certificate()', type(self).__name__)
+        return self._get_certificate(serial_number, self._sslget)
+
+    def get_certificates(self, serial_numbers):
+        """
+        Retrieve existing certificates.
 
+        :param serial_numbers: Certificate serial numbers, see
+                               `get_certificate`.
+
+        Return a list of the results of `get_certificate`, in the order of
+        ``serial_numbers``. The certificates are retrieved concurrently by up
+        to ``ra_parallel_workers`` threads, over connections of the Dogtag
+        connection pool or, if it is disabled, each over its own keep-alive
+        connection to the CA. If retrieving any of the certificates fails,
+        the error of the first failed one is raised.
+        """
+        logger.debug('%s.get_certificates()', type(self).__name__)
+
+        serial_numbers = list(serial_numbers)
+        workers = min(self.env.ra_parallel_workers, len(serial_numbers))
+        if workers < 2:
+            return [self.get_certificate(serial_number)
+                    for serial_number in serial_numbers]
+
+        # ca_host may search LDAP, which must not be done from the workers
+        ca_host = self.ca_host
+        tasks = queue.Queue()
+        for i, serial_number in enumerate(serial_numbers):
+            tasks.put((i, serial_number))
+        results = [None] * len(serial_numbers)
+        failures = []
+
+        def worker():
+            conn = dogtag.KeepAliveHTTPSConnection(
+                ca_host, self.env.ca_agent_port,
+                cafile=self.ca_cert,
+                client_certfile=self.client_certfile,
+                client_keyfile=self.client_keyfile)
+
+            def sslget(url, port, **kw):
+                # displayBySerial does not change anything, it can be retried
+                if self.env.dogtag_pool_size <= 0:
+                    return conn.request(url, retry=True, **kw)
+                with dogtag.https_connection(
+                        ca_host, port, self.ca_cert, self.client_certfile,
+                        self.client_keyfile) as pooled_conn:
+                    return pooled_conn.request(url, retry=True, **kw)
+
+            try:
+                while not failures:
+                    try:
+                        i, serial_number = tasks.get_nowait()
+                    except queue.Empty:
+                        break
+                    try:
+                        results[i] = self._get_certificate(
+                            serial_number, sslget)
+                    except Exception as e:
+                        failures.append((i, e))
+            finally:
+                conn.close()
+
+        threads = [
+            threading.Thread(target=worker, name='ra-%d' % i)
+            for i in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if failures:
+            _i, error = min(failures, key=lambda failure: failure[0])
+            raise error
+        return results
+
+    def _get_certificate(self, serial_number, sslget):
         # Convert serial number to integral type from string to properly handle
         # radix issues. Note: the int object constructor will properly handle large
         # magnitude integral values by returning a Python long type when necessary.
@@ -1566,10 +1681,10 @@ class ra(rabase.rabase, RestClient):
 
         # Call CMS
         http_status, _http_headers, http_body = (
-            self._sslget('/ca/agent/ca/displayBySerial',
-                         self.env.ca_agent_port,
-                         serialNumber=str(serial_number),
-                         xml='true')
+            sslget('/ca/agent/ca/displayBySerial',
+                   self.env.ca_agent_port,
+                   serialNumber=str(serial_number),
+                   xml='true')
         )
 
 
@@ -1819,6 +1934,9 @@ class ra(rabase.rabase, RestClient):
         Search for certificates
 
         :param options: dictionary of search options
+
+        Return an iterator of the results. They are requested from Dogtag
+        and parsed page by page, while the iterator is consumed.
         """
 
         def convert_time(value):
@@ -1907,67 +2025,53 @@ class ra(rabase.rabase, RestClient):
                                  xml_declaration=True, encoding='UTF-8')
         logger.debug('%s.find(): request: %s', type(self).__name__, payload)
 
-        # pylint: disable=unused-variable
-        status, _, data = dogtag.https_request(
-            self.ca_host, 443,
-            url='/ca/rest/certs/search?size=%d' % (
-                 options.get('sizelimit', 0x7fffffff)),
-            client_certfile=None,
-            client_keyfile=None,
-            cafile=self.ca_cert,
-            method='POST',
-            headers={'Accept-Encoding': 'gzip, deflate',
-                     'User-Agent': 'IPA',
-                     'Content-Type': 'application/xml'},
-            body=payload
-        )
-
-        if status != 200:
-            self.raise_certificate_operation_error('find',
-                                                   detail=status)
+        return self._find_pages(payload, options.get('sizelimit', 0x7fffffff))
 
-        logger.debug('%s.find(): response: %s', type(self).__name__, data)
-        parser = etree.XMLParser()
-        try:
-            doc = etree.fromstring(data, parser)
-        except etree.XMLSyntaxError as e:
-            self.raise_certificate_operation_error('find',
-                                                   detail=e.msg)
-
-        # Grab all the certificates
-        certs = doc.xpath('//CertDataInfo')
-
-        results = []
-
-        for cert in certs:
-            response_request = {}
-            response_request['serial_number'] = int(cert.get('id'), 16) # parse as hex
-            response_request['serial_number_hex'] = u'0x%X' % response_request['serial_number']
-
-            dn = cert.xpath('SubjectDN')
-            if len(dn) == 1:
-                response_request['subject'] = unicode(dn[0].text)
-
-            issuer_dn = cert.xpath('IssuerDN')
-            if len(issuer_dn) == 1:
-                response_request['issuer'] = unicode(issuer_dn[0].text)
-
-            not_valid_before = cert.xpath('NotValidBefore')
-            if len(not_valid_before) == 1:
-                response_request['valid_not_before'] = (
-                    unicode(not_valid_before[0].text))
+    def _find_pages(self, payload, sizelimit):
+        """
+        Yield the results of the search request ``payload``, requesting
+        them from Dogtag in pages of ``ra_search_page_size`` results.
+        """
+        page_size = self.env.ra_search_page_size
+        start = 0
+        while start < sizelimit:
+            size = sizelimit - start
+            if page_size > 0:
+                size = min(size, page_size)
+
+            status, _, data = dogtag.https_request(
+                self.ca_host, 443,
+                url='/ca/rest/certs/search?start=%d&size=%d' % (start, size),
+                client_certfile=None,
+                client_keyfile=None,
+                cafile=self.ca_cert,
+                method='POST',
+                headers={'Accept-Encoding': 'gzip, deflate',
+                         'User-Agent': 'IPA',
+                         'Content-Type': 'application/xml'},
+                body=payload
+            )
 
-            not_valid_after = cert.xpath('NotValidAfter')
-            if len(not_valid_after) == 1:
-                response_request['valid_not_after'] = (
-                    unicode(not_valid_after[0].text))
+            if status != 200:
+                self.raise_certificate_operation_error('find',
+                                                       detail=status)
 
-            status = cert.xpath('Status')
-            if len(status) == 1:
-                response_request['status'] = unicode(status[0].text)
-            results.append(response_request)
+            summary = {}
+            count = 0
+            try:
+                for response_request in dogtag.parse_cert_search_xml(
+                        io.BytesIO(data), summary):
+                    count += 1
+                    yield response_request
+            except errors.RemoteRetrieveError as e:
+                self.raise_certificate_operation_error('find',
+                                                       detail=e.reason)
 
-        return results
+            start += count
+            # Dogtag may return less than the requested page size, the
+            # search is complete only when it returned everything
+            if not count or start >= summary.get('total', sizelimit):
+                break
 
 
 # ----------------------------------------------------------------------------
@@ -2023,22 +2127,36 @@ class kra(Backend):
 
         # TODO: obtain KRA host & port from IPA service list or point to KRA load balancer
         # https://fedorahosted.org/freeipa/ticket/4557
-        connection = PKIConnection(
-            'https',
-            self.kra_host,
-            str(self.kra_port),
-            'kra')
+        kra_host = self.kra_host
+        try:
+            with dogtag.connection_pool.connection(
+                    (kra_host, self.kra_port, 'kra'),
+                    lambda: KRAConnection(kra_host, self.kra_port)) as conn:
+                yield KRAClient(conn.connection, crypto)
+        finally:
+            tempdb.close()
 
-        connection.session.cert = (paths.RA_AGENT_PEM, paths.RA_AGENT_KEY)
+
+class KRAConnection(object):
+    """
+    PKI connection to a KRA, kept in `ipapython.dogtag.connection_pool`.
+    """
+    def __init__(self, host, port):
+        self.connection = PKIConnection('https', host, str(port), 'kra')
+
+        self.connection.session.cert = (paths.RA_AGENT_PEM,
+                                        paths.RA_AGENT_KEY)
         # uncomment the following when this commit makes it to release
         # https://git.fedorahosted.org/cgit/pki.git/commit/?id=71ae20c
         # connection.set_authentication_cert(paths.RA_AGENT_PEM,
         #                                    paths.RA_AGENT_KEY)
 
-        try:
-            yield KRAClient(connection, crypto)
-        finally:
-            tempdb.close()
+    def is_alive(self):
+        # the HTTP session reopens connections closed by the server itself
+        return True
+
+    def close(self):
+        self.connection.session.close()
 
 
 @register()
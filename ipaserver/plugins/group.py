@@ -30,6 +30,7 @@ from .baseldap import (
     remove_external_post_callback,
     LDAPObject,
     LDAPCreate,
+    LDAPBulkCreate,
     LDAPUpdate,
     LDAPDelete,
     LDAPSearch,
@@ -336,6 +337,15 @@ class group_add(LDAPCreate):
         return dn
 
 
+@register()
+class group_add_bulk(LDAPBulkCreate):
+    __doc__ = _('Add new user groups.')
+
+    msg_summary = ngettext(
+        'Added %(count)d group', 'Added %(count)d groups', 0
+    )
+
+
 @register()
 class group_del(LDAPDelete):
     __doc__ = _('Delete group.')
@@ -31,7 +31,7 @@ from ipalib import messages
 from ipalib import Str, Flag
 from ipalib.parameters import Principal, Certificate
 from ipalib.plugable import Registry
-from .baseldap import (LDAPQuery, LDAPObject, LDAPCreate,
+from .baseldap import (LDAPQuery, LDAPObject, LDAPCreate, LDAPBulkCreate,
                                      LDAPDelete, LDAPUpdate, LDAPSearch,
                                      LDAPRetrieve, LDAPAddMember,
                                      LDAPRemoveMember, host_is_master,
@@ -748,6 +748,15 @@ class host_add(LDAPCreate):
         return dn
 
 
+@register()
+class host_add_bulk(LDAPBulkCreate):
+    __doc__ = _('Add new hosts.')
+
+    msg_summary = ngettext(
+        'Added %(count)d host', 'Added %(count)d hosts', 0
+    )
+
+
 @register()
 class host_del(LDAPDelete):
     __doc__ = _('Delete a host.')
@@ -38,6 +38,7 @@ class json_metadata(Command):
     Export plugin meta-data for the webUI.
     """
     NO_CLI = True
+    read_only = True
 
 
     takes_args = (
@@ -150,6 +151,7 @@ class json_metadata(Command):
 @register()
 class i18n_messages(Command):
     NO_CLI = True
+    read_only = True
 
     messages = {
         "ajax": {
@@ -29,11 +29,14 @@ Backend plugin for LDAP.
 
 import logging
 import os
+import threading
 
 import ldap as _ldap
+import six
 
 from ipalib import krb_utils
 from ipaplatform.paths import paths
+from ipapython.connpool import ConnectionPool
 from ipapython.dn import DN
 from ipapython.ipaldap import (LDAPClient, AUTOBIND_AUTO, AUTOBIND_ENABLED,
                                AUTOBIND_DISABLED)
@@ -42,6 +45,7 @@ from ldap.controls.simple import GetEffectiveRightsControl
 
 from ipalib import Registry, errors, _
 from ipalib.crud import CrudBackend
+from ipalib.plugable import Plugin
 from ipalib.request import context
 
 logger = logging.getLogger(__name__)
@@ -50,6 +54,39 @@ register = Registry()
 
 _missing = object()
 
+# KRB5CCNAME is shared by the threads of a process, GSSAPI binds are
+# serialized so that every bind uses the ccache it was made for
+_gssapi_bind_lock = threading.RLock()
+
+
+class LDAPConnectionPool(ConnectionPool):
+    """
+    Per-process pool of bound LDAP connections.
+
+    Connections are keyed by ``(ccache name, principal)``, so a connection
+    keeps the identity it was bound with. Every connection is checked with a
+    Who Am I? extended operation before it is reused.
+
+    The directory server does not end a GSSAPI session when the ticket it
+    was bound with expires. A pooled connection is only reused for a ccache
+    with a valid ticket, so it outlives the ticket by at most
+    ``ldap_pool_idle_timeout`` seconds, idle in the pool.
+    """
+
+    def _check(self, conn):
+        try:
+            conn.whoami_s()
+        except _ldap.LDAPError as e:
+            logger.debug('LDAP connection pool health check failed: %s', e)
+            return False
+        return True
+
+    def _close(self, conn):
+        try:
+            conn.unbind_s()
+        except _ldap.LDAPError:
+            pass
+
 
 @register()
 class ldap2(CrudBackend, LDAPClient):
@@ -67,6 +104,18 @@ class ldap2(CrudBackend, LDAPClient):
         self._time_limit = float(LDAPClient.time_limit)
         self._size_limit = int(LDAPClient.size_limit)
 
+    connection_pool = Plugin.finalize_attr('connection_pool')
+
+    def _on_finalize(self):
+        super(ldap2, self)._on_finalize()
+        pool = None
+        if self.api.env.in_server and self.api.env.ldap_pool_size > 0:
+            pool = LDAPConnectionPool(
+                maxsize=self.api.env.ldap_pool_size,
+                idle_timeout=self.api.env.ldap_pool_idle_timeout)
+        self.connection_pool = pool
+        self.slow_query_threshold = self.api.env.ldap_slow_query_threshold
+
     @property
     def ldap_uri(self):
         return self.api.env.ldap_uri
@@ -153,6 +202,31 @@ class ldap2(CrudBackend, LDAPClient):
         if size_limit is not _missing:
             object.__setattr__(self, 'size_limit', size_limit)
 
+        ldapi = self.ldap_uri.startswith('ldapi://')
+        gssapi = not bind_pw and not (
+            autobind != AUTOBIND_DISABLED and os.getegid() == 0 and ldapi)
+
+        # Only GSSAPI binds done on behalf of a ccache are pooled, the key
+        # ties a pooled connection to the identity it was bound with. A bound
+        # connection stays authenticated after the ticket it was bound with
+        # expired, so it is only handed to a caller whose ccache still holds
+        # a valid ticket.
+        pool = self.connection_pool
+        pool_key = None
+        if (pool is not None and gssapi and ccache is not None and
+                serverctrls is None and clientctrls is None):
+            creds = krb_utils.get_credentials_if_valid(ccache_name=ccache)
+            if creds is not None:
+                principal = six.text_type(creds.name)
+                pool_key = (ccache, principal)
+                conn = pool.get(pool_key)
+                if conn is not None:
+                    logger.debug('LDAP connection pool hit for %s', principal)
+                    with _gssapi_bind_lock:
+                        os.environ['KRB5CCNAME'] = ccache
+                    setattr(context, 'principal', principal)
+                    return conn
+
         client = LDAPClient(self.ldap_uri,
                             force_schema_updates=self._force_schema_updates,
                             cacert=cacert)
@@ -169,8 +243,6 @@ class ldap2(CrudBackend, LDAPClient):
                 if maxssf < minssf:
                     conn.set_option(_ldap.OPT_X_SASL_SSF_MAX, minssf)
 
-        ldapi = self.ldap_uri.startswith('ldapi://')
-
         if bind_pw:
             client.simple_bind(bind_dn, bind_pw,
                                server_controls=serverctrls,
@@ -188,23 +260,46 @@ class ldap2(CrudBackend, LDAPClient):
             if ldapi:
                 with client.error_handler():
                     conn.set_option(_ldap.OPT_HOST_NAME, self.api.env.host)
-            if ccache is None:
-                os.environ.pop('KRB5CCNAME', None)
-            else:
-                os.environ['KRB5CCNAME'] = ccache
+            with _gssapi_bind_lock:
+                if ccache is None:
+                    os.environ.pop('KRB5CCNAME', None)
+                else:
+                    os.environ['KRB5CCNAME'] = ccache
 
-            principal = krb_utils.get_principal(ccache_name=ccache)
+                principal = krb_utils.get_principal(ccache_name=ccache)
 
-            client.gssapi_bind(server_controls=serverctrls,
-                               client_controls=clientctrls)
+                client.gssapi_bind(server_controls=serverctrls,
+                                   client_controls=clientctrls)
             setattr(context, 'principal', principal)
 
+            if pool_key is not None:
+                pool.add(pool_key, conn)
+
         return conn
 
+    def connect_as_server(self, **kw):
+        """
+        Connect with the credentials of the IPA server instead of those of
+        the caller.
+
+        The connection is bound with the default credentials of the process,
+        the HTTP service keytab provided by gssproxy. KRB5CCNAME is left as
+        it is, so that other threads keep binding with their own ccache.
+        """
+        with _gssapi_bind_lock:
+            ccache = os.environ.get('KRB5CCNAME')
+            try:
+                self.connect(ccache=None, **kw)
+            finally:
+                if ccache is not None:
+                    os.environ['KRB5CCNAME'] = ccache
+
     def destroy_connection(self):
         """Disconnect from LDAP server."""
         try:
-            if self.conn is not None:
+            pool = self.connection_pool
+            if self.conn is not None and (
+                    pool is None or not pool.release(self.conn)):
                 self.unbind()
         except errors.PublicError:
             # ignore when trying to unbind multiple times
@@ -249,16 +344,28 @@ class ldap2(CrudBackend, LDAPClient):
 
         If the UPG Definition or its originfilter is not readable,
         an ACI error is raised.
+
+        The result is cached in the request context.
         """
 
+        try:
+            conn, upg = getattr(context, 'upg_enabled')
+            if conn is self.conn:
+                return upg
+        except AttributeError:
+            # Not in our context yet
+            pass
+
         upg_dn = DN(('cn', 'UPG Definition'), ('cn', 'Definitions'), ('cn', 'Managed Entries'),
                     ('cn', 'etc'), self.api.env.basedn)
 
         try:
-            with self.error_handler():
+            with self._trace('search', upg_dn) as op, self.error_handler():
+                op.scope = _ldap.SCOPE_BASE
                 upg_entries = self.conn.search_s(str(upg_dn), _ldap.SCOPE_BASE,
                                                  attrlist=['*'])
                 upg_entries = self._convert_result(upg_entries)
+                op.count = len(upg_entries)
         except errors.NotFound:
             upg_entries = None
         if not upg_entries or 'originfilter' not in upg_entries[0]:
@@ -266,7 +373,9 @@ class ldap2(CrudBackend, LDAPClient):
                 'Could not read UPG Definition originfilter. '
                 'Check your permissions.'))
         org_filter = upg_entries[0].single_value['originfilter']
-        return '(objectclass=disable)' not in org_filter
+        upg = '(objectclass=disable)' not in org_filter
+        context.upg_enabled = (self.conn, upg)
+        return upg
 
     def get_effective_rights(self, dn, attrs_list):
         """Returns the rights the currently bound user has for the given DN.
@@ -409,7 +518,7 @@ class ldap2(CrudBackend, LDAPClient):
 
         # update group entry
         try:
-            with self.error_handler():
+            with self._trace('modify', group_dn), self.error_handler():
                 modlist = [(a, b, self.encode(c))
                            for a, b, c in modlist]
                 self.conn.modify_s(str(group_dn), modlist)
@@ -431,13 +540,156 @@ class ldap2(CrudBackend, LDAPClient):
 
         # update group entry
         try:
-            with self.error_handler():
+            with self._trace('modify', group_dn), self.error_handler():
                 modlist = [(a, b, self.encode(c))
                            for a, b, c in modlist]
                 self.conn.modify_s(str(group_dn), modlist)
         except errors.MidairCollision:
             raise errors.NotGroupMember()
 
+    def get_existing_dns(self, dns, chunk_size=100):
+        """
+        Return a dict which maps the DNs of existing entries in dns to the
+        DNs as stored on the server.
+
+        Instead of reading every entry, the entries with the same parent and
+        RDN attribute are looked up with one search filter for every
+        chunk_size entries.
+        """
+        existing = {}
+        searches = {}
+        for dn in dns:
+            assert isinstance(dn, DN)
+            if len(dn) > 1 and len(dn[0]) == 1:
+                key = (dn[0].attr.lower(), dn[1:])
+                searches.setdefault(key, []).append(dn[0].value)
+                continue
+            try:
+                existing[dn] = self.get_entry(dn, ['']).dn
+            except errors.NotFound:
+                pass
+
+        for (attr, base_dn), values in searches.items():
+            for i in range(0, len(values), chunk_size):
+                search_filter = self.make_filter_from_attr(
+                    attr, values[i:i + chunk_size])
+                try:
+                    entries = self.find_entries_iter(
+                        search_filter, [''], base_dn, self.SCOPE_ONELEVEL,
+                        size_limit=0)
+                    for entry in entries:
+                        existing[entry.dn] = entry.dn
+                except errors.NotFound:
+                    break
+
+        return existing
+
+    def add_entries_to_group(self, dns, group_dn, member_attr='member',
+                             allow_same=False):
+        """
+        Add entries designated by dns to group group_dn in the member
+        attribute member_attr.
+
+        The entries are looked up with get_existing_dns() and added with a
+        single modify of the group entry. If the modify fails, e.g. because
+        one of the entries is a member already, they are added one by one.
+        Returns a list of (dn, error) of the entries which could not be
+        added, error is the exception add_entry_to_group() raises for the
+        entry.
+        """
+        assert isinstance(group_dn, DN)
+
+        logger.debug(
+            "add_entries_to_group: %d dns group_dn=%s member_attr=%s",
+            len(dns), group_dn, member_attr)
+
+        existing = self.get_existing_dns(dns)
+
+        failed = []
+        add_dns = []
+        seen = set()
+        for dn in dns:
+            if dn not in existing:
+                failed.append((dn, errors.NotFound(reason='no such entry')))
+            elif existing[dn] == group_dn and not allow_same:
+                failed.append((dn, errors.SameGroupError()))
+            elif existing[dn] in seen:
+                failed.append((dn, errors.AlreadyGroupMember()))
+            else:
+                seen.add(existing[dn])
+                add_dns.append(dn)
+
+        if not add_dns:
+            return failed
+
+        modlist = [(_ldap.MOD_ADD, member_attr,
+                    [existing[dn] for dn in add_dns])]
+        try:
+            with self._trace('modify', group_dn), self.error_handler():
+                modlist = [(a, b, self.encode(c))
+                           for a, b, c in modlist]
+                self.conn.modify_s(str(group_dn), modlist)
+        except errors.DatabaseError:
+            # some of the entries are members already, add one by one
+            for dn in add_dns:
+                try:
+                    self.add_entry_to_group(
+                        dn, group_dn, member_attr, allow_same=allow_same)
+                except errors.PublicError as e:
+                    failed.append((dn, e))
+        except errors.PublicError as e:
+            failed.extend((dn, e) for dn in add_dns)
+
+        return failed
+
+    def remove_entries_from_group(self, dns, group_dn, member_attr='member'):
+        """
+        Remove entries designated by dns from group group_dn.
+
+        The entries are removed with a single modify of the group entry. If
+        the modify fails because some of the entries are not members, they
+        are removed one by one. Returns a list of (dn, error) of the entries
+        which could not be removed, error is the exception
+        remove_entry_from_group() raises for the entry.
+        """
+        assert isinstance(group_dn, DN)
+
+        logger.debug(
+            "remove_entries_from_group: %d dns group_dn=%s member_attr=%s",
+            len(dns), group_dn, member_attr)
+
+        failed = []
+        remove_dns = []
+        seen = set()
+        for dn in dns:
+            assert isinstance(dn, DN)
+            if dn in seen:
+                failed.append((dn, errors.NotGroupMember()))
+            else:
+                seen.add(dn)
+                remove_dns.append(dn)
+
+        if not remove_dns:
+            return failed
+
+        modlist = [(_ldap.MOD_DELETE, member_attr, remove_dns)]
+        try:
+            with self._trace('modify', group_dn), self.error_handler():
+                modlist = [(a, b, self.encode(c))
+                           for a, b, c in modlist]
+                self.conn.modify_s(str(group_dn), modlist)
+        except errors.MidairCollision:
+            # some of the entries are not members, remove one by one
+            for dn in remove_dns:
+                try:
+                    self.remove_entry_from_group(dn, group_dn, member_attr)
+                except errors.PublicError as e:
+                    failed.append((dn, e))
+        except errors.PublicError as e:
+            failed.extend((dn, e) for dn in remove_dns)
+
+        return failed
+
     def set_entry_active(self, dn, active):
         """Mark entry active/inactive."""
 
@@ -487,7 +739,7 @@ class ldap2(CrudBackend, LDAPClient):
         mod = [(_ldap.MOD_REPLACE, 'krbprincipalkey', None),
                (_ldap.MOD_REPLACE, 'krblastpwdchange', None)]
 
-        with self.error_handler():
+        with self._trace('modify', dn), self.error_handler():
             self.conn.modify_s(str(dn), mod)
 
     # CrudBackend methods
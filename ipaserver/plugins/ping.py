@@ -57,6 +57,7 @@ register = Registry()
 @register()
 class ping(Command):
     __doc__ = _('Ping a remote server.')
+    read_only = True
 
     has_output = (
         output.summary,
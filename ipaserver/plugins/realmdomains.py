@@ -336,3 +336,4 @@ class realmdomains_mod(LDAPUpdate):
 @register()
 class realmdomains_show(LDAPRetrieve):
     __doc__ = _('Display the list of realm domains.')
+    cache_result = True
@@ -4,7 +4,12 @@
 
 import importlib
 import itertools
+import json
+import logging
+import os
 import sys
+import tempfile
+import zlib
 
 import six
 import hashlib
@@ -16,7 +21,9 @@ from ipalib.frontend import Command, Local, Method, Object
 from ipalib.output import Entry, ListOfEntries, ListOfPrimaryKeys, PrimaryKey
 from ipalib.parameters import Bool, Dict, Flag, Str
 from ipalib.plugable import Registry
+from ipalib.rpc import json_encode_binary, json_decode_binary
 from ipalib.text import _
+from ipaplatform.paths import paths
 from ipapython.version import API_VERSION
 
 # Schema TTL sent to clients in response to schema call.
@@ -43,6 +50,8 @@ EXAMPLES:
 if six.PY3:
     unicode = str
 
+logger = logging.getLogger(__name__)
+
 register = Registry()
 
 
@@ -772,6 +781,7 @@ class output_find(BaseParamSearch):
 @register()
 class schema(Command):
     NO_CLI = True
+    read_only = True
 
     takes_options = (
         Str(
@@ -832,11 +842,103 @@ class schema(Command):
 
         return schema
 
+    def _get_plugins_fingerprint(self):
+        """
+        Returns fingerprint of the commands and objects of the API
+
+        A precomputed schema is used only by an API with the same plugins
+        defined by the same code. The code is identified by the size and
+        the modification time of the modules which define the plugin classes
+        and their base classes, so that changed params or docs are detected
+        without generating the schema.
+        """
+        plugins = list(itertools.chain(self.api.Command, self.api.Object))
+        module_names = set()
+        for plugin in plugins:
+            for cls in type(plugin).__mro__:
+                module_names.add(cls.__module__)
+
+        modules = []
+        for name in sorted(module_names):
+            filename = getattr(sys.modules.get(name), '__file__', None)
+            if filename is None:
+                continue
+            if filename.endswith(('.pyc', '.pyo')):
+                filename = filename[:-1]
+            try:
+                st = os.stat(filename)
+            except OSError:
+                continue
+            modules.append((name, st.st_size, int(st.st_mtime)))
+
+        return self._calculate_fingerprint([
+            API_VERSION,
+            sorted(plugin.full_name for plugin in plugins),
+            modules,
+        ])
+
+    def write_schema_file(self, filename=paths.IPA_API_SCHEMA):
+        """
+        Precompute the schema and store it in ``filename``
+
+        The file starts with a line of JSON header, which holds the schema
+        fingerprint, followed by the compressed JSON encoded schema.
+        """
+        schema = self._generate_schema(version=API_VERSION)
+        header = dict(
+            plugins=self._get_plugins_fingerprint(),
+            fingerprint=schema['fingerprint'],
+        )
+        data = json_encode_binary(schema, API_VERSION).encode('utf-8')
+
+        with tempfile.NamedTemporaryFile(
+                'wb', dir=os.path.dirname(filename), delete=False) as f:
+            try:
+                f.write(json.dumps(header).encode('utf-8'))
+                f.write(b'\n')
+                f.write(zlib.compress(data, 9))
+                os.fchmod(f.fileno(), 0o644)
+                f.close()
+            except Exception:
+                os.unlink(f.name)
+                raise
+            else:
+                os.rename(f.name, filename)
+
+    def _read_schema_file(self, known_fingerprints,
+                          filename=paths.IPA_API_SCHEMA):
+        """
+        Returns the schema stored by write_schema_file() or None
+
+        Only the header is read if the client already has the schema.
+        """
+        try:
+            with open(filename, 'rb') as f:
+                header = json.loads(f.readline().decode('utf-8'))
+                if header['plugins'] != self._get_plugins_fingerprint():
+                    logger.debug("Precomputed schema %s does not match the "
+                                 "API", filename)
+                    return None
+                if header['fingerprint'] in known_fingerprints:
+                    raise errors.SchemaUpToDate(
+                        fingerprint=header['fingerprint'],
+                        ttl=SCHEMA_TTL,
+                    )
+                data = zlib.decompress(f.read())
+            return json_decode_binary(data)
+        except (EnvironmentError, ValueError, KeyError, zlib.error) as e:
+            logger.debug("Failed to read precomputed schema %s: %s",
+                         filename, e)
+            return None
+
     def execute(self, *args, **kwargs):
         try:
             schema = self.api._schema
         except AttributeError:
-            schema = self._generate_schema(**kwargs)
+            schema = self._read_schema_file(
+                kwargs.get('known_fingerprints', []))
+            if schema is None:
+                schema = self._generate_schema(**kwargs)
             setattr(self.api, '_schema', schema)
 
         schema['ttl'] = SCHEMA_TTL
@@ -106,6 +106,7 @@ class server_role_show(Retrieve):
 @register()
 class server_role_find(Search):
     __doc__ = _('Find a server role on a server(s)')
+    cache_result = True
 
     obj_name = 'server_role'
     attr_name = 'find'
@@ -1754,6 +1754,8 @@ def add_new_domains_from_trust(myapi, trustinstance, trust_entry,
 class trust_fetch_domains(LDAPRetrieve):
     __doc__ = _('Refresh list of the domains associated with the trust')
 
+    # rewrites the trust domain entries
+    read_only = False
     has_output = output.standard_list_of_entries
     takes_options = LDAPRetrieve.takes_options + (
         Str('realm_server?',
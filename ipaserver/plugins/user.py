@@ -55,6 +55,7 @@ from .baseldap import (
     LDAPObject,
     pkey_to_value,
     LDAPCreate,
+    LDAPBulkCreate,
     LDAPSearch,
     LDAPQuery,
     LDAPMultiQuery)
@@ -625,6 +626,25 @@ class user_add(baseuser_add):
         return dn
 
 
+@register()
+class user_add_bulk(LDAPBulkCreate):
+    __doc__ = _('Add new users.')
+
+    msg_summary = ngettext(
+        'Added %(count)d user', 'Added %(count)d users', 0
+    )
+
+    def _create_entry(self, ldap, create, keys, options, reread):
+        # user_add.post_callback reports the random password kept in the
+        # request context, it must not be the one of a previous entry
+        try:
+            delattr(context, 'randompassword')
+        except AttributeError:
+            pass
+        return super(user_add_bulk, self)._create_entry(
+            ldap, create, keys, options, reread)
+
+
 @register()
 class user_del(baseuser_del):
     __doc__ = _('Delete a user.')
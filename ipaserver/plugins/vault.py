@@ -903,11 +903,11 @@ class vault_find(LDAPSearch):
 
     def exc_callback(self, args, options, exc, call_func, *call_args,
                      **call_kwargs):
-        if call_func.__name__ == 'find_entries':
-            if isinstance(exc, errors.NotFound):
-                # ignore missing containers since they will be created
-                # automatically on vault creation.
-                raise errors.EmptyResult(reason=str(exc))
+        # the search is the only call of vault_find
+        if isinstance(exc, errors.NotFound):
+            # ignore missing containers since they will be created
+            # automatically on vault creation.
+            raise errors.EmptyResult(reason=str(exc))
 
         raise exc
 
@@ -77,6 +77,7 @@ class whoami(Command):
     __doc__ = _('Describe currently authenticated identity.')
 
     NO_CLI = True
+    read_only = True
 
     output_params = (
         Str('object', label=_('Object class name')),
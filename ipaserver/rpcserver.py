@@ -23,6 +23,7 @@ RPC server.
 Also see the `ipalib.rpc` module.
 """
 
+import itertools
 import logging
 from xml.sax.saxutils import escape
 import os
@@ -40,7 +41,7 @@ from six.moves.urllib.parse import parse_qs
 from six.moves.xmlrpc_client import Fault
 # pylint: enable=import-error
 
-from ipalib import plugable, errors
+from ipalib import plugable, errors, timing
 from ipalib.capabilities import VERSION_WITHOUT_CAPABILITIES
 from ipalib.frontend import Local
 from ipalib.install.kinit import kinit_armor, kinit_password
@@ -50,7 +51,7 @@ from ipalib.errors import (PublicError, InternalError, JSONError,
     ExecutionError, PasswordExpired, KrbPrincipalExpired, UserLocked)
 from ipalib.request import context, destroy_context
 from ipalib.rpc import (xml_dumps, xml_loads,
-    json_encode_binary, json_decode_binary)
+    json_encode_binary, json_encode_binary_iter, json_decode_binary)
 from ipapython.dn import DN
 from ipaserver.plugins.ldap2 import ldap2
 from ipalib.backend import Backend
@@ -236,6 +237,40 @@ def extract_query(environ):
     return query
 
 
+class _ContextResponse(object):
+    """
+    WSGI response iterable which destroys the request context when closed.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        try:
+            close = getattr(self.chunks, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            destroy_context()
+
+
+def close_context_after(response):
+    """
+    Destroy the request context once ``response`` is sent.
+
+    A chunked response is encoded while the WSGI server sends it, so the
+    context, e.g. its connections and languages, is destroyed only when the
+    server closes the response.
+    """
+    if isinstance(response, (bytes, list, tuple)):
+        destroy_context()
+        return response
+    return _ContextResponse(response)
+
+
 class wsgi_dispatch(Executioner, HTTP_Status):
     """
     WSGI routing middleware and entry point into IPA server.
@@ -262,9 +297,11 @@ class wsgi_dispatch(Executioner, HTTP_Status):
     def __call__(self, environ, start_response):
         logger.debug('WSGI wsgi_dispatch.__call__:')
         try:
-            return self.route(environ, start_response)
-        finally:
+            response = self.route(environ, start_response)
+        except BaseException:
             destroy_context()
+            raise
+        return close_context_after(response)
 
     def _on_finalize(self):
         self.url = self.env['mount_ipa']
@@ -339,6 +376,7 @@ class WSGIExecutioner(Executioner):
         args = ()
         options = {}
         command = None
+        timer = None
 
         e = None
         if not 'HTTP_REFERER' in environ:
@@ -367,6 +405,8 @@ class WSGIExecutioner(Executioner):
                 result = self._system_commands[name](self, *args, **options)
             else:
                 command = self._get_command(name)
+                # the timer is finished once the response is marshalled
+                timer = timing.start(command.name, self.api.env)
                 result = command(*args, **options)
         except PublicError as e:
             if self.api.env.debug:
@@ -411,7 +451,16 @@ class WSGIExecutioner(Executioner):
                         type(error).__name__)
 
         version = options.get('version', VERSION_WITHOUT_CAPABILITIES)
-        return self.marshal(result, error, _id, version)
+        if timer is None:
+            return self.marshal(result, error, _id, version)
+        with timing.phase('marshal'):
+            response = self.marshal(result, error, _id, version)
+        if isinstance(response, bytes):
+            timing.finish(timer, self.api.env)
+            return response
+        # chunked response, the time spent encoding each chunk is recorded
+        timing.detach(timer)
+        return timing.timed_iter(response, 'marshal', timer, self.api.env)
 
     def simple_unmarshal(self, environ):
         name = environ['PATH_INFO'].strip('/')
@@ -443,7 +492,20 @@ class WSGIExecutioner(Executioner):
             headers.append(('IPASESSION', logout_cookie))
 
         start_response(status, headers)
-        return [response]
+        if isinstance(response, bytes):
+            return [response]
+        # chunked response, see jsonserver.marshal
+        return self._iter_chunks(response)
+
+    def _iter_chunks(self, chunks):
+        try:
+            for chunk in chunks:
+                yield chunk
+        except Exception:
+            # the status is sent already, the client gets a truncated
+            # response it cannot parse
+            logger.exception('WSGI %s.__call__(): response truncated',
+                             self.name)
 
     def unmarshal(self, data):
         raise NotImplementedError('%s.unmarshal()' % type(self).__name__)
@@ -491,10 +553,19 @@ class jsonserver(WSGIExecutioner, HTTP_Status):
             principal=unicode(principal),
             version=unicode(VERSION),
         )
-        dump = json_encode_binary(
-            response, version, pretty_print=self.api.env.debug
-        )
-        return dump.encode('utf-8')
+        if self.api.env.debug:
+            dump = json_encode_binary(response, version, pretty_print=True)
+            return dump.encode('utf-8')
+        # Large results are written out while they are being encoded, the
+        # WSGI server sends them with chunked transfer encoding. The first
+        # chunks are encoded right away, so that a response which fits in
+        # them is returned whole and encoding errors still result in 500.
+        chunks = json_encode_binary_iter(response, version)
+        first = next(chunks, b'')
+        second = next(chunks, None)
+        if second is None:
+            return first
+        return itertools.chain((first, second), chunks)
 
     def unmarshal(self, data):
         try:
@@ -693,12 +764,12 @@ class KerberosWSGIExecutioner(WSGIExecutioner, KerberosSession):
                 environ, start_response)
         except PublicError as e:
             status = HTTP_STATUS_SUCCESS
-            response = status.encode('utf-8')
             start_response(status, self.headers)
-            return self.marshal(None, e)
-        finally:
+            response = self.marshal(None, e)
+        except BaseException:
             destroy_context()
-        return response
+            raise
+        return close_context_after(response)
 
 
 class xmlserver(KerberosWSGIExecutioner):
@@ -819,10 +890,11 @@ class jsonserver_session(jsonserver, KerberosSession):
 
         try:
             response = super(jsonserver_session, self).__call__(environ, start_response)
-        finally:
+        except BaseException:
             destroy_context()
+            raise
 
-        return response
+        return close_context_after(response)
 
 
 class jsonserver_kerb(jsonserver, KerberosWSGIExecutioner):
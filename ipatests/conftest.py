@@ -42,6 +42,7 @@ MARKERS = [
     'ds_acceptance: Acceptance test suite for 389 Directory Server',
     'skip_ipaclient_unittest: Skip in ipaclient unittest mode',
     'needs_ipaapi: Test needs IPA API',
+    'benchmark: Performance benchmark, only run with --run-benchmarks',
 ]
 
 
@@ -101,6 +102,11 @@ def pytest_addoption(parser):
         help='Do not run tests that depends on IPA API',
         action='store_true',
     )
+    group.addoption(
+        '--run-benchmarks',
+        help='Run performance benchmarks',
+        action='store_true',
+    )
 
 
 def pytest_cmdline_main(config):
@@ -134,3 +140,7 @@ def pytest_runtest_setup(item):
             # pylint: disable=no-member
             if pytest.config.option.skip_ipaapi:
                 pytest.skip("Skip tests that needs an IPA API")
+        if item.get_marker('benchmark'):
+            # pylint: disable=no-member
+            if not pytest.config.option.run_benchmarks:
+                pytest.skip("Skip benchmarks without --run-benchmarks")
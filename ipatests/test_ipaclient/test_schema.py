@@ -0,0 +1,243 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the schema cache of `ipaclient.remote_plugins.schema`.
+"""
+
+import zlib
+
+import pytest
+
+from ipaclient.remote_plugins.schema import Schema, _SchemaFile
+
+pytestmark = pytest.mark.tier0
+
+
+def make_schema(commands=10, params=5):
+    """
+    Return a schema as returned by the schema command
+    """
+    def param(name):
+        return {
+            u'name': name,
+            u'type': u'str',
+            u'cli_name': name,
+            u'doc': u'The {} of the entry'.format(name),
+            u'label': name.capitalize(),
+            u'required': False,
+        }
+
+    def output(name):
+        return {u'name': name, u'type': u'dict', u'doc': u'The result'}
+
+    result = dict(
+        fingerprint=u'fingerprint{}'.format(commands),
+        ttl=3600,
+        version=u'2.230',
+        commands=[],
+        classes=[],
+        topics=[],
+    )
+    result['commands'].append({
+        u'name': u'ping',
+        u'version': u'1',
+        u'full_name': u'ping/1',
+        u'doc': u'Ping a remote server.',
+        u'topic_topic': u'ping/1',
+        u'params': [param(u'version')],
+        u'output': [output(u'summary')],
+    })
+    result['topics'].append({
+        u'name': u'ping',
+        u'version': u'1',
+        u'full_name': u'ping/1',
+        u'doc': u'Ping the remote IPA server.',
+    })
+    for i in range(commands):
+        obj = u'object{}'.format(i // 10)
+        name = u'{}_command{}'.format(obj, i)
+        result['commands'].append({
+            u'name': name,
+            u'version': u'1',
+            u'full_name': u'{}/1'.format(name),
+            u'doc': u'Run command {}.\n\nLonger description.'.format(i),
+            u'topic_topic': u'{}/1'.format(obj),
+            u'obj_class': u'{}/1'.format(obj),
+            u'attr_name': u'command{}'.format(i),
+            u'params': [param(u'param{}'.format(j)) for j in range(params)],
+            u'output': [output(u'result'), output(u'summary')],
+        })
+        if i % 10 == 0:
+            for ns in ('classes', 'topics'):
+                result[ns].append({
+                    u'name': obj,
+                    u'version': u'1',
+                    u'full_name': u'{}/1'.format(obj),
+                    u'doc': u'Object {}'.format(i // 10),
+                })
+    return result
+
+
+class FakeClient(object):
+    def __init__(self, schema):
+        self.schema = schema
+        self.calls = 0
+
+    def isconnected(self):
+        return True
+
+    def forward(self, name, **kwargs):
+        assert name == u'schema'
+        self.calls += 1
+        return dict(result=dict(self.schema))
+
+
+@pytest.fixture
+def schema_dir(tmpdir, monkeypatch):
+    monkeypatch.setattr(Schema, '_DIR', str(tmpdir.join('schema')))
+    return tmpdir.join('schema')
+
+
+def test_schema_file(tmpdir):
+    members = {
+        u'commands/user_show/1': b'{"name": "user_show"}',
+        u'commands/user_add/1': b'{}',
+        u'classes/user/1': b'[]',
+        u'fingerprint': b'"abc"',
+    }
+    filename = tmpdir.join('schema')
+    with open(str(filename), 'wb') as f:
+        _SchemaFile.write(f, members)
+
+    schema_file = _SchemaFile(str(filename))
+    try:
+        for key, value in members.items():
+            assert schema_file.get(key) == value
+        with pytest.raises(KeyError):
+            schema_file.get(u'commands/user_del/1')
+        with pytest.raises(KeyError):
+            schema_file.get(u'commands')
+        assert list(schema_file.iter_prefix(u'commands/')) == [
+            u'user_add/1', u'user_show/1']
+        assert list(schema_file.iter_prefix(u'topics/')) == []
+    finally:
+        schema_file.close()
+
+
+def corrupt_schema_file(filename, corrupt, fix_checksum=True):
+    # pylint: disable=protected-access
+    header = _SchemaFile._HEADER
+    record = _SchemaFile._RECORD
+    data = bytearray(filename.read(mode='rb'))
+    data = corrupt(data, header, record)
+    if fix_checksum:
+        magic, count, _checksum = header.unpack_from(data)
+        checksum = zlib.crc32(bytes(data[header.size:])) & 0xffffffff
+        header.pack_into(data, 0, magic, count, checksum)
+    filename.write(bytes(data), mode='wb')
+
+
+def set_record(data, record, header, index, *values):
+    record.pack_into(data, header.size + index * record.size, *values)
+    return data
+
+
+def get_record(data, record, header, index):
+    return record.unpack_from(data, header.size + index * record.size)
+
+
+@pytest.mark.parametrize('corrupt, fix_checksum', [
+    # not a schema file
+    (lambda data, header, record: b'PK\x03\x04' + b'\x00' * 100, False),
+    (lambda data, header, record: b'', False),
+    (lambda data, header, record: data[:header.size - 1], False),
+    # corrupted or truncated contents
+    (lambda data, header, record: data[:-1], False),
+    (lambda data, header, record: data[:-1] + b'x', False),
+    # inconsistent contents
+    (lambda data, header, record: data[:header.size + record.size], True),
+    (lambda data, header, record: set_record(
+        data, record, header, 2, len(data) - 1, 2, 0, 0), True),
+    (lambda data, header, record: set_record(
+        data, record, header, 2, 0, 0, len(data) - 1, 2), True),
+    (lambda data, header, record: set_record(
+        data, record, header, 1, *get_record(data, record, header, 0)),
+     True),
+])
+def test_schema_file_invalid(tmpdir, corrupt, fix_checksum):
+    members = {
+        u'commands/user_show/1': b'{"name": "user_show"}',
+        u'commands/user_add/1': b'{}',
+        u'fingerprint': b'"abc"',
+    }
+    filename = tmpdir.join('invalid')
+    with open(str(filename), 'wb') as f:
+        _SchemaFile.write(f, members)
+    corrupt_schema_file(filename, corrupt, fix_checksum)
+    with pytest.raises(ValueError):
+        _SchemaFile(str(filename))
+
+
+def test_schema_cache(schema_dir):
+    client = FakeClient(make_schema())
+    fetched = Schema(client)
+    assert client.calls == 1
+    assert schema_dir.join(fetched.fingerprint).check()
+
+    cached = Schema(client, fetched.fingerprint)
+    assert client.calls == 1
+    # pylint: disable=protected-access
+    assert cached._file is not None
+    assert cached._dict['commands'] == {}
+
+    for ns in Schema.namespaces:
+        assert sorted(cached[ns]) == sorted(fetched[ns])
+    assert cached['commands'][u'ping/1'] == fetched['commands'][u'ping/1']
+    assert list(cached._dict['commands']) == [u'ping/1']
+    assert cached['commands'].get_help(u'object0_command1/1') == dict(
+        name=u'object0_command1',
+        summary=u'Run command 1.',
+        topic_topic=u'object0/1',
+    )
+    with pytest.raises(KeyError):
+        cached['commands'][u'missing/1']
+
+
+def test_schema_cache_old_format(schema_dir):
+    client = FakeClient(make_schema())
+    schema_dir.ensure(dir=True)
+    schema_dir.join(u'fingerprint10').write(b'PK\x03\x04', mode='wb')
+
+    schema = Schema(client, u'fingerprint10')
+    assert client.calls == 1
+    assert schema['commands'][u'ping/1']['name'] == u'ping'
+
+
+def test_schema_cache_broken_member(schema_dir):
+    client = FakeClient(make_schema())
+    fingerprint = Schema(client).fingerprint
+    assert client.calls == 1
+
+    # a member which cannot be decoded although the file is consistent
+    filename = schema_dir.join(fingerprint)
+    corrupt_schema_file(filename, lambda data, header, record: data.replace(
+        b'"Ping a remote server."', b'"Ping a remote server.\xff'))
+
+    cached = Schema(client, fingerprint)
+    assert client.calls == 1
+    assert cached['commands'][u'object0_command1/1']['name'] == (
+        u'object0_command1')
+    assert client.calls == 1
+
+    # the schema is fetched from the server and the cache is replaced
+    assert cached['commands'][u'ping/1']['doc'] == u'Ping a remote server.'
+    assert client.calls == 2
+    # pylint: disable=protected-access
+    assert cached._file is None
+    assert cached['commands'].get_help(u'ping/1')['name'] == u'ping'
+
+    cached = Schema(client, fingerprint)
+    assert cached['commands'][u'ping/1']['doc'] == u'Ping a remote server.'
+    assert client.calls == 2
@@ -0,0 +1,115 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+"""
+Startup benchmark for the client schema cache
+
+The benchmarks measure the schema work done by the ``ipa ping`` and
+``ipa user-show`` commands: loading the schema and creating the command
+class. The cold start fetches the schema and writes the cache, the warm
+start reads the cache. The warm start is compared with the zip file cache
+used by the previous cache format, which was read as a whole on every
+invocation. The benchmarks only run with ``--run-benchmarks``; add ``-s``
+to see the timings.
+"""
+import json
+import zipfile
+
+import pytest
+
+from ipaclient.remote_plugins.schema import (
+    Schema, _SchemaCommandPlugin, json_default)
+from ipatests.test_ipaclient.test_schema import FakeClient, make_schema
+from ipatests.util import best_time, report_benchmark
+
+pytestmark = pytest.mark.benchmark
+
+COMMANDS = (u'ping/1', u'user_show/1')
+
+NUMBER = 5
+
+
+@pytest.fixture(scope='module')
+def schema_data():
+    data = make_schema(commands=1500, params=15)
+    user_show = dict(data['commands'][-1])
+    user_show.update(
+        name=u'user_show',
+        full_name=u'user_show/1',
+        params=make_schema(commands=1, params=60)['commands'][-1]['params'],
+    )
+    data['commands'].append(user_show)
+    return data
+
+
+@pytest.fixture
+def schema_dir(tmpdir, monkeypatch):
+    monkeypatch.setattr(Schema, '_DIR', str(tmpdir.join('schema')))
+    return tmpdir.join('schema')
+
+
+def _create_class(schema, full_name):
+    member = schema['commands'][full_name]
+    plugin = _SchemaCommandPlugin(schema, full_name)
+    plugin.NO_CLI  # pylint: disable=pointless-statement
+    # pylint: disable=protected-access
+    name, bases, class_dict = plugin._create_class(None, dict(member))
+    return type(name, bases, class_dict)
+
+
+def _write_zip(schema, filename):
+    # pylint: disable=protected-access
+    with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as f:
+        for ns in Schema.namespaces:
+            for member in schema[ns]:
+                f.writestr(
+                    '{}/{}'.format(ns, member),
+                    json.dumps(schema[ns][member], default=json_default))
+        f.writestr('_help', json.dumps(schema._help, default=json_default))
+
+
+def _read_zip(filename, full_name):
+    members = {}
+    with zipfile.ZipFile(filename, 'r') as f:
+        for name in f.namelist():
+            members[name] = f.read(name)
+    help_data = json.loads(members['_help'].decode('utf-8'))
+    help_data['commands'][full_name]  # pylint: disable=pointless-statement
+    member = json.loads(
+        members['commands/{}'.format(full_name)].decode('utf-8'))
+    plugin = _SchemaCommandPlugin(None, full_name)
+    # pylint: disable=protected-access
+    name, bases, class_dict = plugin._create_class(None, member)
+    return type(name, bases, class_dict)
+
+
+@pytest.mark.parametrize('full_name', COMMANDS)
+def test_startup(full_name, schema_data, schema_dir, tmpdir):
+    client = FakeClient(schema_data)
+    fetched = Schema(client)
+    fingerprint = fetched.fingerprint
+    zip_filename = str(tmpdir.join('schema.zip'))
+    _write_zip(fetched, zip_filename)
+
+    def cold():
+        schema_dir.remove(rec=1)
+        _create_class(Schema(client), full_name)
+
+    def warm():
+        _create_class(Schema(client, fingerprint), full_name)
+
+    def warm_zip():
+        _read_zip(zip_filename, full_name)
+
+    assert _read_zip(zip_filename, full_name).takes_options
+    cold_time = best_time(cold, number=NUMBER)
+    zip_time = best_time(warm_zip, number=NUMBER)
+    calls = client.calls
+    warm_time = best_time(warm, number=NUMBER)
+    assert client.calls == calls
+
+    command = full_name.partition('/')[0].replace('_', '-')
+    report_benchmark(
+        'ipa {} cold -> warm'.format(command), cold_time, warm_time)
+    report_benchmark(
+        'ipa {} zip -> warm'.format(command), zip_time, warm_time)
@@ -23,6 +23,8 @@ Test the `ipalib.frontend` module.
 
 # FIXME: Pylint errors
 # pylint: disable=no-member
+import threading
+
 import pytest
 import six
 
@@ -34,6 +36,7 @@ from ipalib.base import NameSpace
 from ipalib import frontend, backend, plugable, errors, parameters, config
 from ipalib import output, messages
 from ipalib.parameters import Str
+from ipalib.util import classproperty
 from ipapython.version import API_VERSION
 
 if six.PY3:
@@ -87,6 +90,27 @@ def test_is_rule():
     assert not is_rule(call(None))
 
 
+def test_ResultCache():
+    """
+    Test the `ipalib.frontend.ResultCache` class.
+    """
+    cache = frontend.ResultCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    # the least recently used entry is dropped
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (3, 1)
+
+    cache = frontend.ResultCache(maxsize=2, ttl=-1)
+    cache.set('a', 1)
+    assert cache.get('a') is None
+
+
 class test_HasParam(ClassChecker):
     """
     Test the `ipalib.frontend.Command` class.
@@ -685,6 +709,56 @@ class test_Command(ClassChecker):
             assert o.run.__func__ is self.cls.run
         assert {'name': 'forward', 'messages': expected} == o.run(*args, **kw)
 
+    def test_result_cache(self):
+        """
+        Test caching of results of commands with `Command.cache_result` set.
+        """
+        calls = []
+
+        class my_cmd(self.cls):
+            takes_args = ('name',)
+            cache_result = True
+
+            def execute(self, name, **options):
+                calls.append(name)
+                self.add_message(messages.SearchResultTruncated(
+                    reason=errors.SizeLimitExceeded()))
+                return dict(result=[name, len(calls)])
+
+        class my_write(self.cls):
+            def execute(self, **options):
+                return dict(result=None)
+
+        api, _home = create_test_api(in_server=True, command_cache_ttl=60)
+        api.add_plugin(my_cmd)
+        api.add_plugin(my_write)
+        api.finalize()
+        cmd = api.Command.my_cmd
+
+        first = cmd(u'a', version=API_VERSION)
+        assert first['result'] == [u'a', 1]
+        # callers must not be able to modify the cached result
+        first['result'].append(u'modified')
+        assert cmd(u'a', version=API_VERSION)['result'] == [u'a', 1]
+        assert cmd(u'b', version=API_VERSION)['result'] == [u'b', 2]
+        assert cmd.result_cache.hits == 1
+
+        # messages added by the cached run are returned on every hit
+        for _i in range(2):
+            result = cmd(u'a', version=API_VERSION)
+            assert [m['name'] for m in result['messages']] == [
+                'SearchResultTruncated']
+
+        # commands which are not read-only invalidate the cache
+        api.Command.my_write(version=API_VERSION)
+        assert cmd(u'a', version=API_VERSION)['result'] == [u'a', 3]
+
+        # the cache is disabled by default
+        api, _home = create_test_api(in_server=True)
+        api.add_plugin(my_cmd)
+        api.finalize()
+        assert api.Command.my_cmd.result_cache is None
+
     def test_validate_output_basic(self):
         """
         Test the `ipalib.frontend.Command.validate_output` method.
@@ -946,6 +1020,9 @@ class test_Object(ClassChecker):
             def __init__(self):
                 self._API__plugins = get_attributes(cnt, methods_format)
                 self._API__default_map = {}
+                self._API__lazy = {}
+                self._API__loaded_modules = set()
+                self._API__lazy_lock = threading.RLock()
                 self.Method = plugable.APINameSpace(self, DummyAttribute)
             def __contains__(self, key):
                 return hasattr(self, key)
@@ -955,6 +1032,8 @@ class test_Object(ClassChecker):
                 return False
             def _get(self, plugin):
                 return plugin
+            def _load_lazy(self, **kwargs):
+                pass
         api = FakeAPI()
         assert len(api.Method) == cnt * 3
 
@@ -1103,7 +1182,7 @@ class test_Attribute(ClassChecker):
         """
         assert self.cls.__bases__ == (plugable.Plugin,)
         assert type(self.cls.obj) is property
-        assert type(self.cls.obj_name) is property
+        assert isinstance(vars(self.cls)['obj_name'], classproperty)
         assert type(self.cls.attr_name) is property
 
     def test_init(self):
@@ -1122,6 +1201,7 @@ class test_Attribute(ClassChecker):
         assert read_only(o, 'api') is api
         assert read_only(o, 'obj') is user_obj
         assert read_only(o, 'obj_name') == 'user'
+        assert user_add.obj_name == 'user'
         assert read_only(o, 'attr_name') == 'add'
 
 
@@ -1047,6 +1047,68 @@ class test_Str(ClassChecker):
             assert dummy.called() is True
             dummy.reset()
 
+    def test_convert_multi(self):
+        """
+        Test the `ipalib.parameters.Str._convert_multi` method.
+        """
+        o = self.cls('my_str', multivalue=True)
+        values = (u'one', 2, u'', None, 3.5, u'four')
+        assert_equal(o._convert_multi(values), (u'one', u'2', u'3.5', u'four'))
+        assert_equal(
+            o._convert_multi(values),
+            tuple(o._convert_scalar(v) for v in values if v),
+        )
+        e = raises(ConversionError, o._convert_multi, (u'one', [u'two']))
+        assert e.error == u'Only one value is allowed'
+
+    def test_validate_multi(self):
+        """
+        Test the `ipalib.parameters.Str._validate_multi` method.
+        """
+        o = self.cls('my_str', minlength=2, maxlength=4, pattern=r'^[a-z ]+$',
+                     multivalue=True)
+        assert len(o.batch_rules) == 4
+        assert o.scalar_rules == ()
+        assert o.validate((u'ab', u'abc', u'abcd')) is None
+
+        # The first invalid value is reported, with the error of the first
+        # rule it breaks, like when the values are validated one by one:
+        cases = [
+            ((u'ab', u'a', u'abcde'), u'must be at least 2 characters'),
+            ((u'ab', u'abcde', u'a'), u'can be at most 4 characters'),
+            ((u'ab', u'AB', u' ab'), u'must match pattern "^[a-z ]+$"'),
+            ((u'ab', u' ab', u'AB'),
+             u'Leading and trailing spaces are not allowed'),
+        ]
+        for values, error in cases:
+            e = raises(ValidationError, o.validate, values)
+            assert_equal(e.error, error)
+            e = raises(ValidationError, o._validate_scalar, values[1])
+            assert_equal(e.error, error)
+
+        # A value of wrong type is reported only after the values before it
+        # were validated:
+        e = raises(ValidationError, o.validate, (u'ab', u'a', b'ab'))
+        assert_equal(e.error, u'must be at least 2 characters')
+        e = raises(TypeError, o.validate, (u'ab', b'ab', u'a'))
+        assert str(e) == TYPE_ERROR % ('my_str', unicode, b'ab', bytes)
+
+        # Rules without a batch variant are called once for each value:
+        rule = DummyRule()
+        o = self.cls('my_str', rule, maxlength=4, multivalue=True)
+        assert o.scalar_rules == (rule,)
+        assert o.validate((u'ab', u'abc')) is None
+        assert rule.calls == [(text.ugettext, u'ab'), (text.ugettext, u'abc')]
+        rule.reset()
+        e = raises(ValidationError, o.validate, (u'ab', u'abcde', u'abc'))
+        assert_equal(e.error, u'can be at most 4 characters')
+        assert rule.calls == [(text.ugettext, u'ab')]
+
+        # A query enforces no rules:
+        o = self.cls('my_str', maxlength=4, multivalue=True, query=True)
+        assert o.batch_rules == ()
+        assert o.validate((u'abcde',)) is None
+
 
 class test_Password(ClassChecker):
     """
@@ -1133,6 +1195,15 @@ class EnumChecker(ClassChecker):
             assert_equal(dummy.message, "must be one of %(values)s")
             dummy.reset()
 
+    def test_validate_multi(self):
+        """Test the `_batch_rule_values` method"""
+        o = self.cls('my_enum', values=self._test_values, multivalue=True)
+        assert o.validate(self._test_values) is None
+        values = self._test_values + self._bad_values
+        assert o._batch_rule_values(values) == len(self._test_values)
+        e = raises(ValidationError, o.validate, values)
+        assert_equal(e.error, o._rule_values(text.ugettext, self._bad_values[0]))
+
     def test_one_value(self):
         """test a special case when we have just one allowed value"""
         values = (self._test_values[0], )
@@ -1305,6 +1376,17 @@ class test_Int(ClassChecker):
             assert dummy.called() is True
             dummy.reset()
 
+    def test_validate_multi(self):
+        """
+        Test the `ipalib.parameters.Int._validate_multi` method.
+        """
+        o = self.cls('my_number', minvalue=3, maxvalue=8, multivalue=True)
+        assert o.validate((3, 5, 8)) is None
+        e = raises(ValidationError, o.validate, (5, 9, 2))
+        assert_equal(e.error, u'can be at most 8')
+        e = raises(ValidationError, o.validate, (5, 2, 9))
+        assert_equal(e.error, u'must be at least 3')
+
     def test_convert_scalar(self):
         """
         Test the `ipalib.parameters.Int._convert_scalar` method.
@@ -0,0 +1,67 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+"""
+Benchmark for the processing of large multivalue parameters
+
+The benchmark normalizes, converts and validates a multivalue of several
+thousand values, like the member list of a big ``group_add_member`` call.
+It compares the multivalue code path of `ipalib.parameters.Param` with
+processing the values one by one through the scalar methods. The
+benchmark only runs with ``--run-benchmarks``; add ``-s`` to see the timings.
+"""
+import functools
+
+import pytest
+
+from ipalib import parameters
+from ipalib.constants import PATTERN_GROUPUSER_NAME
+from ipatests.util import best_time, report_benchmark
+
+pytestmark = pytest.mark.benchmark
+
+VALUES = 5000
+
+ROUNDS = 20
+
+
+def _scalar(param, values):
+    values = tuple(param._normalize_scalar(v) for v in values)
+    values = tuple(param._convert_scalar(v) for v in values)
+    for v in values:
+        param._validate_scalar(v)
+
+
+def _multi(param, values):
+    param.validate(param.convert(param.normalize(values)))
+
+
+@pytest.mark.parametrize('param, values', [
+    (
+        parameters.Str(
+            'user*',
+            pattern=PATTERN_GROUPUSER_NAME,
+            maxlength=255,
+        ),
+        tuple(u'user%d' % i for i in range(VALUES)),
+    ),
+    (
+        parameters.Int('gidnumber*', minvalue=1),
+        tuple(range(1, VALUES + 1)),
+    ),
+    (
+        parameters.StrEnum(
+            'objectclass*',
+            values=(u'top', u'person', u'posixaccount', u'ipaobject'),
+        ),
+        (u'top', u'person', u'posixaccount', u'ipaobject') * (VALUES // 4),
+    ),
+], ids=['Str', 'Int', 'StrEnum'])
+def test_multivalue(param, values):
+    _multi(param, values)
+    _scalar(param, values)
+    report_benchmark(
+        '%s(%d values)' % (type(param).__name__, len(values)),
+        best_time(functools.partial(_scalar, param, values), repeat=ROUNDS),
+        best_time(functools.partial(_multi, param, values), repeat=ROUNDS),
+    )
@@ -25,6 +25,7 @@ Test the `ipalib.plugable` module.
 # pylint: disable=no-member
 
 import os
+import sys
 import textwrap
 
 from ipalib import plugable, errors, create_api
@@ -307,3 +308,106 @@ class test_API(ClassChecker):
                 os.environ['IPA_CONFDIR'] = ipa_confdir
             else:
                 os.environ.pop('IPA_CONFDIR')
+
+    def test_lazy_plugins(self, tmpdir, monkeypatch):
+        """
+        Test loading plugins from an index in the lazy mode.
+        """
+        package_dir = tmpdir.mkdir('lazy_plugins_test')
+        package_dir.join('__init__.py').write(textwrap.dedent("""
+            from ipalib import plugable
+            class base0(plugable.Plugin):
+                pass
+            class base1(plugable.Plugin):
+                obj_name = None
+        """))
+        package_dir.join('plugins.py').write('')
+        plugins_dir = package_dir.mkdir('plugins')
+        plugins_dir.join('__init__.py').write('')
+        plugins_dir.join('mod0.py').write(textwrap.dedent("""
+            from ipalib import plugable
+            from lazy_plugins_test import base0, base1
+            register = plugable.Registry()
+            @register()
+            class thing(base0):
+                pass
+            @register()
+            class thing_do(base1):
+                obj_name = 'thing'
+            @register()
+            class thing_undo(base1):
+                @property
+                def obj_name(self):
+                    return 'thing'
+        """))
+        plugins_dir.join('mod1.py').write(textwrap.dedent("""
+            from ipalib import plugable
+            from lazy_plugins_test import base0
+            from lazy_plugins_test.plugins.mod0 import thing
+            register = plugable.Registry()
+            @register(override=True)
+            class thing(thing):
+                pass
+        """))
+        plugins_dir.join('mod2.py').write(textwrap.dedent("""
+            from ipalib import plugable
+            from lazy_plugins_test import base0
+            register = plugable.Registry()
+            @register()
+            class other(base0):
+                pass
+        """))
+        monkeypatch.syspath_prepend(str(tmpdir))
+        monkeypatch.setattr(plugable, 'PLUGIN_INDEX_DIR',
+                            str(tmpdir.join('index')))
+
+        def unload():
+            for name in list(sys.modules):
+                if name.startswith('lazy_plugins_test'):
+                    del sys.modules[name]
+
+        def make_api():
+            unload()
+            import lazy_plugins_test
+            import lazy_plugins_test.plugins
+
+            class API(plugable.API):
+                bases = (lazy_plugins_test.base0, lazy_plugins_test.base1)
+                packages = (lazy_plugins_test.plugins,)
+
+            api = API()
+            api.bootstrap(context='cli', confdir=str(tmpdir), in_tree=True,
+                          validate_api=True, lazy_plugins=True)
+            api.finalize()
+            return api
+
+        try:
+            # no index yet, the modules are imported eagerly
+            api = make_api()
+            assert 'lazy_plugins_test.plugins.mod2' in sys.modules
+            index = tmpdir.join('index', 'lazy_plugins_test.plugins.json')
+            assert index.check()
+            eager = sorted((p.full_name, p.__module__) for p in api.base0)
+            api.write_plugin_indexes(str(tmpdir.join('server-index')))
+            assert tmpdir.join('server-index', index.basename).read() == (
+                index.read())
+
+            api = make_api()
+            assert 'lazy_plugins_test.plugins.mod0' not in sys.modules
+            assert 'thing' in api.base0
+            assert 'missing' not in api.base0
+            thing = api.base0.thing
+            assert type(thing).__module__ == 'lazy_plugins_test.plugins.mod1'
+            assert 'lazy_plugins_test.plugins.mod2' not in sys.modules
+            assert sorted(p.name for p in api.base0.thing.api.base1.for_object(
+                'thing')) == ['thing_do', 'thing_undo']
+            assert 'lazy_plugins_test.plugins.mod2' not in sys.modules
+            assert sorted(
+                (p.full_name, p.__module__) for p in api.base0) == eager
+
+            # a changed module invalidates the index
+            plugins_dir.join('mod2.py').write('\n', mode='a')
+            api = make_api()
+            assert 'lazy_plugins_test.plugins.mod2' in sys.modules
+        finally:
+            unload()
@@ -22,6 +22,11 @@ Test the `ipalib.rpc` module.
 """
 from __future__ import print_function
 
+import collections
+import datetime
+import errno
+import json
+import socket
 import unittest
 
 import pytest
@@ -32,11 +37,15 @@ from six.moves.xmlrpc_client import Binary, Fault, dumps, loads
 from six.moves import urllib
 
 from ipatests.util import raises, assert_equal, PluginTester, DummyClass
+from ipatests.util import create_test_api
 from ipatests.util import Fuzzy
 from ipatests.data import binary_bytes, utf8_bytes, unicode_str
-from ipalib.frontend import Command
+from ipalib.frontend import Command, Local
+from ipalib.parameters import Dict, Flag, Str
+from ipalib import output
 from ipalib.request import context, Connection
 from ipalib import rpc, errors, api, request
+from ipapython.dn import DN
 from ipapython.version import API_VERSION
 
 if six.PY3:
@@ -201,6 +210,52 @@ def test_xml_loads():
         assert type(e.faultString) is unicode
 
 
+def test_json_encode_iterator():
+    """
+    Test that `ipalib.rpc.json_encode_binary` accepts streamed values.
+    """
+    def gen():
+        yield dict(cn=u'one', data=b'hello')
+        yield dict(cn=u'two', data=None)
+
+    data = rpc.json_encode_binary(dict(result=gen()), API_VERSION)
+    assert rpc.json_decode_binary(data) == dict(
+        result=(dict(cn=u'one', data=b'hello'), dict(cn=u'two', data=None)))
+    data = rpc.json_encode_binary(iter([1, u'two']), API_VERSION)
+    assert rpc.json_decode_binary(data) == [1, u'two']
+
+
+def test_json_encode_binary_iter():
+    """
+    Test the `ipalib.rpc.json_encode_binary_iter` function.
+    """
+    when = datetime.datetime(2018, 1, 1, 12, 30)
+    entries = [
+        dict(dn=DN(('uid', u'user%d' % i), u'dc=example,dc=com'),
+             uid=(u'user%d' % i,), data=b'\x00\x01', modified=when)
+        for i in range(100)
+    ]
+    response = dict(result=dict(count=100, result=entries), error=None,
+                    id=0, principal=u'admin@EXAMPLE.COM')
+
+    expected = json.loads(rpc.json_encode_binary(response, API_VERSION))
+    chunks = list(rpc.json_encode_binary_iter(response, API_VERSION,
+                                              chunk_size=1024))
+    assert len(chunks) > 1
+    assert all(isinstance(chunk, bytes) for chunk in chunks)
+    assert json.loads(b''.join(chunks).decode('utf-8')) == expected
+    assert expected['result']['result'][0] == dict(
+        dn=u'uid=user0,dc=example,dc=com', uid=[u'user0'],
+        data={u'__base64__': u'AAE='},
+        modified={u'__datetime__': u'20180101123000Z'})
+
+    # streamed values and non-string keys
+    data = b''.join(rpc.json_encode_binary_iter(
+        {1: iter([b'a', None])}, API_VERSION))
+    assert json.loads(data.decode('utf-8')) == {
+        u'1': [{u'__base64__': u'YQ=='}, None]}
+
+
 class test_xmlclient(PluginTester):
     """
     Test the `ipalib.rpc.xmlclient` plugin.
@@ -396,3 +451,359 @@ class test_rpcclient_context(PluginTester):
         # pylint: disable=E1121
         unquoted = urllib.parse.unquote(session_cookie)
         assert(unquoted == fuzzy_cookie)
+
+
+class FakeHTTPConnection(object):
+    def __init__(self):
+        self.sock = object()
+
+    def close(self):
+        self.sock = None
+
+
+class test_HTTPConnectionPool(object):
+    key = ('ipa.example.test', 'admin@EXAMPLE.TEST', '/etc/ipa/ca.crt')
+    other_key = ('ipa.example.test', 'user@EXAMPLE.TEST', '/etc/ipa/ca.crt')
+
+    def test_reuse(self):
+        pool = rpc.HTTPConnectionPool(maxsize=2, idle_timeout=30)
+        assert pool.get(self.key) is None
+
+        conn = FakeHTTPConnection()
+        pool.add(self.key, conn)
+        assert pool.release(conn)
+        assert pool.get(self.other_key) is None
+        assert pool.get(self.key) is conn
+        assert pool.get(self.key) is None
+        assert conn.sock is not None
+
+        assert pool.stats() == dict(
+            hits=1, misses=3, discarded=0, idle=0, leased=1)
+
+    def test_maxsize(self):
+        pool = rpc.HTTPConnectionPool(maxsize=1, idle_timeout=30)
+        first, second = FakeHTTPConnection(), FakeHTTPConnection()
+        pool.add(self.key, first)
+        pool.add(self.key, second)
+        pool.release(first)
+        pool.release(second)
+
+        assert first.sock is None
+        assert pool.get(self.key) is second
+
+    def test_idle_timeout(self):
+        pool = rpc.HTTPConnectionPool(maxsize=2, idle_timeout=-1)
+        conn = FakeHTTPConnection()
+        pool.add(self.key, conn)
+        pool.release(conn)
+
+        assert conn.sock is None
+        assert pool.get(self.key) is None
+
+    def test_transport_close(self):
+        pool = rpc.HTTPConnectionPool(maxsize=2, idle_timeout=30)
+        transport = rpc.SSLTransport(protocol='json', pool=pool)
+
+        conn = FakeHTTPConnection()
+        pool.add(self.key, conn)
+        # pylint: disable=protected-access
+        transport._connection = ('ipa.example.test', conn)
+        transport.close()
+        assert transport._connection == (None, None)
+        assert pool.get(self.key) is conn
+
+        # the server closed the connection, it cannot be reused
+        conn.close()
+        transport._connection = ('ipa.example.test', conn)
+        transport.close()
+        assert pool.stats() == dict(
+            hits=1, misses=0, discarded=1, idle=0, leased=0)
+
+        # connections which were not handed out by the pool are closed
+        conn = FakeHTTPConnection()
+        transport._connection = ('ipa.example.test', conn)
+        transport.close()
+        assert conn.sock is None
+        assert pool.stats()['idle'] == 0
+
+
+class batch_user_add(Command):
+    takes_args = (Str('uid'),)
+    takes_options = (Str('sn'),)
+    has_output = output.standard_entry
+    msg_summary = u'Added user "%(value)s"'
+
+
+class batch_local(Local):
+    pass
+
+
+class batch(Command):
+    takes_args = (Dict('methods*'),)
+    takes_options = (Flag('parallel?'),)
+    has_output = (
+        output.Output('count', int),
+        output.Output('results', (list, tuple)),
+    )
+
+    requests = []
+
+    def forward(self, methods, **options):
+        self.requests.append((methods, options))
+        results = []
+        for method in methods:
+            (uid,), kw = method['params']
+            if uid == u'existing':
+                results.append(dict(
+                    error=u'user with name "existing" already exists',
+                    error_code=errors.DuplicateEntry.errno,
+                    error_name=u'DuplicateEntry',
+                    error_kw=dict(),
+                ))
+            else:
+                results.append(dict(
+                    error=None,
+                    result=dict(uid=[uid], sn=[kw['sn']]),
+                    value=uid,
+                ))
+        return dict(count=len(results), results=results)
+
+
+class test_Batch(object):
+    def setup(self):
+        self.api, _home = create_test_api(in_server=False)
+        for plugin in (batch_user_add, batch_local, batch):
+            self.api.add_plugin(plugin)
+        self.api.finalize()
+        del batch.requests[:]
+
+    def test_results(self):
+        with rpc.Batch(self.api, size=10) as b:
+            added = b.Command.batch_user_add(u'tuser', sn=u'User')
+            existing = b.Command['batch_user_add'](u'existing', sn=u'User')
+            assert not added.done()
+            assert len(b) == 2
+        assert len(batch.requests) == 1
+
+        (methods, options) = batch.requests[0]
+        assert options == dict(version=API_VERSION)
+        assert methods[0] == dict(
+            method=u'batch_user_add/1',
+            params=[(u'tuser',), dict(sn=u'User', version=API_VERSION)],
+        )
+        assert added.done()
+        assert added.result() == dict(
+            result=dict(uid=[u'tuser'], sn=[u'User']),
+            value=u'tuser',
+            summary=u'Added user "tuser"',
+        )
+        with pytest.raises(errors.DuplicateEntry):
+            existing.result()
+
+    def test_size(self):
+        b = rpc.Batch(self.api, size=2, parallel=True)
+        calls = [b.Command.batch_user_add(u'tuser%d' % i, sn=u'User')
+                 for i in range(5)]
+        assert len(batch.requests) == 2
+        assert calls[3].done()
+        assert not calls[4].done()
+
+        # the result of a queued call forwards the queue
+        assert calls[4].result()['value'] == u'tuser4'
+        assert len(batch.requests) == 3
+        assert [len(m) for m, _o in batch.requests] == [2, 2, 1]
+        assert batch.requests[0][1]['parallel'] is True
+
+    def test_invalid(self):
+        b = rpc.Batch(self.api)
+        with pytest.raises(errors.CommandError):
+            b.Command.batch_local()
+        with pytest.raises(errors.MaxArgumentError):
+            b.Command.batch_user_add(u'tuser', u'other')
+        with pytest.raises(AttributeError):
+            b.Command._private  # pylint: disable=pointless-statement
+        assert len(b) == 0
+
+
+FakeSRV = collections.namedtuple('FakeSRV', 'priority weight target')
+FakeRRset = collections.namedtuple('FakeRRset', 'ttl')
+
+
+class FakeSRVAnswers(list):
+    def __init__(self, records, ttl=300):
+        super(FakeSRVAnswers, self).__init__(
+            FakeSRV(priority, weight, '%s.' % target)
+            for priority, weight, target in records)
+        self.rrset = FakeRRset(ttl)
+
+
+class test_ServerDiscovery(object):
+    records = {
+        '_ldap._tcp.example.test.': [
+            (0, 100, 'ipa1.example.test'),
+            (0, 100, 'ipa2.example.test'),
+            (10, 100, 'ipa3.example.test'),
+        ],
+        '_ldap._tcp.brno._locations.example.test.': [
+            (0, 100, 'ipa3.example.test'),
+            (50, 100, 'ipa1.example.test'),
+        ],
+    }
+
+    @pytest.fixture(autouse=True)
+    def resolver(self, monkeypatch):
+        self.queries = []
+
+        def query(qname, rdtype):
+            self.queries.append(qname)
+            if qname not in self.records:
+                raise rpc.DNSException()
+            return FakeSRVAnswers(self.records[qname])
+
+        monkeypatch.setattr(rpc.resolver, 'query', query)
+
+    def test_get_servers(self):
+        discovery = rpc.ServerDiscovery(penalty=60)
+        servers = discovery.get_servers('example.test')
+        assert sorted(servers[:2]) == ['ipa1.example.test', 'ipa2.example.test']
+        assert servers[2] == 'ipa3.example.test'
+
+        # the SRV records are cached for their TTL
+        discovery.get_servers('example.test')
+        assert self.queries == ['_ldap._tcp.example.test.']
+
+    def test_location(self):
+        discovery = rpc.ServerDiscovery(penalty=60)
+        assert discovery.get_servers('example.test', 'brno') == [
+            'ipa3.example.test', 'ipa1.example.test']
+        # no records for the location, use the servers of the domain
+        assert len(discovery.get_servers('example.test', 'prague')) == 3
+        assert discovery.lookup_srv('_ldap._tcp.missing.') == []
+        discovery.lookup_srv('_ldap._tcp.missing.')
+        assert self.queries.count('_ldap._tcp.missing.') == 1
+
+    def test_rank(self):
+        discovery = rpc.ServerDiscovery(penalty=60)
+        records = [(0, 0, 'ipa1'), (0, 0, 'ipa2'), (10, 0, 'ipa3')]
+        discovery.record_success('ipa1', latency=0.5)
+        discovery.record_success('ipa2', latency=0.01)
+        assert discovery.rank(records) == ['ipa2', 'ipa1', 'ipa3']
+
+        discovery.record_failure('ipa2')
+        assert discovery.is_failed('ipa2')
+        assert discovery.rank(records) == ['ipa1', 'ipa3', 'ipa2']
+
+        discovery.record_success('ipa2')
+        assert not discovery.is_failed('ipa2')
+
+        discovery = rpc.ServerDiscovery(penalty=-1)
+        discovery.record_failure('ipa1')
+        assert not discovery.is_failed('ipa1')
+
+    def test_probe(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(5)
+        port = listener.getsockname()[1]
+        try:
+            discovery = rpc.ServerDiscovery(penalty=60)
+            # nothing listens on 127.0.0.2
+            assert discovery.probe(['127.0.0.2', '127.0.0.1'], port, 5) == [
+                '127.0.0.1']
+            assert discovery.is_failed('127.0.0.2')
+            assert not discovery.is_failed('127.0.0.1')
+        finally:
+            listener.close()
+
+        assert discovery.probe(['127.0.0.1'], port, 5) == ['127.0.0.1']
+        assert discovery.is_failed('127.0.0.1')
+
+
+class test_get_url_list(object):
+    def test_failed_server(self, monkeypatch):
+        monkeypatch.setattr(
+            rpc.resolver, 'query', lambda qname, rdtype: FakeSRVAnswers([
+                (0, 100, 'ipa1.example.test'), (0, 100, 'ipa2.example.test'),
+            ]))
+        api, _home = create_test_api(in_server=False, domain='example.test')
+        api.add_plugin(rpc.jsonclient)
+        api.finalize()
+        client = api.Backend.jsonclient
+
+        uri = 'https://ipa1.example.test/ipa/session/json'
+        urls = client.get_url_list(uri)
+        assert urls == [uri, 'https://ipa2.example.test/ipa/session/json']
+
+        client.server_discovery.record_failure('ipa1.example.test')
+        assert client.get_url_list(uri) == list(reversed(urls))
+
+
+class FakeTransport(object):
+    probe_skipped = True
+
+    def __init__(self, connect_failed):
+        self.connect_failed = connect_failed
+
+    def close(self):
+        pass
+
+
+class FakeServerProxy(object):
+    def __init__(self, error=None, connect_failed=False):
+        self._ServerProxy__transport = FakeTransport(connect_failed)
+        self.error = error
+
+    def ping(self, *args):
+        if self.error is not None:
+            raise self.error
+        return dict(result=dict(summary=u'pong'))
+
+
+class test_forward_failover(object):
+    url = 'https://ipa1.example.test/ipa/session/json'
+
+    @pytest.fixture(autouse=True)
+    def client(self, monkeypatch):
+        api, _home = create_test_api(in_server=False)
+        api.add_plugin(rpc.jsonclient)
+        api.finalize()
+        self.client = api.Backend.jsonclient
+        self.connections = []
+
+        def create_connection(client, *args, **kwargs):
+            self.connections.append((args, kwargs))
+            return FakeServerProxy()
+
+        monkeypatch.setattr(
+            rpc.jsonclient, 'create_connection', create_connection)
+        context.request_url = self.url
+        context.ca_certfile = '/tmp/ca.crt'
+        yield
+        for name in (self.client.id, 'request_url', 'ca_certfile'):
+            delattr(context, name)
+
+    def connect(self, proxy):
+        setattr(context, self.client.id,
+                Connection(proxy, self.client.disconnect))
+
+    @pytest.mark.parametrize('error', [
+        socket.timeout('timed out'),
+        rpc.SSLError('handshake failed'),
+        socket.error(errno.ECONNREFUSED, 'Connection refused'),
+    ])
+    def test_not_sent(self, error):
+        self.connect(FakeServerProxy(error, connect_failed=True))
+        result = self.client.forward(u'ping')
+        assert result == dict(result=dict(summary=u'pong'))
+
+        (args, kwargs), = self.connections
+        assert args[-1] == '/tmp/ca.crt'
+        assert kwargs == dict(probe=True)
+        assert self.client.server_discovery.is_failed('ipa1.example.test')
+
+    def test_sent(self):
+        # the request may have reached the server, it is not sent again
+        self.connect(FakeServerProxy(socket.timeout('timed out')))
+        with pytest.raises(errors.NetworkError):
+            self.client.forward(u'ping')
+        assert self.connections == []
@@ -0,0 +1,204 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+"""
+Throughput benchmark for the keep-alive connections of the RPC clients
+
+The benchmark forwards ``user_show`` in a tight loop to a local HTTPS
+server, which answers with a canned JSON-RPC response, and reports calls
+per call. It compares a loop that connects and disconnects the client
+for every call with and without the HTTP connection pool, and a loop over
+a single connection. The benchmark only runs with ``--run-benchmarks``;
+add ``-s`` to see the timings.
+"""
+import datetime
+import json
+import ssl
+import threading
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from six.moves import BaseHTTPServer, socketserver  # pylint: disable=import-error
+
+from ipalib import rpc
+from ipalib.request import context
+from ipalib.util import create_https_connection
+from ipatests.util import best_time, create_test_api, report_benchmark
+
+pytestmark = pytest.mark.benchmark
+
+CALLS = 200
+
+PRINCIPAL = u'admin@EXAMPLE.TEST'
+
+RESPONSE = json.dumps(dict(
+    result=dict(
+        result=dict(
+            uid=[u'admin'],
+            uidnumber=[u'1000'],
+            gidnumber=[u'1000'],
+            homedirectory=[u'/home/admin'],
+            loginshell=[u'/bin/bash'],
+        ),
+        value=u'admin',
+        summary=None,
+    ),
+    error=None,
+    id=0,
+)).encode('utf-8')
+
+
+def _write_certificate(tmpdir):
+    key = rsa.generate_private_key(
+        public_exponent=65537, key_size=2048, backend=default_backend())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, u'localhost')])
+    now = datetime.datetime.utcnow()
+    cert = x509.CertificateBuilder().subject_name(
+        name
+    ).issuer_name(
+        name
+    ).public_key(
+        key.public_key()
+    ).serial_number(
+        1
+    ).not_valid_before(
+        now - datetime.timedelta(days=1)
+    ).not_valid_after(
+        now + datetime.timedelta(days=1)
+    ).add_extension(
+        x509.SubjectAlternativeName([x509.DNSName(u'localhost')]),
+        critical=False,
+    ).add_extension(
+        x509.BasicConstraints(ca=True, path_length=None),
+        critical=True,
+    ).sign(key, hashes.SHA256(), default_backend())
+
+    certfile = str(tmpdir.join('server.crt'))
+    keyfile = str(tmpdir.join('server.key'))
+    with open(certfile, 'wb') as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(keyfile, 'wb') as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption()))
+    return certfile, keyfile
+
+
+class JSONHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(RESPONSE)))
+        self.end_headers()
+        self.wfile.write(RESPONSE)
+
+    def log_message(self, *args):
+        pass
+
+
+class HTTPSServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture(scope='module')
+def server(tmpdir_factory):
+    certfile, keyfile = _write_certificate(tmpdir_factory.mktemp('https'))
+    httpd = HTTPSServer(('localhost', 0), JSONHandler)
+    ctx = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+    ctx.load_cert_chain(certfile, keyfile)
+    httpd.socket = ctx.wrap_socket(httpd.socket, server_side=True)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield 'https://localhost:{}/ipa/session/json'.format(
+        httpd.server_address[1]), certfile
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _create_connection(host, port, *args, **kwargs):
+    # the transport always connects to port 443
+    host, _sep, port = host.partition(':')
+    return create_https_connection(host, int(port), *args, **kwargs)
+
+
+@pytest.fixture
+def make_client(server, monkeypatch):
+    uri, certfile = server
+    monkeypatch.setattr(
+        rpc.jsonclient, 'get_url_list', lambda self, rpc_uri: [rpc_uri])
+    monkeypatch.setattr(rpc, 'create_https_connection', _create_connection)
+    monkeypatch.setattr(
+        rpc, 'get_principal', lambda ccache_name: PRINCIPAL)
+    # the session cookie saves the Negotiate authentication
+    context.principal = PRINCIPAL
+    context.session_cookie = 'ipa_session=MagBearerToken=benchmark'
+    homes = []
+
+    def make_client(pool_size):
+        api, home = create_test_api(
+            jsonrpc_uri=uri,
+            tls_ca_cert=certfile,
+            tls_version_min='tls1.2',
+            tls_version_max='tls1.2',
+            rpc_pool_size=pool_size,
+        )
+        homes.append(home)
+        api.add_plugin(rpc.jsonclient)
+        api.finalize()
+        monkeypatch.setattr(rpc, 'api', api)
+        return api.Backend.jsonclient
+
+    yield make_client
+    context.__dict__.clear()
+    for home in homes:
+        home.rmtree()
+
+
+def _reconnect_loop(client):
+    def call():
+        client.connect()
+        try:
+            return client.forward(u'user_show', u'admin', version=u'2.231')
+        finally:
+            client.disconnect()
+    return call
+
+
+def test_user_show_loop(make_client):
+    unpooled = make_client(0)
+    pooled = make_client(4)
+
+    result = _reconnect_loop(pooled)()
+    assert result['result']['uid'] == (u'admin',)
+
+    reconnect = best_time(
+        _reconnect_loop(unpooled), repeat=1, number=CALLS)
+    reconnect_pooled = best_time(
+        _reconnect_loop(pooled), repeat=1, number=CALLS)
+    stats = pooled.connection_pool.stats()
+    assert stats['hits'] >= CALLS
+    assert stats['idle'] == 1
+
+    pooled.connect()
+    try:
+        keep_alive = best_time(
+            lambda: pooled.forward(u'user_show', u'admin', version=u'2.231'),
+            repeat=1, number=CALLS)
+    finally:
+        pooled.disconnect()
+
+    report_benchmark(
+        'user_show reconnect -> pooled', reconnect, reconnect_pooled)
+    report_benchmark(
+        'user_show reconnect -> keep-alive', reconnect, keep_alive)
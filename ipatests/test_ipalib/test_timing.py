@@ -0,0 +1,123 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+"""
+Test the `ipalib.timing` module.
+"""
+import json
+import os
+
+import pytest
+
+from ipalib import frontend, timing
+from ipalib.request import context
+from ipapython.version import API_VERSION
+from ipatests.util import create_test_api
+
+pytestmark = pytest.mark.tier0
+
+
+class my_callback_cmd(frontend.Command):
+    takes_args = ('name',)
+
+    def execute(self, name, **options):
+        for callback in self.get_callbacks('pre'):
+            name = callback(self, name)
+        with timing.phase('ldap_search'):
+            pass
+        with timing.phase('ldap_modify'):
+            pass
+        return dict(result=name)
+
+    def pre_callback(self, name):
+        return name.upper()
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    stats = timing.CommandStats()
+    monkeypatch.setattr(timing, 'stats', stats)
+    return stats
+
+
+def test_disabled(stats):
+    api, _home = create_test_api(in_server=True)
+    api.add_plugin(my_callback_cmd)
+    api.finalize()
+    assert api.env.command_timing_sample == 0
+
+    result = api.Command.my_callback_cmd(u'a', version=API_VERSION)
+    assert result['result'] == u'A'
+    assert timing.current() is None
+    assert stats.as_dict() == {}
+
+    # phases outside of a timed call are not recorded
+    with timing.phase('ldap_search'):
+        pass
+
+    def func():
+        pass
+    assert timing.timed(func, 'pre_callback') is func
+
+
+def test_command_phases(stats, tmpdir):
+    api, _home = create_test_api(
+        in_server=True, command_timing_sample=1,
+        command_timing_dir=str(tmpdir), command_timing_interval=0)
+    api.add_plugin(my_callback_cmd)
+    api.finalize()
+
+    result = api.Command.my_callback_cmd(u'a', version=API_VERSION)
+    assert result['result'] == u'A'
+    assert timing.current() is None
+
+    stat = stats.as_dict()['my_callback_cmd']
+    assert stat['calls'] == 1
+    assert stat['ldap_ops'] == 2
+    assert stat['time'] == stat['max'] > 0
+    phases = stat['phases']
+    for phase in ('default', 'normalize', 'convert', 'validate', 'run',
+                  'pre_callback', 'ldap_search', 'ldap_modify',
+                  'validate_output'):
+        assert phases[phase]['count'] == 1, phase
+    assert phases['run']['time'] >= phases['pre_callback']['time']
+
+    with open(os.path.join(str(tmpdir), '%d.json' % os.getpid())) as f:
+        data = json.load(f)
+    assert data['sample'] == 1
+    assert data['commands']['my_callback_cmd']['calls'] == 1
+
+
+def test_nested_calls(stats):
+    api, _home = create_test_api(command_timing_sample=1)
+    api.finalize()
+
+    timer = timing.start(u'outer', api.env)
+    try:
+        # a call already timed in this thread is not timed again
+        assert timing.start(u'inner', api.env) is None
+        with timing.phase('run'):
+            with timing.phase('ldap_search'):
+                pass
+    finally:
+        timing.finish(timer, api.env)
+    assert timing.current() is None
+    assert timer.as_dict()['phases']['ldap_search']['count'] == 1
+    assert list(stats.as_dict()) == [u'outer']
+
+
+def test_timed_iter(stats):
+    api, _home = create_test_api(command_timing_sample=1)
+    api.finalize()
+
+    timer = timing.start(u'marshal', api.env)
+    with timing.phase('marshal'):
+        chunks = iter([b'a', b'b'])
+    timing.detach(timer)
+    assert getattr(context, 'command_timer', None) is None
+
+    assert list(timing.timed_iter(chunks, 'marshal', timer, api.env)) == [
+        b'a', b'b']
+    assert timer.elapsed is not None
+    assert timer.phases['marshal'][0] == 1
+    assert stats.as_dict()[u'marshal']['calls'] == 1
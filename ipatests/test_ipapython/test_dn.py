@@ -1,10 +1,13 @@
 import contextlib
+import copy
+import pickle
 import unittest
 import pytest
 
 from cryptography import x509
 import six
 
+from ipapython import dn as dn_module
 from ipapython.dn import DN, RDN, AVA
 
 if six.PY3:
@@ -1207,6 +1210,44 @@ class TestDN(unittest.TestCase):
         for i in range(l):
             self.assertEqual(longdn_rev[i], self.base_container_dn[l-1-i])
 
+    def test_copy(self):
+        hash(self.dn3)
+        dn3_copy = DN(self.dn3)
+        self.assertIs(dn3_copy.rdns, self.dn3.rdns)
+        self.assertEqual(hash(dn3_copy), hash(self.dn3))
+        dn3_child = DN(self.rdn1, self.dn3)
+        self.assertEqual(dn3_child.rdns[1:], self.dn3.rdns)
+
+        for dn in (DN(), self.dn3):
+            for dn_copy in (copy.copy(dn), copy.deepcopy(dn)):
+                self.assertEqual(dn_copy, dn)
+                self.assertEqual(len(dn_copy), len(dn))
+            for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+                dn_copy = pickle.loads(pickle.dumps(dn, protocol))
+                self.assertEqual(dn_copy, dn)
+                self.assertEqual(len(dn_copy), len(dn))
+                self.assertEqual(hash(dn_copy), hash(dn))
+
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        # pylint: disable=protected-access
+        self.cache = dn_module._dn_string_cache
+        self.cache.clear()
+
+    def tearDown(self):
+        self.cache.clear()
+
+    def test_bounded(self):
+        maxsize = self.cache.maxsize
+        for i in range(maxsize + 10):
+            DN(u'cn=entry%d' % i)
+        self.assertEqual(len(self.cache), maxsize)
+        # least recently used entries were evicted
+        self.cache.misses = 0
+        DN(u'cn=entry0')
+        self.assertEqual(self.cache.misses, 1)
+
 
 class TestEscapes(unittest.TestCase):
     def setUp(self):
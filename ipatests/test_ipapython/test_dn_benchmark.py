@@ -0,0 +1,93 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+"""
+Microbenchmarks for ipapython.dn
+
+The benchmarks compare the hot operations used when converting member
+attributes (parsing member DNs, hashing, container suffix checks) with and
+without the DN string cache and the cached normalized key. The benchmarks
+only run with ``--run-benchmarks``; add ``-s`` to see the timings.
+"""
+import pytest
+
+from ipapython import dn as dn_module
+from ipapython.dn import DN
+from ipatests.util import best_time, report_benchmark
+
+pytestmark = pytest.mark.benchmark
+
+BASEDN = DN('dc=ipa,dc=example,dc=test')
+USERS_DN = DN(('cn', 'users'), ('cn', 'accounts'), BASEDN)
+GROUPS_DN = DN(('cn', 'groups'), ('cn', 'accounts'), BASEDN)
+MEMBERS = [
+    u'uid=user%d,cn=users,cn=accounts,dc=ipa,dc=example,dc=test' % i
+    for i in range(1000)
+]
+
+
+@pytest.fixture
+def dn_cache():
+    cache = dn_module._dn_string_cache  # pylint: disable=protected-access
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+def test_parse_cached(dn_cache):
+    def parse_uncached():
+        for member in MEMBERS:
+            dn_cache.clear()
+            DN(member)
+
+    def parse_cached():
+        for member in MEMBERS:
+            DN(member)
+
+    parse_cached()
+    assert len(dn_cache) == len(MEMBERS)
+    hits = dn_cache.hits
+    slow = best_time(parse_uncached)
+    parse_cached()
+    fast = best_time(parse_cached)
+    assert dn_cache.hits > hits
+    report_benchmark('parse member DNs', slow, fast)
+
+
+def test_hash_cached():
+    dns = [DN(member) for member in MEMBERS]
+
+    def hash_fresh():
+        for dn in dns:
+            hash(DN._from_rdns(dn.rdns))  # pylint: disable=protected-access
+
+    def hash_cached():
+        for dn in dns:
+            hash(dn)
+
+    hash_cached()
+    slow = best_time(hash_fresh)
+    fast = best_time(hash_cached)
+    report_benchmark('hash member DNs', slow, fast)
+
+
+def test_endswith():
+    dns = [DN(member) for member in MEMBERS]
+    for dn in dns:
+        assert dn.endswith(USERS_DN)
+        assert not dn.endswith(GROUPS_DN)
+
+    def endswith_tailmatch():
+        for dn in dns:
+            # explicit bounds take the generic _tailmatch() path
+            dn.endswith(GROUPS_DN, 0, len(dn))
+            dn.endswith(USERS_DN, 0, len(dn))
+
+    def endswith_fast():
+        for dn in dns:
+            dn.endswith(GROUPS_DN)
+            dn.endswith(USERS_DN)
+
+    slow = best_time(endswith_tailmatch)
+    fast = best_time(endswith_fast)
+    report_benchmark('container suffix check', slow, fast)
@@ -0,0 +1,277 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+"""
+Test the keep-alive HTTPS connections, the connection pool and the
+certificate search parser of `ipapython.dogtag`.
+"""
+import io
+import socket
+
+import pytest
+
+from ipalib import errors
+from ipapython import dogtag
+
+pytestmark = pytest.mark.tier0
+
+CA_HOST = u'ca.example.com'
+
+URL = '/ca/agent/ca/displayBySerial'
+
+
+class FakeEnv(object):
+    tls_version_min = 'tls1.2'
+    tls_version_max = 'tls1.2'
+    http_timeout = 0
+    dogtag_pool_size = 0
+    dogtag_pool_idle_timeout = 60
+
+
+class FakeAPI(object):
+    def __init__(self, env):
+        self.env = env
+
+
+class FakeResponse(object):
+    status = 200
+    msg = {}
+
+    def __init__(self, body):
+        self.body = body
+
+    def read(self):
+        return self.body
+
+
+class FakeHTTPSConnection(object):
+    refuse = False
+
+    def __init__(self, host, port, **kw):
+        self.host = host
+        self.port = port
+        self.sock = None
+        self.peer = None
+        self.connects = 0
+        self.requests = []
+        self.drop = False
+
+    def request(self, method, uri, body=None, headers=None):
+        if self.sock is None:
+            if self.refuse:
+                raise socket.error('connection refused')
+            self.sock, self.peer = socket.socketpair()
+            self.connects += 1
+        elif self.drop:
+            self.drop = False
+            raise socket.error('connection reset by peer')
+        self.requests.append((method, uri, body))
+
+    def getresponse(self):
+        return FakeResponse(b'response %d' % len(self.requests))
+
+    def server_close(self):
+        self.peer.close()
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.peer.close()
+        self.sock = self.peer = None
+
+
+@pytest.fixture
+def env(monkeypatch):
+    env = FakeEnv()
+    monkeypatch.setattr(dogtag, 'api', FakeAPI(env))
+    return env
+
+
+@pytest.fixture
+def pool(env, monkeypatch):
+    env.dogtag_pool_size = 2
+    pool = dogtag.ConnectionPool()
+    monkeypatch.setattr(dogtag, 'connection_pool', pool)
+    yield pool
+    pool.clear()
+
+
+@pytest.fixture
+def connections(env, monkeypatch):
+    connections = []
+
+    def create_https_connection(host, port, **kw):
+        conn = FakeHTTPSConnection(host, port, **kw)
+        connections.append(conn)
+        return conn
+
+    monkeypatch.setattr(dogtag, 'create_https_connection',
+                        create_https_connection)
+    yield connections
+    for conn in connections:
+        conn.close()
+
+
+def make_connection():
+    return dogtag.KeepAliveHTTPSConnection(
+        CA_HOST, 443, cafile='/ca.crt',
+        client_certfile='/ra.pem', client_keyfile='/ra.key')
+
+
+def https_request(**kw):
+    return dogtag.https_request(
+        CA_HOST, 443, URL, cafile='/ca.crt',
+        client_certfile='/ra.pem', client_keyfile='/ra.key', **kw)
+
+
+def test_keep_alive(connections):
+    conn = make_connection()
+    for serial_number in (1, 2):
+        status, _headers, body = conn.request(URL, serialNumber=serial_number)
+        assert status == 200
+    assert body == b'response 2'
+
+    https_conn, = connections
+    assert https_conn.connects == 1
+    assert [body for _method, _uri, body in https_conn.requests] == [
+        'serialNumber=1', 'serialNumber=2']
+    assert conn.is_alive()
+
+    # the server closed the idle connection
+    https_conn.server_close()
+    assert not conn.is_alive()
+
+    conn.close()
+    assert https_conn.sock is None
+    assert not conn.is_alive()
+
+
+def test_retry_closed_connection(connections, monkeypatch):
+    conn = make_connection()
+    conn.request(URL, serialNumber=1)
+    https_conn, = connections
+
+    # a POST request might have been processed, it is not sent again
+    https_conn.drop = True
+    with pytest.raises(errors.NetworkError):
+        conn.request(URL, serialNumber=2)
+
+    # the server closed the idle connection, the request is sent again
+    conn.request(URL, serialNumber=2)
+    https_conn.drop = True
+    _status, _headers, body = conn.request(URL, serialNumber=3, retry=True)
+    assert body == b'response 3'
+    assert https_conn.connects == 3
+
+    # a failure on a new connection is not retried
+    conn.close()
+    monkeypatch.setattr(FakeHTTPSConnection, 'refuse', True)
+    with pytest.raises(errors.NetworkError):
+        conn.request(URL, method='GET')
+    assert len(connections) == 2
+
+
+def test_pool_disabled(connections):
+    for _i in range(2):
+        https_request(serialNumber=1)
+    assert [conn.connects for conn in connections] == [1, 1]
+    assert all(conn.sock is None for conn in connections)
+
+
+def test_pool_reuse(connections, pool):
+    for serial_number in range(3):
+        https_request(serialNumber=serial_number)
+    https_conn, = connections
+    assert https_conn.connects == 1
+    assert len(https_conn.requests) == 3
+
+    # connections closed by the server are not reused
+    https_conn.server_close()
+    https_request(serialNumber=4)
+    assert len(connections) == 2
+    assert https_conn.sock is None
+
+
+def test_pool_limit(connections, pool):
+    key = (CA_HOST, 443)
+    with pool.connection(key, make_connection) as conn1:
+        with pool.connection(key, make_connection) as conn2:
+            assert conn1 is not conn2
+            conn1.request(URL, serialNumber=1)
+            conn2.request(URL, serialNumber=2)
+            with pytest.raises(errors.NetworkError):
+                with pool.connection(key, make_connection):
+                    pass
+        # other hosts have their own limit
+        with pool.connection((u'ca2.example.com', 443), make_connection):
+            pass
+        with pool.connection(key, make_connection) as conn3:
+            assert conn3 is conn2
+
+
+def test_pool_idle_timeout(connections, pool, env):
+    https_request(serialNumber=1)
+    env.dogtag_pool_idle_timeout = 0
+    https_request(serialNumber=2)
+    assert len(connections) == 2
+    assert connections[0].sock is None
+
+
+def test_sessions(pool, env):
+    key = (CA_HOST, 443, '/ra.pem')
+    assert pool.get_session(key) is None
+    pool.set_session(key, 'JSESSIONID=1')
+    assert pool.get_session(key) == 'JSESSIONID=1'
+
+    pool.drop_session(key)
+    assert pool.get_session(key) is None
+
+    pool.set_session(key, 'JSESSIONID=2')
+    env.dogtag_pool_idle_timeout = 0
+    assert pool.get_session(key) is None
+
+
+SEARCH_RESULT = b"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<CertDataInfos>
+    <total>3</total>
+    <CertDataInfo id="0x1">
+        <SubjectDN>CN=Certificate Authority,O=EXAMPLE.COM</SubjectDN>
+        <IssuerDN>CN=Certificate Authority,O=EXAMPLE.COM</IssuerDN>
+        <Status>VALID</Status>
+        <NotValidBefore>1514764800000</NotValidBefore>
+        <NotValidAfter>2145916800000</NotValidAfter>
+        <Link rel="self" href="https://ca.example.com/ca/rest/certs/1"/>
+    </CertDataInfo>
+    <CertDataInfo id="0xff">
+        <SubjectDN>CN=web.example.com,O=EXAMPLE.COM</SubjectDN>
+        <IssuerDN>CN=Certificate Authority,O=EXAMPLE.COM</IssuerDN>
+        <Status>REVOKED</Status>
+    </CertDataInfo>
+</CertDataInfos>
+"""
+
+
+def test_parse_cert_search_xml():
+    summary = {}
+    results = dogtag.parse_cert_search_xml(io.BytesIO(SEARCH_RESULT), summary)
+    assert next(results) == dict(
+        serial_number=1,
+        serial_number_hex=u'0x1',
+        subject=u'CN=Certificate Authority,O=EXAMPLE.COM',
+        issuer=u'CN=Certificate Authority,O=EXAMPLE.COM',
+        status=u'VALID',
+        valid_not_before=u'1514764800000',
+        valid_not_after=u'2145916800000',
+    )
+    assert summary == dict(total=3)
+    result, = list(results)
+    assert result['serial_number'] == 255
+    assert result['status'] == u'REVOKED'
+    assert 'valid_not_before' not in result
+
+
+def test_parse_cert_search_xml_error():
+    results = dogtag.parse_cert_search_xml(
+        io.BytesIO(SEARCH_RESULT[:SEARCH_RESULT.index(b'<Link')]))
+    with pytest.raises(errors.RemoteRetrieveError):
+        list(results)
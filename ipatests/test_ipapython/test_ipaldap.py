@@ -0,0 +1,161 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+"""
+Test the operation tracing of `ipapython.ipaldap.LDAPClient`.
+"""
+import logging
+import time
+
+import ldap
+import pytest
+
+from ipalib import errors, timing
+from ipalib.request import context
+from ipapython import ipaldap
+from ipapython.dn import DN
+
+pytestmark = pytest.mark.tier0
+
+BASE_DN = DN(('cn', 'users'), ('dc', 'example'))
+USER_DNS = [DN(('uid', 'user%d' % i), BASE_DN) for i in range(3)]
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.results = []
+        self.modlists = []
+        self.error = None
+        self.delay = 0
+
+    def search_ext(self, base, scope, filter, attrs_list, serverctrls=None,
+                   timeout=None, sizelimit=None):
+        self.results = [
+            (ldap.RES_SEARCH_ENTRY, [(str(dn), {'uid': [b'user']})], 1, [])
+            for dn in USER_DNS
+        ]
+        self.results.append((ldap.RES_SEARCH_RESULT, [], 1, []))
+        return 1
+
+    def result3(self, msgid, all=1):
+        if all:
+            entries = [entry for _objtype, res_list, _res_id, _res_ctrls
+                       in self.results for entry in res_list]
+            self.results = []
+            return ldap.RES_SEARCH_RESULT, entries, 1, []
+        return self.results.pop(0)
+
+    def abandon(self, msgid):
+        self.results = []
+
+    def modify_s(self, dn, modlist):
+        self.modlists.append((dn, modlist))
+        time.sleep(self.delay)
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    def delete_s(self, dn):
+        self.modify_s(dn, None)
+
+
+class FakeLDAPClient(ipaldap.LDAPClient):
+    def __init__(self):
+        super(FakeLDAPClient, self).__init__(None, no_schema=True)
+
+    def _connect(self):
+        return FakeConnection()
+
+
+@pytest.fixture
+def tracer():
+    operations = []
+    ipaldap.add_tracer(operations.append)
+    yield operations
+    ipaldap.remove_tracer(operations.append)
+
+
+def test_trace_search(tracer):
+    conn = FakeLDAPClient()
+    entries, truncated = conn.find_entries(base_dn=BASE_DN,
+                                           filter='(uid=user*)')
+    assert len(entries) == 3
+    assert not truncated
+
+    op, = tracer
+    assert op.as_dict() == dict(
+        operation='search',
+        dn=str(BASE_DN),
+        scope='sub',
+        filter='(uid=user*)',
+        count=3,
+        truncated=False,
+        duration=op.duration,
+    )
+
+    # get_entry() is a base search; an early close() still traces it
+    conn.get_entry(USER_DNS[0])
+    result = conn.find_entries_iter(base_dn=BASE_DN)
+    next(result)
+    result.close()
+    assert [(op.scope, op.filter, op.count) for op in tracer[1:]] == [
+        (ldap.SCOPE_BASE, '(objectClass=*)', 3),
+        (ldap.SCOPE_SUBTREE, '(objectClass=*)', 1),
+    ]
+
+
+def test_trace_search_sorted(tracer):
+    conn = FakeLDAPClient()
+    entries = conn.find_entries_sorted('uid', 2, base_dn=BASE_DN,
+                                       filter='(uid=user*)')
+    assert [entry.dn for entry in entries] == USER_DNS[:2]
+
+    op, = tracer
+    assert (op.operation, op.dn, op.scope, op.filter, op.count) == (
+        'search', BASE_DN, ldap.SCOPE_SUBTREE, '(uid=user*)', 2)
+
+
+def test_trace_modify(tracer):
+    conn = FakeLDAPClient()
+    conn.modify_s(USER_DNS[0], [(ldap.MOD_REPLACE, 'cn', [u'name'])])
+    conn.conn.error = ldap.NO_SUCH_OBJECT({'desc': 'No such object'})
+    with pytest.raises(errors.NotFound):
+        conn.delete_entry(USER_DNS[1])
+
+    assert [(op.operation, op.dn, op.error) for op in tracer] == [
+        ('modify', USER_DNS[0], None),
+        ('delete', USER_DNS[1], 'NotFound'),
+    ]
+
+
+def test_slow_query_log(caplog):
+    conn = FakeLDAPClient()
+    conn.conn.delay = 0.01
+    with caplog.at_level(logging.WARNING, logger=ipaldap.__name__):
+        conn.delete_entry(USER_DNS[0])
+        assert not caplog.records
+
+        conn.slow_query_threshold = 5
+        conn.delete_entry(USER_DNS[0])
+    assert len(caplog.records) == 1
+    message = caplog.records[0].getMessage()
+    assert message.startswith('Slow LDAP operation: ')
+    assert 'operation=delete' in message
+
+
+def test_command_timer():
+    timer = timing.CommandTimer(u'user_find')
+    context.command_timer = timer
+    try:
+        conn = FakeLDAPClient()
+        conn.find_entries(base_dn=BASE_DN)
+        conn.modify_s(USER_DNS[0], [(ldap.MOD_REPLACE, 'cn', [u'name'])])
+    finally:
+        timing.detach(timer)
+
+    summary = timer.as_dict()
+    assert summary['ldap_ops'] == 2
+    assert summary['ldap']['entries'] == 3
+    assert summary['ldap']['truncated'] == 0
+    assert sorted(op['operation'] for op in summary['ldap']['slowest']) == [
+        'modify', 'search']
@@ -0,0 +1,128 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the CA ACL evaluation of `ipaserver.plugins.cert`.
+"""
+
+import pytest
+
+from ipalib.frontend import ResultCache
+from ipapython.kerberos import Principal
+from ipaserver.plugins import cert
+
+pytestmark = pytest.mark.tier0
+
+USER = Principal(u'alice@EXAMPLE.COM')
+HOST = Principal(u'host/web.example.com@EXAMPLE.COM')
+SERVICE = Principal(u'HTTP/web.example.com@EXAMPLE.COM')
+
+
+def make_acl(name, enabled=True, **attrs):
+    acl = {'cn': [name], 'ipaenabledflag': [enabled]}
+    acl.update(attrs)
+    return acl
+
+
+ACLS = [
+    make_acl(u'users_smime', memberuser_group=[u'mail'],
+             ipamembercertprofile_certprofile=[u'smime']),
+    make_acl(u'hosts_all', hostcategory=[u'all'],
+             ipacertprofilecategory=[u'all'],
+             ipamemberca_ca=[u'ipa', u'sub']),
+    make_acl(u'services_disabled', enabled=False,
+             servicecategory=[u'all'], ipacacategory=[u'all'],
+             ipacertprofilecategory=[u'all']),
+    make_acl(u'web', memberservice_service=[SERVICE],
+             ipacacategory=[u'all'],
+             ipamembercertprofile_certprofile=[u'caIPAserviceCert']),
+]
+
+
+class FakeCommands(object):
+    def __init__(self):
+        self.calls = []
+
+    def caacl_find(self, no_members=True):
+        self.calls.append('caacl_find')
+        return dict(result=ACLS)
+
+    def user_show(self, uid):
+        self.calls.append('user_show')
+        return dict(result=dict(memberof_group=[u'ipausers'],
+                                memberofindirect_group=[u'mail']))
+
+    def host_show(self, fqdn):
+        self.calls.append('host_show')
+        return dict(result=dict())
+
+
+class FakeCAACL(object):
+    def __init__(self, ttl):
+        self.rule_cache = ResultCache(maxsize=3, ttl=ttl)
+        self.group_cache = ResultCache(maxsize=10, ttl=ttl)
+
+    def invalidate_rule_cache(self):
+        self.rule_cache.clear()
+
+
+class FakeObjects(object):
+    def __init__(self, ttl):
+        self.caacl = FakeCAACL(ttl)
+
+
+class FakeAPI(object):
+    def __init__(self, ttl):
+        self.Command = FakeCommands()
+        self.Object = FakeObjects(ttl)
+
+
+@pytest.fixture
+def api(monkeypatch):
+    api = FakeAPI(ttl=60)
+    monkeypatch.setattr(cert, 'api', api)
+    return api
+
+
+@pytest.mark.parametrize('principal, ca, profile, allowed', [
+    (USER, u'ipa', u'smime', True),
+    (USER, u'ipa', u'caIPAserviceCert', False),
+    (USER, u'sub', u'smime', False),
+    (HOST, u'sub', u'caIPAserviceCert', True),
+    (HOST, u'other', u'caIPAserviceCert', False),
+    (SERVICE, u'sub', u'caIPAserviceCert', True),
+    (SERVICE, u'ipa', u'smime', False),
+])
+def test_acl_evaluate(api, principal, ca, profile, allowed):
+    assert cert.acl_evaluate(principal, ca, profile) == allowed
+
+
+def test_index(api):
+    compiled = cert.CompiledCAACLs('service', ACLS)
+    assert [rule.name for rule in compiled.get_rules(
+        u'sub', u'caipaservicecert')] == [u'hosts_all', u'web']
+    assert compiled.get_rules(u'sub', u'smime') == [
+        compiled.index[u'sub', cert.ACL_CATEGORY_ALL][0]]
+
+
+def test_cache(api):
+    for _i in range(3):
+        assert cert.acl_evaluate(USER, u'ipa', u'smime')
+    assert api.Command.calls == ['caacl_find', 'user_show']
+
+    # no rule for the CA and profile, groups are not needed
+    assert not cert.acl_evaluate(HOST, u'other', u'smime')
+    assert api.Command.calls[2:] == ['caacl_find']
+
+    api.Object.caacl.invalidate_rule_cache()
+    assert cert.acl_evaluate(USER, u'ipa', u'smime')
+    assert api.Command.calls[3:] == ['caacl_find']
+
+
+def test_cache_disabled(monkeypatch):
+    api = FakeAPI(ttl=0)
+    monkeypatch.setattr(cert, 'api', api)
+    for _i in range(2):
+        assert cert.acl_evaluate(USER, u'ipa', u'smime')
+    assert api.Command.calls == ['caacl_find', 'user_show'] * 2
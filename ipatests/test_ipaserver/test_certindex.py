@@ -0,0 +1,350 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+"""
+Test the certificate index of `ipaserver.plugins.certindex`.
+"""
+import datetime
+import functools
+import threading
+import time
+
+import pytest
+
+from ipalib.request import context
+from ipapython.dn import DN
+from ipaserver.plugins import cert, certindex
+
+pytestmark = pytest.mark.tier0
+
+ISSUER = DN(('cn', 'Certificate Authority'), ('o', 'EXAMPLE.COM'))
+SUB_ISSUER = DN(('cn', 'Sub CA'), ('o', 'EXAMPLE.COM'))
+ALICE = DN(('uid', 'alice'), ('cn', 'users'), ('dc', 'example'))
+WEB = DN(('fqdn', 'web.example.com'), ('cn', 'computers'), ('dc', 'example'))
+
+DAY = 24 * 60 * 60 * 1000
+
+
+def subject(cn):
+    return DN(('cn', cn), ('o', 'EXAMPLE.COM'))
+
+
+CERTS = [
+    (ISSUER, 1, subject(u'Certificate Authority'), 0, 3650 * DAY, u'VALID'),
+    (ISSUER, 2, subject(u'web.example.com'), 10 * DAY, 375 * DAY, u'VALID'),
+    (ISSUER, 3, subject(u'alice'), 20 * DAY, 385 * DAY, u'REVOKED'),
+    (SUB_ISSUER, 2, subject(u'Web_Mail'), 30 * DAY, 395 * DAY, u'VALID'),
+    # serial numbers are up to 128 bits
+    (ISSUER, 2 ** 127, subject(u'big'), 40 * DAY, 405 * DAY, u'VALID'),
+]
+
+OWNERS = [
+    (ISSUER, 2, WEB),
+    (ISSUER, 3, ALICE),
+    (SUB_ISSUER, 2, WEB),
+]
+
+
+class FakeEnv(object):
+    cert_index_sync_interval = 600
+
+
+class FakeAPI(object):
+    def __init__(self, env):
+        self.env = env
+
+
+@pytest.fixture
+def index(tmpdir):
+    env = FakeEnv()
+    env.cert_index_db = str(tmpdir.join('certindex.db'))
+    index = certindex.cert_index(FakeAPI(env))
+    assert index.reconcile(CERTS, OWNERS)
+    return index
+
+
+def serials(rows):
+    return [(issuer, serial_number)
+            for issuer, serial_number, _subject, _nb, _na, _status, _owners
+            in rows]
+
+
+def test_find(index):
+    rows = index.find()
+    assert serials(rows) == [
+        (ISSUER, 1), (ISSUER, 2), (SUB_ISSUER, 2), (ISSUER, 3),
+        (ISSUER, 2 ** 127)]
+    assert rows[1] == CERTS[1] + ([WEB],)
+    assert rows[0][-1] == []
+
+
+@pytest.mark.parametrize('kw, expected', [
+    (dict(issuer=SUB_ISSUER), [(SUB_ISSUER, 2)]),
+    (dict(subject=u'WEB'), [(ISSUER, 2), (SUB_ISSUER, 2)]),
+    (dict(subject=u'web', exactly=True), []),
+    (dict(subject=u'web.example.com', exactly=True), [(ISSUER, 2)]),
+    # LIKE wildcards are matched literally
+    (dict(subject=u'b_m'), [(SUB_ISSUER, 2)]),
+    (dict(subject=u'%'), []),
+    (dict(min_serial_number=3), [(ISSUER, 3), (ISSUER, 2 ** 127)]),
+    (dict(min_serial_number=2, max_serial_number=2),
+     [(ISSUER, 2), (SUB_ISSUER, 2)]),
+    (dict(not_after_to=385 * DAY), [(ISSUER, 2), (ISSUER, 3)]),
+    (dict(not_before_from=20 * DAY, not_after_from=395 * DAY),
+     [(SUB_ISSUER, 2), (ISSUER, 2 ** 127)]),
+])
+def test_find_filter(index, kw, expected):
+    assert serials(index.find(**kw)) == expected
+
+
+def test_update(index):
+    new_cert = (ISSUER, 4, subject(u'mail.example.com'), 50 * DAY,
+                415 * DAY, u'VALID')
+    index.add_certificate(new_cert, [(ISSUER, 4, WEB)])
+    index.set_status(ISSUER, 2, u'REVOKED')
+
+    rows = index.find(min_serial_number=4, max_serial_number=4)
+    assert rows == [new_cert + ([WEB],)]
+    status = [row[5] for row in index.find(issuer=ISSUER,
+                                           min_serial_number=2,
+                                           max_serial_number=2)]
+    assert status == [u'REVOKED']
+
+
+def test_reconcile(index, monkeypatch):
+    # certificates and owners which were removed are dropped
+    assert index.is_current()
+    index.reconcile(CERTS[:2], OWNERS[:1])
+    assert serials(index.find()) == [(ISSUER, 1), (ISSUER, 2)]
+    assert index.find()[1][-1] == [WEB]
+
+    monkeypatch.setattr(FakeEnv, 'cert_index_sync_interval', 0)
+    assert not index.is_current()
+
+
+def test_reconcile_concurrent(index):
+    with index._connect() as conn:
+        index._set_meta(conn, 'sync_started', time.time())
+
+    def certs():
+        raise AssertionError('certificates retrieved')
+        yield  # pylint: disable=unreachable
+
+    assert not index.reconcile(certs(), [])
+
+
+def test_reconcile_keeps_updates(index):
+    new_cert = (ISSUER, 4, subject(u'mail.example.com'), 50 * DAY,
+                415 * DAY, u'VALID')
+
+    def certs():
+        # issued while Dogtag is searched
+        index.add_certificate(new_cert)
+        for cert in CERTS:
+            yield cert
+
+    assert index.reconcile(certs(), OWNERS)
+    assert (ISSUER, 4) in serials(index.find())
+
+
+class FakeNamespace(object):
+    def __init__(self, **kw):
+        self.__dict__.update(kw)
+
+
+class FakeOwner(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeCertObject(object):
+    def _owners(self):
+        return [(FakeOwner(u'user'), None), (FakeOwner(u'host'), None)]
+
+
+class FakeCertFind(object):
+    _index_search = cert.cert_find.__dict__['_index_search']
+    _index_sub_searches = cert.cert_find.__dict__['_index_sub_searches']
+    _index_reconcile_start = cert.cert_find.__dict__['_index_reconcile_start']
+    _index_reconcile_thread = (
+        cert.cert_find.__dict__['_index_reconcile_thread'])
+
+    obj = FakeCertObject()
+
+    def __init__(self, index, ca_subjects=(ISSUER, SUB_ISSUER)):
+        self.api = FakeNamespace(
+            Backend=FakeNamespace(cert_index=index),
+            Command=FakeNamespace(ca_find=lambda **kw: dict(result=[
+                {'ipacasubjectdn': [subject_dn], 'cn': [u'ca%d' % i]}
+                for i, subject_dn in enumerate(ca_subjects)])),
+        )
+        self.reconciles = []
+
+    def _cert_search(self, **options):
+        raise AssertionError('not called')
+
+    def _ldap_search(self, **options):
+        raise AssertionError('not called')
+
+    def _index_reconcile(self):
+        self.reconciles.append(
+            (getattr(context, 'ca_enabled', None),
+             self.api.Backend.ldap2.server))
+        return True
+
+
+def index_search(find, **options):
+    items, truncated, complete = find._index_search(
+        all=False, raw=False, pkey_only=False, no_members=False, **options)
+    assert not truncated
+    return dict(items), complete
+
+
+def test_index_search(index):
+    find = FakeCertFind(index, ca_subjects=[ISSUER])
+    result, complete = index_search(find, owners=True)
+    assert not complete
+    # certificates of unknown CAs are left out
+    assert list(result) == [(ISSUER, 1), (ISSUER, 2), (ISSUER, 3),
+                            (ISSUER, 2 ** 127)]
+
+    obj = result[ISSUER, 2]
+    assert obj['serial_number'] == 2
+    assert obj['serial_number_hex'] == u'0x2'
+    assert obj['issuer'] == ISSUER
+    assert obj['subject'] == subject(u'web.example.com')
+    assert obj['valid_not_before'] == cert.convert_pkidatetime(10 * DAY)
+    assert obj['valid_not_after'] == cert.convert_pkidatetime(375 * DAY)
+    assert not obj['revoked']
+    assert obj['owner'] == [WEB]
+    assert obj['cacn'] == u'ca0'
+    assert result[ISSUER, 3]['revoked']
+    assert 'owner' not in result[ISSUER, 1]
+
+    # the owners are merged from the LDAP search
+    result, _complete = index_search(find, owners=False)
+    assert 'owner' not in result[ISSUER, 2]
+
+    items, _truncated, _complete = find._index_search(
+        all=False, raw=True, pkey_only=True, no_members=False, owners=True)
+    assert dict(items)[ISSUER, 2] == dict(serial_number=2, cacn=u'ca0')
+
+
+@pytest.mark.parametrize('options, expected', [
+    (dict(subject=u'web'), [(ISSUER, 2), (SUB_ISSUER, 2)]),
+    (dict(exactly=True, subject=u'web.example.com'), [(ISSUER, 2)]),
+    (dict(issuer=SUB_ISSUER), [(SUB_ISSUER, 2)]),
+    (dict(min_serial_number=3), [(ISSUER, 3), (ISSUER, 2 ** 127)]),
+])
+def test_index_search_options(index, options, expected):
+    result, complete = index_search(
+        FakeCertFind(index), owners=True, **options)
+    assert complete
+    assert sorted(result, key=lambda key: key[1]) == expected
+
+
+def test_index_search_dates(index, monkeypatch):
+    calls = []
+
+    def find(**kw):
+        calls.append(kw)
+        return []
+
+    monkeypatch.setattr(index, 'find', find)
+    index_search(
+        FakeCertFind(index), owners=True,
+        validnotafter_from=datetime.datetime(2018, 5, 1, 13, 30),
+        validnotbefore_to=datetime.datetime(2018, 5, 2))
+
+    # only the date is used, like Dogtag does
+    def date(year, month, day):
+        return int(time.mktime((year, month, day, 0, 0, 0, 0, 0, -1)) * 1000)
+
+    assert calls == [dict(exactly=False,
+                          not_after_from=date(2018, 5, 1),
+                          not_before_to=date(2018, 5, 2))]
+
+
+class test_index_sub_searches(object):
+    @pytest.fixture(autouse=True)
+    def find(self, index):
+        self.find = FakeCertFind(index)
+        self.index = index
+
+    def sub_searches(self, ca_enabled=True, **options):
+        options.setdefault('version', u'2.230')
+        return self.find._index_sub_searches(ca_enabled, options)
+
+    def assert_index_search(self, sub_search, owners):
+        assert isinstance(sub_search, functools.partial)
+        # pylint: disable=comparison-with-callable
+        assert sub_search.func == self.find._index_search
+        assert sub_search.keywords == dict(owners=owners)
+
+    def test_disabled(self, monkeypatch):
+        assert self.sub_searches(ca_enabled=False) is None
+        monkeypatch.setattr(self.index.api.env, 'cert_index_db', None)
+        assert self.sub_searches() is None
+
+    def test_unsupported_option(self):
+        assert self.sub_searches(revocation_reason=1) is None
+        assert self.sub_searches(issuedon_from=datetime.datetime.now()) is None
+
+    def test_ca_options(self):
+        for options in (dict(issuer=ISSUER), dict(exactly=True),
+                        dict(subject=u'web', cacn=u'ipa')):
+            cert_search, index_search = self.sub_searches(**options)
+            # pylint: disable=comparison-with-callable
+            assert cert_search == self.find._cert_search
+            self.assert_index_search(index_search, owners=True)
+
+    def test_owner_options(self):
+        for options in (dict(), dict(user=[u'alice']),
+                        dict(no_host=[u'web.example.com'], issuer=ISSUER)):
+            cert_search, index_search, ldap_search = (
+                self.sub_searches(**options))
+            # pylint: disable=comparison-with-callable
+            assert cert_search == self.find._cert_search
+            self.assert_index_search(index_search, owners=False)
+            assert ldap_search == self.find._ldap_search
+
+    def test_not_current(self, monkeypatch):
+        started = []
+        monkeypatch.setattr(self.find, '_index_reconcile_start',
+                            lambda: started.append(True))
+        monkeypatch.setattr(FakeEnv, 'cert_index_sync_interval', 0)
+        assert self.sub_searches(issuer=ISSUER) is None
+        assert started == [True]
+        assert self.find.reconciles == []
+
+
+class FakeLDAP(object):
+    def __init__(self):
+        self.server = False
+
+    def connect_as_server(self, **kw):
+        self.server = True
+
+
+def test_index_reconcile_start(index):
+    find = FakeCertFind(index)
+    find.api.Backend.ldap2 = FakeLDAP()
+
+    # pylint: disable=protected-access
+    with cert._index_reconcile_lock:
+        # already reconciled by this process
+        find._index_reconcile_start()
+        assert find.reconciles == []
+
+    find._index_reconcile_start()
+    for _i in range(50):
+        if find.reconciles:
+            break
+        time.sleep(0.1)
+    # reconciled in another thread, bound as the server
+    assert find.reconciles == [(True, True)]
+    assert not hasattr(context, 'ca_enabled')
+
+    # the lock is released once the thread is done
+    assert cert._index_reconcile_lock.acquire(True)
+    cert._index_reconcile_lock.release()
@@ -0,0 +1,170 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the bulk group member updates of `ipaserver.plugins.ldap2`.
+"""
+
+import ldap as _ldap
+import pytest
+
+from ipalib import errors
+from ipapython.dn import DN
+from ipaserver.plugins.ldap2 import ldap2
+
+pytestmark = pytest.mark.tier0
+
+GROUP_DN = DN(('cn', 'group1'), ('cn', 'groups'), ('dc', 'example'))
+USER_DNS = [DN(('uid', 'user%d' % i), ('cn', 'users'), ('dc', 'example'))
+            for i in range(4)]
+
+
+class FakeEnv(object):
+    context = 'cli'
+
+
+class FakeAPI(object):
+    env = FakeEnv()
+
+
+class FakeConnection(object):
+    def __init__(self, members):
+        self.members = set(str(dn).encode('utf-8') for dn in members)
+        self.modlists = []
+
+    def modify_s(self, dn, modlist):
+        self.modlists.append((dn, modlist))
+        if dn != str(GROUP_DN):
+            raise _ldap.NO_SUCH_OBJECT({'desc': 'No such object'})
+        for op, _attr, values in modlist:
+            if op == _ldap.MOD_ADD:
+                if self.members.intersection(values):
+                    raise _ldap.TYPE_OR_VALUE_EXISTS(
+                        {'desc': 'Type or value exists'})
+                self.members.update(values)
+            else:
+                if not self.members.issuperset(values):
+                    raise _ldap.NO_SUCH_ATTRIBUTE(
+                        {'desc': 'No such attribute'})
+                self.members.difference_update(values)
+
+
+class FakeLDAP(ldap2):
+    conn = None
+
+    def __init__(self, existing, members):
+        super(FakeLDAP, self).__init__(FakeAPI())
+        self.conn = FakeConnection(members)
+        self.existing = existing
+        self.searches = []
+
+    def get_entry(self, dn, attrs_list=None, time_limit=None,
+                  size_limit=None):
+        # the group members must not be read
+        assert dn != GROUP_DN
+        if dn in self.existing:
+            return self.make_entry(dn)
+        raise errors.NotFound(reason='no such entry')
+
+    def find_entries_iter(self, filter=None, attrs_list=None, base_dn=None,
+                          scope=ldap2.SCOPE_SUBTREE, time_limit=None,
+                          size_limit=None, paged_search=False):
+        self.searches.append(filter)
+        return [self.make_entry(dn) for dn in self.existing
+                if dn[1:] == base_dn and dn[0].value in filter]
+
+
+def failed_errors(failed):
+    return [(dn, type(e)) for dn, e in failed]
+
+
+def encoded(dns):
+    return [str(dn).encode('utf-8') for dn in dns]
+
+
+class test_add_entries_to_group(object):
+    def test_single_modify(self):
+        conn = FakeLDAP(USER_DNS[:3], [])
+        failed = conn.add_entries_to_group(
+            USER_DNS + [USER_DNS[1]], GROUP_DN)
+
+        assert failed_errors(failed) == [
+            (USER_DNS[3], errors.NotFound),
+            (USER_DNS[1], errors.AlreadyGroupMember),
+        ]
+        assert conn.conn.modlists == [
+            (str(GROUP_DN),
+             [(_ldap.MOD_ADD, 'member', encoded(USER_DNS[:3]))]),
+        ]
+
+    def test_same_group(self):
+        conn = FakeLDAP([GROUP_DN], [])
+        failed = conn.add_entries_to_group([GROUP_DN], GROUP_DN)
+        assert failed_errors(failed) == [(GROUP_DN, errors.SameGroupError)]
+        assert conn.conn.modlists == []
+
+        assert conn.add_entries_to_group(
+            [GROUP_DN], GROUP_DN, allow_same=True) == []
+
+    def test_already_member(self):
+        conn = FakeLDAP(USER_DNS, [USER_DNS[0]])
+        failed = conn.add_entries_to_group(USER_DNS[:2], GROUP_DN)
+
+        assert failed_errors(failed) == [
+            (USER_DNS[0], errors.AlreadyGroupMember),
+        ]
+        # the single modify fails, the entries are added one by one
+        assert len(conn.conn.modlists) == 3
+        assert conn.conn.members == set(encoded(USER_DNS[:2]))
+
+    def test_group_not_found(self):
+        conn = FakeLDAP(USER_DNS, [])
+        failed = conn.add_entries_to_group(
+            USER_DNS[:1], DN(('cn', 'missing'), ('dc', 'example')))
+        assert failed_errors(failed) == [(USER_DNS[0], errors.NotFound)]
+        assert len(conn.conn.modlists) == 1
+
+
+class test_remove_entries_from_group(object):
+    def test_single_modify(self):
+        conn = FakeLDAP(USER_DNS, USER_DNS[:2])
+        failed = conn.remove_entries_from_group(
+            USER_DNS[1:2] + [USER_DNS[0], USER_DNS[0]], GROUP_DN)
+
+        assert failed_errors(failed) == [
+            (USER_DNS[0], errors.NotGroupMember),
+        ]
+        assert conn.conn.modlists == [
+            (str(GROUP_DN),
+             [(_ldap.MOD_DELETE, 'member',
+               encoded([USER_DNS[1], USER_DNS[0]]))]),
+        ]
+
+    def test_not_member(self):
+        conn = FakeLDAP(USER_DNS, USER_DNS[:2])
+        failed = conn.remove_entries_from_group(USER_DNS[1:3], GROUP_DN)
+
+        assert failed_errors(failed) == [
+            (USER_DNS[2], errors.NotGroupMember),
+        ]
+        # the single modify fails, the entries are removed one by one
+        assert len(conn.conn.modlists) == 3
+        assert conn.conn.members == set(encoded(USER_DNS[:1]))
+
+    def test_group_not_found(self):
+        conn = FakeLDAP(USER_DNS, [])
+        failed = conn.remove_entries_from_group(
+            USER_DNS[:1], DN(('cn', 'missing'), ('dc', 'example')))
+        assert failed_errors(failed) == [(USER_DNS[0], errors.NotFound)]
+        assert len(conn.conn.modlists) == 1
+
+
+def test_get_existing_dns():
+    host_dn = DN(('fqdn', 'host1.example'), ('cn', 'computers'),
+                 ('dc', 'example'))
+    conn = FakeLDAP(USER_DNS[:3] + [host_dn], [])
+    existing = conn.get_existing_dns(USER_DNS + [host_dn], chunk_size=2)
+
+    assert sorted(existing) == sorted(USER_DNS[:3] + [host_dn])
+    assert len(conn.searches) == 3
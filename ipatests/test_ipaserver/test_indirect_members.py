@@ -0,0 +1,128 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the batched indirect membership resolution of
+`ipaserver.plugins.baseldap`.
+"""
+
+import pytest
+
+from ipapython.dn import DN
+from ipaserver.plugins.baseldap import LDAPObject
+
+pytestmark = pytest.mark.tier0
+
+BASE_DN = DN(('dc', 'example'), ('dc', 'com'))
+
+
+def user_dn(uid):
+    return DN(('uid', uid), ('cn', 'users'), BASE_DN)
+
+
+def group_dn(cn):
+    return DN(('cn', cn), ('cn', 'groups'), BASE_DN)
+
+
+class FakeEntry(object):
+    def __init__(self, dn, **raw):
+        self.dn = dn
+        self.raw = {
+            attr: [str(value).encode('utf-8') for value in values]
+            for attr, values in raw.items()
+        }
+
+
+class FakeResult(list):
+    truncated = False
+
+
+class FakeBackend(object):
+    MATCH_ANY = '|'
+
+    def __init__(self, groups):
+        self.groups = groups
+        self.searches = []
+
+    def make_filter(self, kw, rules):
+        dns, = {tuple(dns) for dns in kw.values()}
+        return {str(dn).lower().encode('utf-8') for dn in dns}
+
+    def find_entries_iter(self, filter, attrs_list, base_dn, size_limit,
+                          paged_search):
+        self.searches.append((len(filter), attrs_list))
+        result = FakeResult()
+        for group in self.groups:
+            members = {value.lower() for value in group.raw.get('member', [])}
+            if members & filter:
+                result.append(FakeEntry(group.dn))
+                result[-1].raw = {
+                    attr: group.raw[attr] for attr in attrs_list
+                    if attr in group.raw}
+        return result
+
+    def handle_truncated_result(self, truncated):
+        pass
+
+
+class FakeEnv(object):
+    basedn = BASE_DN
+
+
+class FakeAPI(object):
+    env = FakeEnv()
+
+
+class FakeObject(object):
+    indirect_members_batch_size = 2
+    api = FakeAPI()
+
+    _iter_batch_search = LDAPObject.__dict__['_iter_batch_search']
+    get_memberofindirect_batch = (
+        LDAPObject.__dict__['get_memberofindirect_batch'])
+
+    def __init__(self, backend):
+        self.backend = backend
+
+
+def test_memberofindirect_batch():
+    groups = [
+        FakeEntry(group_dn('ipausers'),
+                  member=[user_dn('alice'), user_dn('bob')]),
+        # alice is a direct member of g2 and a member through g1
+        FakeEntry(group_dn('g1'), member=[user_dn('alice')],
+                  memberof=[group_dn('g2'), group_dn('g3')]),
+        FakeEntry(group_dn('g2'), member=[group_dn('g1'), user_dn('alice')]),
+        FakeEntry(group_dn('g3'), member=[group_dn('g1')]),
+        FakeEntry(group_dn('g4'), member=[group_dn('g5')]),
+        FakeEntry(group_dn('g5'), member=[user_dn('bob')],
+                  memberof=[group_dn('g4')]),
+    ]
+    entries = [
+        FakeEntry(user_dn('alice'), memberof=[
+            group_dn('ipausers'), group_dn('g1'), group_dn('g2'),
+            group_dn('g3')]),
+        FakeEntry(user_dn('bob'), memberof=[
+            group_dn('ipausers'), group_dn('g4'), group_dn('g5')]),
+        FakeEntry(user_dn('carol')),
+    ]
+    backend = FakeBackend(groups)
+    FakeObject(backend).get_memberofindirect_batch(entries)
+
+    def memberof(entry, attr):
+        return [DN(value.decode('utf-8'))
+                for value in entry.raw.get(attr, [])]
+
+    alice, bob, carol = entries
+    assert memberof(alice, 'memberof') == [
+        group_dn('ipausers'), group_dn('g1'), group_dn('g2')]
+    assert memberof(alice, 'memberofindirect') == [group_dn('g3')]
+    assert memberof(bob, 'memberof') == [group_dn('ipausers'), group_dn('g5')]
+    assert memberof(bob, 'memberofindirect') == [group_dn('g4')]
+    assert memberof(carol, 'memberof') == []
+    assert 'memberofindirect' not in carol.raw
+
+    # member values are never retrieved; only alice is searched separately
+    assert backend.searches == [
+        (2, ['memberof']), (1, ['memberof']), (1, [''])]
@@ -137,6 +137,43 @@ class test_ldap(object):
         cert = entry_attrs.get('usercertificate')[0]
         assert cert.serial_number is not None
 
+    def test_find_entries_iter(self):
+        """
+        Test streaming search using ldap2
+        """
+        self.conn = ldap2(api)
+        self.conn.connect(autobind=AUTOBIND_DISABLED)
+        base_dn = DN(api.env.container_accounts, api.env.basedn)
+
+        entries, truncated = self.conn.find_entries(
+            attrs_list=['objectclass'], base_dn=base_dn, paged_search=True)
+        result = self.conn.find_entries_iter(
+            attrs_list=['objectclass'], base_dn=base_dn, paged_search=True)
+        assert result.truncated is None
+        streamed = list(result)
+        assert result.truncated == truncated
+        assert result.count == len(entries)
+        assert [e.dn for e in streamed] == [e.dn for e in entries]
+
+        # stopping early must not break the connection
+        result = self.conn.find_entries_iter(base_dn=base_dn)
+        next(result)
+        result.close()
+        assert result.truncated is None
+        assert self.conn.entry_exists(base_dn)
+
+    def test_find_entries_iter_empty(self):
+        """
+        Test that streaming search does not raise on an empty result
+        """
+        self.conn = ldap2(api)
+        self.conn.connect(autobind=AUTOBIND_DISABLED)
+        result = self.conn.find_entries_iter(
+            filter='(objectclass=nonexistentobjectclass)',
+            base_dn=api.env.basedn)
+        assert list(result) == []
+        assert result.truncated is False
+
 
 @pytest.mark.tier0
 @pytest.mark.needs_ipaapi
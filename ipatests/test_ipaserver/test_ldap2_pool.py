@@ -0,0 +1,146 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the LDAP connection pool of `ipaserver.plugins.ldap2`.
+"""
+
+import os
+
+import pytest
+
+import ldap
+
+from ipalib.request import context
+from ipaserver.plugins import ldap2 as ldap2_module
+from ipaserver.plugins.ldap2 import LDAPConnectionPool, ldap2
+
+pytestmark = pytest.mark.tier0
+
+
+class FakeConnection(object):
+    def __init__(self, alive=True):
+        self.alive = alive
+        self.unbound = False
+
+    def whoami_s(self):
+        if not self.alive:
+            raise ldap.SERVER_DOWN()
+        return 'dn: uid=admin'
+
+    def unbind_s(self):
+        self.unbound = True
+
+
+KEY = ('/tmp/krb5cc_test', 'admin@EXAMPLE.COM')
+OTHER_KEY = ('/tmp/krb5cc_other', 'user@EXAMPLE.COM')
+
+
+class test_LDAPConnectionPool(object):
+    def test_reuse(self):
+        pool = LDAPConnectionPool(maxsize=2, idle_timeout=300)
+        assert pool.get(KEY) is None
+
+        conn = FakeConnection()
+        pool.add(KEY, conn)
+        assert pool.release(conn)
+        assert pool.get(OTHER_KEY) is None
+        assert pool.get(KEY) is conn
+        assert not conn.unbound
+
+        assert pool.stats() == dict(
+            hits=1, misses=2, discarded=0, idle=0, leased=1)
+
+    def test_release_unknown(self):
+        pool = LDAPConnectionPool(maxsize=2, idle_timeout=300)
+        assert not pool.release(FakeConnection())
+
+    def test_health_check(self):
+        pool = LDAPConnectionPool(maxsize=2, idle_timeout=300)
+        conn = FakeConnection()
+        pool.add(KEY, conn)
+        pool.release(conn)
+        conn.alive = False
+
+        assert pool.get(KEY) is None
+        assert conn.unbound
+        assert pool.stats()['discarded'] == 1
+
+    def test_maxsize(self):
+        pool = LDAPConnectionPool(maxsize=1, idle_timeout=300)
+        first, second = FakeConnection(), FakeConnection()
+        pool.add(KEY, first)
+        pool.add(KEY, second)
+        pool.release(first)
+        pool.release(second)
+
+        assert first.unbound
+        assert not second.unbound
+        assert pool.get(KEY) is second
+
+    def test_idle_timeout(self):
+        pool = LDAPConnectionPool(maxsize=2, idle_timeout=-1)
+        conn = FakeConnection()
+        pool.add(KEY, conn)
+        pool.release(conn)
+
+        assert conn.unbound
+        assert pool.get(KEY) is None
+
+    def test_clear(self):
+        pool = LDAPConnectionPool(maxsize=2, idle_timeout=300)
+        conn = FakeConnection()
+        pool.add(KEY, conn)
+        pool.release(conn)
+        pool.clear()
+
+        assert conn.unbound
+        assert pool.stats()['idle'] == 0
+
+
+class FakeCredentials(object):
+    name = KEY[1]
+
+
+class FakeBackend(object):
+    ldap_uri = 'ldap://ipa.example.test'
+    _force_schema_updates = False
+
+    def __init__(self, pool):
+        self.connection_pool = pool
+
+
+class test_create_connection(object):
+    @pytest.fixture(autouse=True)
+    def pool(self, monkeypatch):
+        self.pool = LDAPConnectionPool(maxsize=2, idle_timeout=300)
+        self.conn = FakeConnection()
+        self.pool.add(KEY, self.conn)
+        self.pool.release(self.conn)
+
+        def new_client(*args, **kwargs):
+            raise AssertionError('new connection')
+
+        monkeypatch.setattr(ldap2_module, 'LDAPClient', new_client)
+        monkeypatch.setenv('KRB5CCNAME', OTHER_KEY[0])
+        yield
+        context.__dict__.pop('principal', None)
+
+    def create_connection(self, monkeypatch, creds):
+        monkeypatch.setattr(
+            ldap2_module.krb_utils, 'get_credentials_if_valid',
+            lambda ccache_name: creds)
+        return ldap2.create_connection(FakeBackend(self.pool), ccache=KEY[0])
+
+    def test_pool_hit(self, monkeypatch):
+        conn = self.create_connection(monkeypatch, FakeCredentials())
+        assert conn is self.conn
+        assert os.environ['KRB5CCNAME'] == KEY[0]
+        assert context.principal == KEY[1]
+
+    def test_expired_ticket(self, monkeypatch):
+        # the pooled connection outlived the ticket, a new bind fails
+        with pytest.raises(AssertionError):
+            self.create_connection(monkeypatch, None)
+        assert self.pool.stats()['idle'] == 1
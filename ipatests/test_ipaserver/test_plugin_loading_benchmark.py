@@ -0,0 +1,90 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+"""
+Startup benchmark for the lazy plugin loading
+
+The benchmark measures the wall time and memory of ``api.finalize()`` with
+the server plugins, with the modules imported eagerly and from the plugin
+index in the lazy mode, and the time to the first command lookup. Every
+measurement runs in a fresh interpreter. The benchmark only runs with
+``--run-benchmarks``; add ``-s`` to see the timings.
+"""
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from ipatests.util import report_benchmark
+
+pytestmark = pytest.mark.benchmark
+
+CHILD = textwrap.dedent("""
+    import json
+    import sys
+    import time
+
+    try:
+        import tracemalloc
+    except ImportError:
+        tracemalloc = None
+        import resource
+
+    from ipalib import api
+
+    api.bootstrap(
+        context='cli',
+        in_server=True,
+        in_tree=True,
+        plugins_on_demand=True,
+        lazy_plugins=sys.argv[1] == 'lazy',
+        confdir=sys.argv[2],
+        realm='EXAMPLE.COM',
+        domain='example.com',
+        enable_ra=True,
+    )
+    if tracemalloc is not None:
+        tracemalloc.start()
+    start = time.time()
+    api.finalize()
+    finalize = time.time() - start
+    if tracemalloc is not None:
+        memory = tracemalloc.get_traced_memory()[1] // 1024
+    else:
+        memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    api.Command.user_show.args
+    first = time.time() - start
+    print(json.dumps(dict(
+        finalize=finalize,
+        first=first,
+        memory=memory,
+        modules=len([m for m in sys.modules
+                     if m.startswith('ipaserver.plugins.')]),
+    )))
+""")
+
+
+def _measure(mode, tmpdir):
+    env = dict(os.environ)
+    env['XDG_CACHE_HOME'] = str(tmpdir.join('cache'))
+    env['PYTHONPATH'] = os.pathsep.join(sys.path)
+    output = subprocess.check_output(
+        [sys.executable, '-c', CHILD, mode, str(tmpdir)], env=env)
+    return json.loads(output.decode('utf-8').splitlines()[-1])
+
+
+def test_finalize(tmpdir):
+    pytest.importorskip('ipaserver.plugins')
+
+    eager = _measure('eager', tmpdir)
+    # the first run in the lazy mode imports all modules to build the index
+    _measure('lazy', tmpdir)
+    lazy = _measure('lazy', tmpdir)
+
+    assert lazy['modules'] < eager['modules']
+    report_benchmark('api.finalize()', eager['finalize'], lazy['finalize'], 's')
+    report_benchmark('first command lookup', eager['first'], lazy['first'], 's')
+    report_benchmark('api.finalize() memory', eager['memory'], lazy['memory'], 'K')
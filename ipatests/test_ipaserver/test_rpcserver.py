@@ -28,6 +28,7 @@ import six
 
 from ipatests.util import assert_equal, raises, PluginTester
 from ipalib import errors
+from ipalib.request import context
 from ipaserver import rpcserver
 
 if six.PY3:
@@ -261,3 +262,47 @@ class test_jsonserver(PluginTester):
         options = dict(givenname=u'John', sn='Doe')
         d = dict(method=u'user_add', params=(args, options), id=18)
         assert o.unmarshal(json.dumps(d)) == (u'user_add', args, options, 18)
+
+    def test_marshal(self):
+        """
+        Test the `ipaserver.rpcserver.jsonserver.marshal` method.
+        """
+        o, _api, _home = self.instance('Backend', in_server=True)
+
+        # small responses are encoded at once
+        response = o.marshal(dict(value=u'admin'), None, 18)
+        assert isinstance(response, bytes)
+        assert json.loads(response.decode('utf-8'))['result'] == dict(
+            value=u'admin')
+
+        # large responses are returned in chunks
+        entries = [dict(uid=[u'user%d' % i], description=[u'x' * 100])
+                   for i in range(2000)]
+        result = dict(result=entries)
+        response = o.marshal(result, None, 18)
+        assert not isinstance(response, bytes)
+        chunks = list(response)
+        assert len(chunks) > 2
+        data = json.loads(b''.join(chunks).decode('utf-8'))
+        assert data['result'] == result
+
+
+def test_close_context_after():
+    """
+    Test the `ipaserver.rpcserver.close_context_after` function.
+    """
+    context.test_value = 1
+    assert rpcserver.close_context_after([b'response']) == [b'response']
+    assert not hasattr(context, 'test_value')
+
+    # chunked responses keep the context until they are closed
+    def chunks():
+        yield b'a'
+        yield str(context.test_value).encode('utf-8')
+
+    context.test_value = 2
+    response = rpcserver.close_context_after(chunks())
+    assert list(response) == [b'a', b'2']
+    assert context.test_value == 2
+    response.close()
+    assert not hasattr(context, 'test_value')
@@ -0,0 +1,216 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the paging helpers of `ipaserver.plugins.baseldap`.
+"""
+
+import base64
+import json
+
+import pytest
+
+from ipalib import errors
+from ipapython.dn import DN
+from ipaserver.plugins.baseldap import (
+    BaseLDAPCommand, LDAPSearch, get_search_id, encode_search_cursor,
+    decode_search_cursor, select_page)
+
+pytestmark = pytest.mark.tier0
+
+
+def identity(item):
+    return item
+
+
+class test_search_cursor(object):
+    def test_roundtrip(self):
+        search_id = get_search_id('user_find', u'(uid=*)')
+        cursor = encode_search_cursor(search_id, 20, u'uid=tuser,cn=users')
+        assert decode_search_cursor(cursor, search_id) == (
+            20, u'uid=tuser,cn=users')
+
+    def test_other_search(self):
+        cursor = encode_search_cursor(
+            get_search_id('user_find', u'(uid=*)'), 20, u'uid=tuser')
+        with pytest.raises(errors.ValidationError):
+            decode_search_cursor(cursor, get_search_id('user_find', u'(x=*)'))
+
+    @pytest.mark.parametrize('cursor', [u'', u'invalid', u'W10=', u'é'])
+    def test_invalid(self, cursor):
+        with pytest.raises(errors.ValidationError):
+            decode_search_cursor(cursor, get_search_id('user_find'))
+
+    @pytest.mark.parametrize('key', [5, {}, None, [u'uid=tuser']])
+    def test_invalid_key(self, key):
+        search_id = get_search_id('user_find')
+        cursor = base64.urlsafe_b64encode(
+            json.dumps([search_id, 5, key]).encode('utf-8')).decode('ascii')
+        with pytest.raises(errors.ValidationError):
+            decode_search_cursor(cursor, search_id)
+
+    @pytest.mark.parametrize('key', [u'invalid', 5])
+    def test_convert_key(self, key):
+        search_id = get_search_id('user_find')
+        cursor = encode_search_cursor(search_id, 5, u'uid=tuser')
+        assert decode_search_cursor(cursor, search_id, DN) == (
+            5, DN(('uid', 'tuser')))
+        cursor = encode_search_cursor(search_id, 5, key)
+        with pytest.raises(errors.ValidationError):
+            decode_search_cursor(cursor, search_id, DN)
+
+
+class test_select_page(object):
+    def test_pages(self):
+        items = list(range(7))
+        pages = []
+        position, last_key = 0, None
+        while True:
+            page, position = select_page(
+                iter(items), 3, position, last_key, get_key=identity)
+            pages.append(page)
+            if position is None:
+                break
+            last_key = page[-1]
+        assert pages == [[0, 1, 2], [3, 4, 5], [6]]
+
+    def test_stops_after_page(self):
+        consumed = []
+
+        def items():
+            for i in range(100):
+                consumed.append(i)
+                yield i
+
+        page, position = select_page(items(), 3, get_key=identity)
+        assert page == [0, 1, 2]
+        assert position == 3
+        assert consumed == [0, 1, 2, 3]
+
+    def test_last_key_removed(self):
+        # item 2 was removed since the previous page, continue at position
+        page, position = select_page(
+            [0, 1, 3, 4, 5], 2, 3, 2, get_key=identity)
+        assert page == [4, 5]
+        assert position is None
+
+    def test_last_key_moved(self):
+        # an item was added before the previous page, continue after the key
+        page, position = select_page(
+            [0, 10, 1, 2, 3, 4], 2, 3, 2, get_key=identity)
+        assert page == [3, 4]
+        assert position is None
+
+
+class FakeEntry(object):
+    def __init__(self, uid):
+        self.dn = DN(('uid', uid))
+        self.raw = {'uid': [uid.encode('utf-8')]}
+
+
+class FakeResult(object):
+    def __init__(self, entries, error=None):
+        self.entries = entries
+        self.error = error
+        self.truncated = None
+
+    def __iter__(self):
+        # like LDAPEntryIterator, the search starts on first iteration
+        if self.error is not None:
+            raise self.error
+        for entry in self.entries:
+            yield entry
+        self.truncated = False
+
+
+class FakeLDAP(object):
+    def __init__(self, uids, error=None):
+        self.entries = [FakeEntry(uid) for uid in uids]
+        self.error = error
+        self.searches = []
+
+    def find_entries_iter(self, filter, attrs_list, base_dn, scope,
+                          time_limit=None, size_limit=None):
+        return FakeResult(self.entries, self.error)
+
+    def find_entries_sorted(self, sort_attr, count, start_value, filter,
+                            attrs_list, base_dn, scope, time_limit=None):
+        self.searches.append((count, start_value))
+        entries = sorted(self.entries,
+                         key=lambda e: e.raw[sort_attr][0].lower())
+        if start_value is not None:
+            entries = [e for e in entries
+                       if e.raw[sort_attr][0].decode('utf-8').lower() >=
+                       start_value.lower()]
+        return entries[:count]
+
+
+class FakePrimaryKey(object):
+    name = 'uid'
+
+
+class FakeObject(object):
+    primary_key = FakePrimaryKey()
+
+
+class FakeSearch(object):
+    obj = FakeObject()
+    exc_callbacks = []
+
+    _exc_wrapper = BaseLDAPCommand.__dict__['_exc_wrapper']
+    _search_entries = LDAPSearch.__dict__['_search_entries']
+    _search_page = LDAPSearch.__dict__['_search_page']
+
+    def get_callbacks(self, callback_type):
+        assert callback_type == 'exc'
+        return self.exc_callbacks
+
+
+class test_search_page(object):
+    def search(self, ldap, pagesize, position=0, last_key=None):
+        entries, truncated, next_page = FakeSearch()._search_page(
+            ldap, u'(uid=*)', ['uid'], DN(), 1,
+            (pagesize, position, last_key))
+        assert not truncated
+        return [e.raw['uid'][0].decode('utf-8') for e in entries], next_page
+
+    def test_pages(self):
+        ldap = FakeLDAP([u'e', u'B', u'a', u'd', u'c'])
+        assert self.search(ldap, 2) == ([u'a', u'B'], (2, u'B'))
+        assert self.search(ldap, 2, 2, u'B') == ([u'c', u'd'], (4, u'd'))
+        assert self.search(ldap, 2, 4, u'd') == ([u'e'], None)
+        # each page is a single search of the page and two more entries
+        assert ldap.searches == [(4, None), (4, u'B'), (4, u'd')]
+
+    def test_last_key_removed(self):
+        ldap = FakeLDAP([u'a', u'c', u'd', u'e'])
+        assert self.search(ldap, 2, 2, u'b') == ([u'c', u'd'], (4, u'd'))
+
+
+class test_search_entries(object):
+    def search(self, ldap, exc_callbacks=()):
+        search = FakeSearch()
+        search.exc_callbacks = list(exc_callbacks)
+        return search._exc_wrapper((), {}, search._search_entries)(
+            ldap, u'(uid=*)', ['uid'], DN(), 1)
+
+    def test_entries(self):
+        entries, truncated = self.search(FakeLDAP([u'a', u'b']))
+        assert [e.raw['uid'][0] for e in entries] == [b'a', b'b']
+        assert truncated is False
+
+        assert self.search(FakeLDAP([])) == ([], False)
+
+    def test_exc_callback(self):
+        # errors of the search are raised during the iteration, they must
+        # still reach the exception callbacks, see vault_find
+        def exc_callback(self, args, options, exc, call_func, *call_args,
+                         **call_kwargs):
+            raise errors.EmptyResult(reason=str(exc))
+
+        ldap = FakeLDAP([], errors.NotFound(reason=u'no such entry'))
+        with pytest.raises(errors.NotFound):
+            self.search(ldap)
+        with pytest.raises(errors.EmptyResult):
+            self.search(ldap, [exc_callback])
@@ -221,3 +221,50 @@ def test_entry_to_dict():
     assert_deepequal(
         baseldap.entry_to_dict(entry, all=True, raw=True),
         the_dict)
+
+
+@pytest.mark.tier0
+def test_update_members():
+    """Test the LDAPModMember.update_members helper method"""
+    class FakeObject(object):
+        def __init__(self, name):
+            self.name = name
+
+        def get_primary_key_from_dn(self, dn):
+            return dn[0].value
+
+    class FakeAPI(object):
+        Object = dict(user=FakeObject('user'), group=FakeObject('group'))
+
+    users = [DN(('uid', u'user%d' % i)) for i in range(3)]
+    group = DN(('cn', u'group1'))
+    calls = []
+
+    def update(m_dns, dn, attr, **kwargs):
+        calls.append((m_dns, dn, attr, kwargs))
+        return [(users[1], errors.AlreadyGroupMember())]
+
+    instance = baseldap.LDAPAddMember(FakeAPI())
+    member_dns = dict(
+        member=dict(user=users, group=[group]),
+        memberuser=dict(user=[]),
+    )
+    failed = dict(
+        member=dict(user=[], group=[]),
+        memberuser=dict(user=[]),
+    )
+    completed = instance.update_members(
+        update, DN(('cn', u'target')), member_dns, failed, allow_same=True)
+
+    assert completed == 3
+    assert len(calls) == 1
+    assert sorted(calls[0][0]) == sorted(users + [group])
+    assert calls[0][1:] == (DN(('cn', u'target')), 'member',
+                            dict(allow_same=True))
+    assert_deepequal(failed, dict(
+        member=dict(
+            user=[(u'user1', u'This entry is already a member')],
+            group=[],
+        ),
+        memberuser=dict(user=[]),
+    ))
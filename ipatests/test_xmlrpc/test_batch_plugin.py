@@ -49,6 +49,30 @@ def deepequal_list(*expected):
     return checker
 
 
+def check_parallel_results(got):
+    """Check the results of the parallel batch test are in request order"""
+    assert len(got) == 4
+    assert got[0]['error'] is None
+    assert got[0]['value'] == u'admins'
+    assert got[1]['error_name'] == u'NotFound'
+    assert got[2]['error'] is None
+    assert got[2]['summary'].startswith(u'IPA server version')
+    assert got[3]['error'] is None
+    assert got[3]['value'] == u'ipausers'
+    return True
+
+
+def check_nested_parallel_results(got):
+    """Check a nested batch runs before the methods following it"""
+    assert len(got) == 2
+    assert got[0]['error'] is None
+    assert got[0]['results'][0]['error'] is None
+    assert got[0]['results'][0]['value'] == group1
+    assert got[1]['error'] is None
+    assert got[1]['value'] == group1
+    return True
+
+
 @pytest.mark.tier1
 class test_batch(Declarative):
 
@@ -81,6 +105,45 @@ class test_batch(Declarative):
             ),
         ),
 
+        dict(
+            desc='Batch parallel group shows around a ping',
+            command=('batch', [
+                dict(method=u'group_show', params=([u'admins'], dict())),
+                dict(method=u'group_show', params=([group1], dict())),
+                dict(method=u'ping', params=([], dict())),
+                dict(method=u'group_show', params=([u'ipausers'], dict())),
+            ], dict(parallel=True)),
+            expected=dict(
+                count=4,
+                results=check_parallel_results,
+            ),
+        ),
+
+        dict(
+            desc='Batch parallel group show after a nested batch adding it',
+            command=('batch', [
+                dict(method=u'batch', params=([
+                    dict(method=u'group_add',
+                         params=([group1], dict(description=u'Test desc 1'))),
+                ], dict())),
+                dict(method=u'group_show', params=([group1], dict())),
+            ], dict(parallel=True)),
+            expected=dict(
+                count=2,
+                results=check_nested_parallel_results,
+            ),
+        ),
+
+        dict(
+            desc='Delete the group added by the nested batch',
+            command=('group_del', [group1], {}),
+            expected=dict(
+                result=dict(failed=[]),
+                value=[group1],
+                summary=u'Deleted group "%s"' % group1,
+            ),
+        ),
+
         dict(
             desc='Create and deleting a group',
             command=('batch', [
@@ -0,0 +1,195 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the bulk add and member commands of `ipaserver/plugins/baseldap.py`.
+"""
+
+import pytest
+
+from ipalib import api
+from ipapython.dn import DN
+from ipatests.test_xmlrpc import objectclasses
+from ipatests.test_xmlrpc.xmlrpc_test import (
+    Declarative, fuzzy_digits, fuzzy_uuid)
+
+group1 = u'testbulkgroup1'
+group2 = u'testbulkgroup2'
+group3 = u'testbulkgroup3'
+user1 = u'tbulkuser1'
+user2 = u'tbulkuser2'
+user3 = u'tbulkuser3'
+user4 = u'tbulkuser4'
+host1 = u'testbulkhost1.%s' % api.env.domain
+host2 = u'testbulkhost2.%s' % api.env.domain
+
+
+def get_group_dn(cn):
+    return DN(('cn', cn), api.env.container_group, api.env.basedn)
+
+
+def check_group_results(got):
+    """Check a failed entry does not stop the others"""
+    assert len(got) == 4
+    assert got[0] == dict(value=group1, error=None)
+    assert got[1]['error_name'] == u'ValidationError'
+    assert got[2] == dict(value=group2, error=None)
+    assert got[3]['error_name'] == u'DuplicateEntry'
+    return True
+
+
+def check_random_password_results(got):
+    """Check the random password of an entry is not reported for another"""
+    assert [result['value'] for result in got] == [user3, user4]
+    assert [result['error'] for result in got] == [None, None]
+    assert got[0]['result']['randompassword']
+    assert 'randompassword' not in got[1]['result']
+    return True
+
+
+@pytest.mark.tier1
+class test_bulk(Declarative):
+
+    cleanup_commands = [
+        ('group_del', [group1, group2, group3], {'continue': True}),
+        ('user_del', [user1, user2, user3, user4], {'continue': True}),
+        ('host_del', [host1, host2], {'continue': True}),
+    ]
+
+    tests = [
+
+        dict(
+            desc='Add groups in bulk',
+            command=('group_add_bulk', [[
+                dict(cn=group1, description=u'Test desc 1'),
+                dict(cn=u'-invalid-'),
+                dict(cn=group2, nonposix=True),
+                dict(cn=group1),
+            ]], {}),
+            expected=dict(
+                count=2,
+                summary=u'Added 2 groups',
+                results=check_group_results,
+            ),
+        ),
+
+        dict(
+            desc='Add a group in bulk and read it back',
+            command=('group_add_bulk', [[
+                dict(cn=group3, description=u'Test desc 3'),
+            ]], dict(reread=True)),
+            expected=dict(
+                count=1,
+                summary=u'Added 1 group',
+                results=[
+                    dict(
+                        value=group3,
+                        result=dict(
+                            cn=[group3],
+                            description=[u'Test desc 3'],
+                            objectclass=objectclasses.group + [u'posixgroup'],
+                            ipauniqueid=[fuzzy_uuid],
+                            gidnumber=[fuzzy_digits],
+                            dn=get_group_dn(group3),
+                        ),
+                        error=None,
+                    ),
+                ],
+            ),
+        ),
+
+        dict(
+            desc='Add users in bulk',
+            command=('user_add_bulk', [[
+                dict(uid=user1, givenname=u'Test', sn=u'User1'),
+                dict(uid=user2, givenname=u'Test', sn=u'User2'),
+            ]], {}),
+            expected=dict(
+                count=2,
+                summary=u'Added 2 users',
+                results=[
+                    dict(value=user1, error=None),
+                    dict(value=user2, error=None),
+                ],
+            ),
+        ),
+
+        dict(
+            desc='Add users with random passwords in bulk',
+            command=('user_add_bulk', [[
+                dict(uid=user3, givenname=u'Test', sn=u'User3', random=True),
+                dict(uid=user4, givenname=u'Test', sn=u'User4', random=True,
+                     userpassword=u'Secret123'),
+            ]], dict(reread=True)),
+            expected=dict(
+                count=2,
+                summary=u'Added 2 users',
+                results=check_random_password_results,
+            ),
+        ),
+
+        dict(
+            desc='Retrieve a user added in bulk',
+            command=('user_show', [user2], dict(rights=False)),
+            expected=lambda got, output: (
+                got is None and
+                list(output['result']['uid']) == [user2] and
+                list(output['result']['memberof_group']) == [u'ipausers']
+            ),
+        ),
+
+        dict(
+            desc='Add members to a group without reading it back',
+            command=('group_add_member', [group1], dict(
+                user=[user1, user2, user1, u'notfound'], no_reread=True)),
+            expected=dict(
+                completed=2,
+                failed=dict(
+                    member=dict(
+                        group=tuple(),
+                        user=(
+                            (user1, u'This entry is already a member'),
+                            (u'notfound', u'no such entry'),
+                        ),
+                    ),
+                ),
+                result=dict(dn=get_group_dn(group1)),
+            ),
+        ),
+
+        dict(
+            desc='Remove members from a group without reading it back',
+            command=('group_remove_member', [group1], dict(
+                user=[user1, user2, u'notfound'], no_reread=True)),
+            expected=dict(
+                completed=2,
+                failed=dict(
+                    member=dict(
+                        group=tuple(),
+                        user=(
+                            (u'notfound', u'This entry is not a member'),
+                        ),
+                    ),
+                ),
+                result=dict(dn=get_group_dn(group1)),
+            ),
+        ),
+
+        dict(
+            desc='Add hosts in bulk',
+            command=('host_add_bulk', [[
+                dict(fqdn=host1, force=True),
+                dict(fqdn=host2, force=True, description=u'Test host 2'),
+            ]], {}),
+            expected=dict(
+                count=2,
+                summary=u'Added 2 hosts',
+                results=[
+                    dict(value=host1, error=None),
+                    dict(value=host2, error=None),
+                ],
+            ),
+        ),
+
+    ]
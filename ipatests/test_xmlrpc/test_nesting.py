@@ -25,6 +25,7 @@ from ipatests.test_xmlrpc.tracker.user_plugin import UserTracker
 from ipatests.test_xmlrpc.tracker.group_plugin import GroupTracker
 from ipatests.test_xmlrpc.tracker.host_plugin import HostTracker
 from ipatests.test_xmlrpc.tracker.hostgroup_plugin import HostGroupTracker
+from ipalib import api
 import pytest
 
 
@@ -189,6 +190,19 @@ class TestNestingUserGroups(XMLRPC_test):
         group3.retrieve()
         group4.retrieve()
 
+    def test_find_group_group(self, group1, group2, group3, group4):
+        """ Indirect membership in search results matches group-show """
+        groups = (group1, group2, group3, group4)
+        result = api.Command.group_find(u'testgroup', all=True)['result']
+        found = {entry['cn'][0]: entry for entry in result}
+        for group in groups:
+            shown = api.Command.group_show(group.cn, all=True)['result']
+            for attr in ('member_group', 'member_user', 'memberof_group',
+                         'memberindirect_group', 'memberindirect_user',
+                         'memberofindirect_group'):
+                assert (sorted(found[group.cn].get(attr, [])) ==
+                        sorted(shown.get(attr, []))), attr
+
 
 @pytest.mark.tier1
 class TestNestingHostGroups(XMLRPC_test):
@@ -119,3 +119,25 @@ class TestOutputFindAndShowCommand(XMLRPC_test):
         # wrong command, wrong criteria
         with pytest.raises(errors.NotFound):
             self.tracker.run_command('output_show', u'fake', u'fake')
+
+
+@pytest.mark.tier1
+class TestSchemaCommand(XMLRPC_test):
+    """Test functionality of the schema command"""
+    tracker = Tracker()
+
+    def test_schema(self):
+        """Test schema command with and without known fingerprints"""
+        result = self.tracker.run_command('schema')['result']
+        fingerprint = result['fingerprint']
+        assert result['ttl'] > 0, result
+        assert any(c['name'] == 'user_add' for c in result['commands'])
+
+        with pytest.raises(errors.SchemaUpToDate) as e:
+            self.tracker.run_command(
+                'schema', known_fingerprints=[u'fake', fingerprint])
+        assert e.value.fingerprint == fingerprint
+
+        result = self.tracker.run_command(
+            'schema', known_fingerprints=[u'fake'])['result']
+        assert result['fingerprint'] == fingerprint
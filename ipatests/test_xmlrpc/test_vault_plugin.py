@@ -160,6 +160,41 @@ class test_vault_plugin(Declarative):
 
     tests = [
 
+        {
+            'desc': 'Find vaults of a user without vault container',
+            'command': (
+                'vault_find',
+                [],
+                {
+                    'username': user_name,
+                },
+            ),
+            'expected': {
+                'count': 0,
+                'truncated': False,
+                'summary': u'0 vaults matched',
+                'result': [],
+            },
+        },
+
+        {
+            'desc': 'Find a page of vaults of a user without vault container',
+            'command': (
+                'vault_find',
+                [],
+                {
+                    'username': user_name,
+                    'pagesize': 10,
+                },
+            ),
+            'expected': {
+                'count': 0,
+                'truncated': False,
+                'summary': u'0 vaults matched',
+                'result': [],
+            },
+        },
+
         {
             'desc': 'Create private vault',
             'command': (
@@ -27,6 +27,7 @@ from os import path
 import tempfile
 import shutil
 import re
+import timeit
 import uuid
 import pytest
 from contextlib import contextmanager
@@ -90,6 +91,23 @@ def check_no_ipaapi(reason="Skip tests that needs an IPA API"):
             raise pytest.skip(reason)
 
 
+def best_time(func, repeat=3, number=1):
+    """Return the best time in seconds of a single call of ``func``
+
+    ``func`` is called ``number`` times in a row, ``repeat`` times.
+    """
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+
+def report_benchmark(name, before, after, unit='s'):
+    """Print the result of a benchmark, e.g. the time of the old and the
+    new implementation. Smaller values are better.
+    """
+    print('\n%-30s %10.4g%s -> %10.4g%s (%.1fx)' % (
+        name, before, unit, after, unit,
+        before / after if after else float('inf')))
+
+
 class TempDir(object):
     def __init__(self):
         self.__path = tempfile.mkdtemp(prefix='ipa.tests.')